@@ -20,6 +20,17 @@
 
 from .globals import *
 from .messages import *
+from .state import ParameterStore
+from .utils import parameterKey, splitKey
+from .mailbox import Mailbox
+
+def __getattr__(name):
+    # The shared memory module needs multiprocessing.shared_memory from
+    # Python 3.8 so it is only imported when it is used.
+    if name == "SharedParameterState":
+        from .sharedstate import SharedParameterState
+        return SharedParameterState
+    raise AttributeError("module 'canfix' has no attribute '{}'".format(name))
 
 def parseMessage(msg, silent=False):
     """Determines the type of CAN-FIX msg
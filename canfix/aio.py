@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+
+#  CAN-FIX Protocol Module - An Open Source Module that abstracts communication
+#  with the CAN-FIX Aviation Protocol
+#  Copyright (c) 2012 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+# asyncio support for reading and writing CAN-FIX messages
+
+import asyncio
+import copy
+import can
+from .globals import *
+from . import parseMessage
+from .filters import FilterSet, identifierRanges
+
+
+class Subscription(object):
+    """An async iterator of parsed CAN-FIX messages for one consumer
+
+    These are created with AsyncBus.subscribe().  Each subscription has its
+    own bounded queue.  If the consumer falls behind the oldest message in
+    the queue is thrown away to make room and the drops counter is
+    incremented.
+    """
+    def __init__(self, owner, types=None, predicate=None, maxsize=256, ids=None):
+        self.types = tuple(types) if types else None
+        self.predicate = predicate
+        self.ranges = None if ids is None else identifierRanges(ids)
+        self.filterHandle = None
+        self.drops = 0
+        self.__owner = owner
+        self.__queue = asyncio.Queue(maxsize)
+        self.__closed = False
+
+    def wants(self, identifier):
+        """Returns True if frames with this arbitration ID are delivered"""
+        if self.ranges is None:
+            return True
+        for low, high in self.ranges:
+            if low <= identifier <= high:
+                return True
+        return False
+
+    def _put(self, obj):
+        if self.types is not None and not isinstance(obj, self.types):
+            return
+        if self.predicate is not None and not self.predicate(obj):
+            return
+        if self.__queue.full():
+            self.__queue.get_nowait()
+            self.drops += 1
+        self.__queue.put_nowait(obj)
+
+    def _end(self):
+        self.__closed = True
+        if self.__queue.full():
+            self.__queue.get_nowait()
+        self.__queue.put_nowait(None)
+
+    async def get(self):
+        """Waits for and returns the next message
+
+        :raises StopAsyncIteration: if the subscription has been closed
+        """
+        obj = await self.__queue.get()
+        if obj is None:
+            self.__queue.put_nowait(None) # So that other waiters wake up too
+            raise StopAsyncIteration
+        return obj
+
+    def qsize(self):
+        return self.__queue.qsize()
+
+    def close(self):
+        """Stops delivering messages to this subscription"""
+        if not self.__closed:
+            self.__owner._unsubscribe(self)
+            self._end()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.get()
+
+
+class AsyncBus(object):
+    """asyncio interface to a python-can bus for CAN-FIX messages
+
+    Received messages are parsed once with parseMessage() and handed to every
+    subscription whose filter matches.  Outgoing messages are collected and
+    sent in batches from a worker thread so the event loop never blocks on
+    the bus.  This must be created from within a running event loop.
+
+    :param bus: The bus to use
+    :type bus: can.BusABC
+    :param filters: python-can filters to set on the bus so that unwanted
+                    frames are dropped by the driver.  If this is None the
+                    filters are computed from the ids that the subscriptions
+                    ask for.
+    :type filters: list, optional
+    :param maxFilters: The most filters the hardware can hold.  Only used
+                       when the filters are computed.
+    :type maxFilters: int, optional
+    :param batchSize: The most messages sent in a single worker call
+    :type batchSize: int, optional
+    :param metrics: Counts every received frame and parse error
+    :type metrics: canfix.metrics.BusMetrics, optional
+    """
+    def __init__(self, bus, filters=None, batchSize=32, maxFilters=None, metrics=None):
+        self.bus = bus
+        self.metrics = metrics
+        self.batchSize = batchSize
+        self.parseErrors = 0
+        self.__loop = asyncio.get_running_loop()
+        self.__subscriptions = []
+        self.__pending = []
+        self.__sender = None
+        self.__filterSet = None
+        if filters is not None:
+            bus.set_filters(filters)
+        else:
+            self.__filterSet = FilterSet(bus, maxFilters)
+        listeners = [self._receive]
+        if metrics is not None:
+            listeners.insert(0, metrics)
+        self.__notifier = can.Notifier(bus, listeners, loop=self.__loop)
+
+    def _receive(self, msg):
+        # The notifier calls this in the event loop thread
+        try:
+            obj = parseMessage(msg)
+        except Exception as e:
+            log.debug("Unable to parse message {} - {}".format(msg, e))
+            self.parseErrors += 1
+            if self.metrics is not None:
+                self.metrics.parseError(msg)
+            return
+        if obj is None:
+            return
+        for each in self.__subscriptions:
+            if each.wants(msg.arbitration_id):
+                each._put(obj)
+
+    def subscribe(self, types=None, predicate=None, maxsize=256, ids=None):
+        """Returns a new Subscription for received messages
+
+        :param types: Only deliver objects that are instances of these classes
+        :type types: tuple, optional
+        :param predicate: Only deliver objects for which this returns True
+        :type predicate: callable, optional
+        :param maxsize: The size of the subscription queue
+        :type maxsize: int, optional
+        :param ids: Only deliver messages with these arbitration IDs.  This
+                    can be any mix of identifiers, inclusive (low, high)
+                    ranges and parameter names.  The bus filters are updated
+                    to match.
+        :type ids: list, optional
+        """
+        s = Subscription(self, types, predicate, maxsize, ids)
+        self.__subscriptions.append(s)
+        if self.__filterSet is not None:
+            s.filterHandle = self.__filterSet.add(s.ranges)
+        return s
+
+    def _unsubscribe(self, subscription):
+        if subscription in self.__subscriptions:
+            self.__subscriptions.remove(subscription)
+            if subscription.filterHandle is not None:
+                self.__filterSet.remove(subscription.filterHandle)
+                subscription.filterHandle = None
+
+    def __aiter__(self):
+        return self.subscribe()
+
+    async def send(self, obj):
+        """Sends a CAN-FIX object or a can.Message
+
+        Messages that are sent while a batch is being written are queued and
+        written together in the next batch.  The returned coroutine finishes
+        once the message has been handed to the bus.
+
+        The message is copied so the caller is free to reuse it.
+        """
+        msg = copy.copy(obj if isinstance(obj, can.Message) else obj.msg)
+        msg.data = bytearray(msg.data)
+        future = self.__loop.create_future()
+        self.__pending.append((msg, future))
+        if self.__sender is None or self.__sender.done():
+            self.__sender = self.__loop.create_task(self.__sendPending())
+        await future
+
+    async def flush(self):
+        """Waits until every queued message has been sent"""
+        while self.__sender is not None and not self.__sender.done():
+            await asyncio.shield(self.__sender)
+
+    async def __sendPending(self):
+        while self.__pending:
+            batch = self.__pending[:self.batchSize]
+            del self.__pending[:self.batchSize]
+            try:
+                await self.__loop.run_in_executor(None, self.__sendBatch, [x[0] for x in batch])
+            except Exception as e:
+                for msg, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for msg, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+
+    def __sendBatch(self, msgs):
+        for msg in msgs:
+            self.bus.send(msg)
+
+    async def close(self):
+        """Sends anything that is queued, stops receiving and ends all of the
+        subscriptions.  The bus itself is not shut down."""
+        await self.flush()
+        self.__notifier.stop()
+        for each in list(self.__subscriptions):
+            each.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+
+#  CAN-FIX Protocol Module - An Open Source Module that abstracts communication
+#  with the CAN-FIX Aviation Protocol
+#  Copyright (c) 2012 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+# Reads recordings through mmap as NumPy arrays so large captures can be
+# searched and decoded without turning every frame into a Python object.
+# NumPy is only needed if this module is used.
+
+import mmap
+from .globals import *
+from . import protocol
+from .recording import FILE_HEADER, BLOCK_HEADER, BLOCK_MAGIC, RECORD, ID_MASK
+from .recording import BlockInfo, RecordingError, readHeader
+from .utils import getValue, getTypeSize
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if np is not None:
+    # Matches recording.RECORD
+    recordType = np.dtype([("delta", "<u4"), ("id", "<u2"), ("dlc", "u1"),
+                           ("reserved", "u1"), ("data", "u1", (8,))])
+    valueTypes = {"SHORT": "i1", "USHORT": "u1", "UINT": "<u2", "INT": "<i2",
+                  "DINT": "<i4", "UDINT": "<u4", "FLOAT": "<f4",
+                  "BYTE": "u1", "WORD": "<u2"}
+
+
+def decodeValues(records, datatype, multiplier=1.0):
+    """Decodes the values from an array of parameter records
+
+    Single numeric types are decoded for all of the records at once.  BYTE
+    and WORD are returned as integers with one bit per flag.  Anything else
+    is decoded one record at a time with getValue() and returned as an
+    object array.
+
+    :param records: Records with the recordType dtype
+    :type records: numpy.ndarray
+    :param datatype: The CAN-FIX data type
+    :type datatype: str
+    :param multiplier: The multiplier from the parameter definition
+    :type multiplier: float, optional
+    """
+    if datatype in valueTypes:
+        vt = np.dtype(valueTypes[datatype])
+        raw = np.ascontiguousarray(records["data"][:, 3:3 + vt.itemsize])
+        values = raw.view(vt).reshape(len(records))
+        if datatype in ("BYTE", "WORD"):
+            return values.copy()
+        if multiplier != 1.0:
+            return values * multiplier
+        return values.astype(np.float64)
+    result = np.empty(len(records), dtype=object)
+    for n, rec in enumerate(records):
+        result[n] = getValue(datatype, bytearray(rec["data"][3:rec["dlc"]]), multiplier)
+    return result
+
+
+class MappedRecording(object):
+    """A recording opened with mmap
+
+    The records of each block are NumPy structured arrays that point
+    straight into the mapped file so nothing is copied until a subset is
+    selected.  Only the parts of the file that are touched are read by the
+    operating system so memory use depends on the query and not the size of
+    the file.
+
+    Any arrays returned by records() must be released before close() is
+    called.
+
+    :param name: The file name of the recording
+    :type name: str
+    """
+    def __init__(self, name):
+        if np is None:
+            raise ImportError("NumPy is required for MappedRecording")
+        self.__file = open(name, "rb")
+        try:
+            self.blockSize, self.startTime = readHeader(self.__file.read(FILE_HEADER.size))
+            self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self.__file.close()
+            raise
+        self.__blocks = []
+        offset = FILE_HEADER.size
+        size = len(self.__map)
+        while offset + BLOCK_HEADER.size <= size:
+            magic, count, start, end, bitmap = BLOCK_HEADER.unpack_from(self.__map, offset)
+            if magic != BLOCK_MAGIC:
+                self.close()
+                raise RecordingError("Bad block header at offset {}".format(offset))
+            offset += BLOCK_HEADER.size
+            if offset + count * RECORD.size > size:
+                log.warning("Recording is truncated at offset {}".format(offset))
+                break
+            self.__blocks.append(BlockInfo(offset, count, start, end, bitmap))
+            offset += count * RECORD.size
+
+    def blocks(self):
+        """Returns the list of BlockInfo objects for the recording"""
+        return self.__blocks
+
+    def records(self, block):
+        """Returns the records of a block as a structured array view"""
+        return np.frombuffer(self.__map, dtype=recordType, count=block.count, offset=block.offset)
+
+    def timestamps(self, block, records):
+        """Returns the timestamps of records from a block as float64"""
+        return block.start + records["delta"] * 1e-6
+
+    def select(self, ids=None, start=None, end=None):
+        """Yields (timestamps, records) for each block with matching frames
+
+        Blocks are skipped using the block header where possible.  The
+        records are copies of only the matching rows.
+
+        :param ids: Only return frames with these identifiers
+        :type ids: list, optional
+        :param start: Skip frames before this time
+        :type start: float, optional
+        :param end: Skip frames after this time
+        :type end: float, optional
+        """
+        wanted = None
+        if ids is not None:
+            wanted = np.array(sorted(set(ids)), dtype=np.uint16)
+        for block in self.__blocks:
+            if not block.overlaps(start, end):
+                continue
+            if wanted is not None and not any(block.contains(int(i)) for i in wanted):
+                continue
+            records = self.records(block)
+            times = self.timestamps(block, records)
+            keep = np.ones(len(records), dtype=bool)
+            if wanted is not None:
+                keep &= np.isin(records["id"] & ID_MASK, wanted)
+            if start is not None:
+                keep &= times >= start
+            if end is not None:
+                keep &= times <= end
+            if keep.any():
+                yield times[keep], records[keep]
+
+    def parameter(self, identifier, node=None, index=None, start=None, end=None):
+        """Returns every value of a parameter as a dictionary of arrays
+
+        Only value updates are returned, meta data frames are left out.  The
+        dictionary has 'time', 'node', 'index', 'function' and 'value'
+        arrays.  The failure and quality flags are in 'function'.
+
+        :param identifier: The parameter ID or name
+        :type identifier: int or str
+        :param node: Only return values from this node
+        :type node: int, optional
+        :param index: Only return values for this index
+        :type index: int, optional
+        """
+        if isinstance(identifier, str):
+            p = protocol.getParameterByName(identifier)
+            if p is None:
+                raise ValueError("Unknown parameter {}".format(identifier))
+        else:
+            p = protocol.parameters[identifier]
+        size = 3 + getTypeSize(p.type)
+        columns = {"time": [], "node": [], "index": [], "function": [], "value": []}
+        for times, records in self.select([p.id], start, end):
+            data = records["data"]
+            keep = (records["dlc"] >= size) & ((data[:, 2] & 0xF0) == 0)
+            if node is not None:
+                keep &= data[:, 0] == node
+            if index is not None:
+                keep &= data[:, 1] == index
+            if not keep.any():
+                continue
+            records = records[keep]
+            columns["time"].append(times[keep])
+            columns["node"].append(records["data"][:, 0].copy())
+            columns["index"].append(records["data"][:, 1].copy())
+            columns["function"].append(records["data"][:, 2].copy())
+            columns["value"].append(decodeValues(records, p.type, p.multiplier))
+        result = {}
+        for name, parts in columns.items():
+            result[name] = np.concatenate(parts) if parts else np.empty(0)
+        return result
+
+    def __len__(self):
+        return sum(b.count for b in self.__blocks)
+
+    def close(self):
+        if self.__map is not None:
+            self.__map.close()
+            self.__map = None
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,412 @@
+#!/usr/bin/env python
+
+#  CAN-FIX Protocol Module - An Open Source Module that abstracts communication
+#  with the CAN-FIX Aviation Protocol
+#  Copyright (c) 2012 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+# A compressed version of the recording format.
+#
+# Parameter frames from one node mostly repeat the same node, index and
+# function bytes and the values change slowly, so each payload is XORed with
+# the previous payload that had the same identifier in the block and only
+# the bytes that changed are kept.  Timestamps are stored as the difference
+# from the previous frame.  The columns of each block are stored one after
+# the other and then compressed with zlib:
+#
+#   timestamp delta in microseconds   <i4 x count
+#   identifier and flags              <u2 x count
+#   dlc                               u1 x count
+#   changed byte mask                 u1 x count
+#   changed bytes                     one for each bit set in the masks
+#
+# Every column is fixed width so a block can be encoded and decoded with
+# NumPy as well as one frame at a time.  The XOR state starts over with
+# each block so any block can be decoded on its own.
+
+import struct
+import zlib
+import can
+from .globals import *
+from .recording import FILE_HEADER, VERSION, FLAG_ERROR, FLAG_REMOTE, ID_MASK
+from .recording import BlockInfo, RecordingError, idBitmap, _open
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAGIC = b"CFXZ"
+BLOCK_MAGIC = b"CFZB"
+
+# magic, frame count, compressed length, first timestamp, last timestamp, ID bitmap
+BLOCK_HEADER = struct.Struct("<4sIIdd256s")
+
+_ZERO = bytes(8)
+
+
+def encodeBlock(deltas, ids, payloads):
+    """Encodes the columns of a block one frame at a time
+
+    :param deltas: Timestamp differences in microseconds
+    :type deltas: list
+    :param ids: Identifiers with the FLAG_ERROR and FLAG_REMOTE bits
+    :type ids: list
+    :param payloads: The data of each frame
+    :type payloads: list
+    :returns: The uncompressed block bytes
+    """
+    n = len(ids)
+    dlcs = bytearray(n)
+    masks = bytearray(n)
+    changed = bytearray()
+    previous = {}
+    for i in range(n):
+        data = bytes(payloads[i])
+        dlcs[i] = len(data)
+        data = data + _ZERO[len(data):]
+        identifier = ids[i] & ID_MASK
+        ref = previous.get(identifier, _ZERO)
+        previous[identifier] = data
+        mask = 0
+        for j in range(8):
+            x = data[j] ^ ref[j]
+            if x:
+                mask |= 1 << j
+                changed.append(x)
+        masks[i] = mask
+    return b"".join([struct.pack("<{}i".format(n), *deltas),
+                     struct.pack("<{}H".format(n), *ids),
+                     bytes(dlcs), bytes(masks), bytes(changed)])
+
+
+def decodeBlock(data, count):
+    """Decodes an uncompressed block one frame at a time
+
+    :returns: (deltas, ids, payloads) lists
+    """
+    deltas = struct.unpack_from("<{}i".format(count), data, 0)
+    pos = 4 * count
+    ids = struct.unpack_from("<{}H".format(count), data, pos)
+    pos += 2 * count
+    dlcs = data[pos:pos + count]
+    masks = data[pos + count:pos + 2 * count]
+    pos += 2 * count
+    payloads = []
+    previous = {}
+    for i in range(count):
+        identifier = ids[i] & ID_MASK
+        row = bytearray(previous.get(identifier, _ZERO))
+        mask = masks[i]
+        for j in range(8):
+            if mask & (1 << j):
+                row[j] ^= data[pos]
+                pos += 1
+        previous[identifier] = bytes(row)
+        payloads.append(bytes(row[:dlcs[i]]))
+    return list(deltas), list(ids), payloads
+
+
+def _groups(ids):
+    # Stable sort by identifier and mark the first row of each identifier
+    order = np.argsort(ids & ID_MASK, kind="stable")
+    sorted_ids = ids[order] & ID_MASK
+    first = np.ones(len(ids), dtype=bool)
+    first[1:] = sorted_ids[1:] != sorted_ids[:-1]
+    return order, first
+
+
+def encodeArrays(deltas, ids, dlcs, data):
+    """Encodes the columns of a block with NumPy
+
+    Gives exactly the same bytes as encodeBlock().
+
+    :param deltas: int32 timestamp differences in microseconds
+    :param ids: uint16 identifiers and flags
+    :param dlcs: uint8 data lengths
+    :param data: (count, 8) uint8 payloads with unused bytes set to zero
+    """
+    order, first = _groups(ids)
+    rows = data[order]
+    ref = np.zeros_like(rows)
+    ref[1:][~first[1:]] = rows[:-1][~first[1:]]
+    x = np.empty_like(data)
+    x[order] = rows ^ ref
+    changed = x != 0
+    masks = np.packbits(changed, axis=1, bitorder="little")[:, 0]
+    return b"".join([deltas.astype("<i4").tobytes(), ids.astype("<u2").tobytes(),
+                     dlcs.astype(np.uint8).tobytes(), masks.tobytes(), x[changed].tobytes()])
+
+
+def decodeArrays(data, count):
+    """Decodes an uncompressed block with NumPy
+
+    :returns: (deltas, ids, dlcs, payloads) arrays.  payloads is (count, 8).
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    deltas = np.frombuffer(data, dtype="<i4", count=count)
+    ids = np.frombuffer(data, dtype="<u2", count=count, offset=4 * count)
+    pos = 6 * count
+    dlcs = buf[pos:pos + count]
+    masks = buf[pos + count:pos + 2 * count]
+    pos += 2 * count
+    changed = np.unpackbits(masks[:, None], axis=1, bitorder="little").astype(bool)
+    x = np.zeros((count, 8), dtype=np.uint8)
+    x[changed] = buf[pos:pos + int(changed.sum())]
+    order, first = _groups(ids)
+    acc = np.bitwise_xor.accumulate(x[order], axis=0)
+    # Undo the running XOR from the identifiers that came before each group
+    starts = np.flatnonzero(first)
+    start = starts[np.cumsum(first) - 1]
+    base = np.zeros_like(acc)
+    later = start > 0
+    base[later] = acc[start[later] - 1]
+    payloads = np.empty_like(x)
+    payloads[order] = acc ^ base
+    return deltas, ids, dlcs, payloads
+
+
+class CompressedWriter(can.Listener):
+    """Writes CAN frames to a compressed recording
+
+    This works like RecordingWriter.  Frames are kept in memory until a
+    block is full and then the block is encoded and written.
+
+    :param f: A file name or a binary file object opened for writing
+    :param blockSize: The most frames in a block
+    :type blockSize: int, optional
+    :param level: The zlib compression level
+    :type level: int, optional
+    """
+    def __init__(self, f, blockSize=4096, level=6):
+        if not 0 < blockSize <= 0xFFFF:
+            raise ValueError("Block size must be between 1 and 65535")
+        self.blockSize = blockSize
+        self.level = level
+        self.frames = 0
+        self.blocks = 0
+        self.rawBytes = 0
+        self.__file, self.__owner = _open(f, "wb")
+        self.__headerWritten = False
+        self.__clear()
+
+    def __clear(self):
+        self.__first = None
+        self.__last = None
+        self.__lastTime = 0
+        self.__deltas = []
+        self.__ids = []
+        self.__payloads = []
+
+    def __writeHeader(self, startTime):
+        self.__file.write(FILE_HEADER.pack(MAGIC, VERSION, self.blockSize, startTime))
+        self.__headerWritten = True
+
+    def writeFrame(self, timestamp, identifier, data, flags=0):
+        """Adds a single frame.  See RecordingWriter.writeFrame()"""
+        if identifier > ID_MASK:
+            raise ValueError("Identifier 0x{:X} is not a standard identifier".format(identifier))
+        if len(data) > 8:
+            raise ValueError("Too much data for a CAN frame")
+        if not self.__headerWritten:
+            self.__writeHeader(timestamp)
+        if self.__first is not None and timestamp < self.__first:
+            # The block header holds the first timestamp as the start of the
+            # block so an earlier frame has to go in a new block
+            self.flush()
+        if self.__first is None:
+            self.__first = timestamp
+        t = int(round((timestamp - self.__first) * 1000000))
+        delta = t - self.__lastTime
+        if not -0x80000000 <= delta <= 0x7FFFFFFF:
+            self.flush()
+            return self.writeFrame(timestamp, identifier, data, flags)
+        self.__lastTime = t
+        self.__deltas.append(delta)
+        self.__ids.append(identifier | flags)
+        self.__payloads.append(bytes(data))
+        if self.__last is None or timestamp > self.__last:
+            self.__last = timestamp
+        self.frames += 1
+        if len(self.__ids) >= self.blockSize:
+            self.flush()
+
+    def write(self, msg):
+        """Adds a can.Message.  Extended frames are ignored."""
+        if msg.is_extended_id:
+            return
+        flags = 0
+        if msg.is_error_frame:
+            flags |= FLAG_ERROR
+        if msg.is_remote_frame:
+            flags |= FLAG_REMOTE
+        self.writeFrame(msg.timestamp, msg.arbitration_id, msg.data[:msg.dlc], flags)
+
+    on_message_received = write
+
+    def flush(self):
+        """Ends the current block and writes it to the file"""
+        if not self.__headerWritten:
+            self.__writeHeader(0.0)
+        if self.__ids:
+            raw = encodeBlock(self.__deltas, self.__ids, self.__payloads)
+            self.rawBytes += len(raw)
+            packed = zlib.compress(raw, self.level)
+            bitmap = idBitmap(x & ID_MASK for x in self.__ids)
+            self.__file.write(BLOCK_HEADER.pack(BLOCK_MAGIC, len(self.__ids), len(packed),
+                                                self.__first, self.__last, bitmap))
+            self.__file.write(packed)
+            self.blocks += 1
+        self.__clear()
+        self.__file.flush()
+
+    def stop(self):
+        self.close()
+
+    def close(self):
+        if self.__file is None:
+            return
+        self.flush()
+        if self.__owner:
+            self.__file.close()
+        self.__file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class CompressedReader(object):
+    """Reads a recording written by CompressedWriter
+
+    This has the same frames() interface as RecordingReader, so it can be
+    used anywhere that one can, for example as a Replay source.  arrays()
+    decodes a whole block at once with NumPy.
+
+    :param f: A file name or a binary file object opened for reading
+    """
+    def __init__(self, f):
+        self.__file, self.__owner = _open(f, "rb")
+        header = self.__file.read(FILE_HEADER.size)
+        if len(header) < FILE_HEADER.size or header[:4] != MAGIC:
+            self.close()
+            raise RecordingError("Not a compressed CAN-FIX recording")
+        magic, version, self.blockSize, self.startTime = FILE_HEADER.unpack(header)
+        if version != VERSION:
+            self.close()
+            raise RecordingError("Unsupported recording version {}".format(version))
+        self.blocksSkipped = 0
+        self.__blocks = None
+
+    def blocks(self):
+        """Returns a list of BlockInfo objects for every block in the file
+
+        For these blocks count is the number of frames and the compressed
+        length is in the length attribute.
+        """
+        if self.__blocks is None:
+            self.__blocks = []
+            offset = FILE_HEADER.size
+            while True:
+                self.__file.seek(offset)
+                header = self.__file.read(BLOCK_HEADER.size)
+                if len(header) < BLOCK_HEADER.size:
+                    break
+                magic, count, length, start, end, bitmap = BLOCK_HEADER.unpack(header)
+                if magic != BLOCK_MAGIC:
+                    raise RecordingError("Bad block header at offset {}".format(offset))
+                offset += BLOCK_HEADER.size
+                block = BlockInfo(offset, count, start, end, bitmap)
+                block.length = length
+                self.__blocks.append(block)
+                offset += length
+        return self.__blocks
+
+    def readBlock(self, block):
+        """Returns the uncompressed bytes of a block"""
+        self.__file.seek(block.offset)
+        data = self.__file.read(block.length)
+        if len(data) < block.length:
+            raise RecordingError("Recording is truncated")
+        return zlib.decompress(data)
+
+    def frames(self, ids=None, start=None, end=None):
+        """Yields can.Message objects.  See RecordingReader.frames()"""
+        wanted = None
+        mask = None
+        if ids is not None:
+            wanted = set(ids)
+            mask = idBitmap(wanted)
+        for block in self.blocks():
+            if not block.overlaps(start, end) or (mask is not None and not block.containsAny(mask)):
+                self.blocksSkipped += 1
+                continue
+            for msg in self.readFrames(block, wanted):
+                if start is not None and msg.timestamp < start:
+                    continue
+                if end is not None and msg.timestamp > end:
+                    continue
+                yield msg
+
+    def readFrames(self, block, wanted=None):
+        """Yields the can.Message objects from a single block
+
+        :param wanted: Only return frames with identifiers in this set
+        :type wanted: set, optional
+        """
+        deltas, idflags, payloads = decodeBlock(self.readBlock(block), block.count)
+        t = 0
+        for delta, flags, data in zip(deltas, idflags, payloads):
+            t += delta
+            identifier = flags & ID_MASK
+            if wanted is not None and identifier not in wanted:
+                continue
+            yield can.Message(timestamp=block.start + t / 1000000.0,
+                              arbitration_id=identifier, is_extended_id=False,
+                              is_error_frame=bool(flags & FLAG_ERROR),
+                              is_remote_frame=bool(flags & FLAG_REMOTE),
+                              dlc=len(data), data=data)
+
+    def arrays(self, block):
+        """Decodes a block with NumPy
+
+        :returns: (timestamps, ids, dlcs, payloads) arrays.  The ids still
+                  have the flag bits and payloads is (count, 8).
+        """
+        if np is None:
+            raise ImportError("NumPy is required for CompressedReader.arrays()")
+        deltas, ids, dlcs, payloads = decodeArrays(self.readBlock(block), block.count)
+        timestamps = block.start + np.cumsum(deltas, dtype=np.int64) * 1e-6
+        return timestamps, ids, dlcs, payloads
+
+    def __iter__(self):
+        return self.frames()
+
+    def __len__(self):
+        return sum(b.count for b in self.blocks())
+
+    def close(self):
+        if self.__owner and self.__file is not None:
+            self.__file.close()
+        self.__file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
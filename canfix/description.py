@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+
+#  CAN-FIX Protocol Module - An Open Source Module that abstracts communication
+#  with the CAN-FIX Aviation Protocol
+#  Copyright (c) 2012 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+# Puts Node Description strings back together from their four character
+# packets and asks for the packets that went missing.
+
+import threading
+import time
+import can
+from .globals import *
+
+DESCRIPTION = 0x0B
+
+
+class DescriptionBuffer(object):
+    """Collects the packets of one node's description
+
+    The buffer is allocated up front for 'packets' packets and only grows if
+    a higher packet number shows up.  Packets can arrive in any order and
+    duplicates are ignored.  The packet that holds the terminating NUL
+    character marks the end of the description.
+
+    :param node: The node the description comes from
+    :type node: int
+    :param packets: The number of packets to allocate room for
+    :type packets: int, optional
+    """
+    def __init__(self, node, packets=64):
+        self.node = node
+        self.chars = bytearray(packets * 4)
+        self.received = bytearray(packets)
+        self.count = 0
+        self.highest = None
+        self.end = None          # Packet number of the packet with the NUL
+        self.duplicates = 0
+        self.retransmits = 0     # Retransmission requests sent without progress
+        self.updated = None
+
+    def add(self, packetnumber, chars):
+        """Stores a packet
+
+        :returns: False if the packet was a duplicate
+        """
+        if packetnumber >= len(self.received):
+            size = len(self.received)
+            while size <= packetnumber:
+                size *= 2
+            self.received.extend(bytes(size - len(self.received)))
+            self.chars.extend(bytes(size * 4 - len(self.chars)))
+        if self.received[packetnumber]:
+            self.duplicates += 1
+            return False
+        self.received[packetnumber] = 1
+        self.count += 1
+        self.retransmits = 0
+        offset = packetnumber * 4
+        self.chars[offset:offset + 4] = bytes(chars[:4]).ljust(4, b"\x00")
+        if self.highest is None or packetnumber > self.highest:
+            self.highest = packetnumber
+        if 0 in chars[:4] and (self.end is None or packetnumber < self.end):
+            self.end = packetnumber
+        return True
+
+    def complete(self):
+        return self.end is not None and self.count >= self.end + 1 and \
+            all(self.received[:self.end + 1])
+
+    def missing(self):
+        """Returns the packet numbers we know we are missing
+
+        Until the last packet is seen only the gaps below the highest packet
+        number are known.
+        """
+        last = self.end if self.end is not None else self.highest
+        if last is None:
+            return []
+        return [n for n in range(last + 1) if not self.received[n]]
+
+    def text(self):
+        """Returns the description received so far as a string"""
+        last = self.end if self.end is not None else self.highest
+        if last is None:
+            return ""
+        data = bytes(self.chars[:(last + 1) * 4])
+        return data.split(b"\x00", 1)[0].decode("utf8", errors="replace")
+
+
+class DescriptionAssembler(object):
+    """Reassembles Node Description messages from many nodes at once
+
+    Description packets are collected per sending node so requests to
+    several nodes can be outstanding together and their packets can be
+    interleaved on the bus.  When a node's description has been quiet for
+    'timeout' seconds and is not complete, poll() asks for each missing
+    packet by number, or for the packet after the highest one received if
+    the end hasn't been seen.  A node is given up on after 'retries'
+    retransmission requests that bring nothing new.
+
+    Every received frame should be passed to handleMessage(), or the
+    assembler can be added to a can.Notifier.  Only packets addressed to our
+    node are collected unless node is None.
+
+    :param bus: The bus to send requests on.  None only listens.
+    :type bus: can.BusABC
+    :param node: Our node number.  Required if a bus is given.
+    :type node: int
+    :param callback: Called with (node, description) when one is complete
+    :type callback: callable, optional
+    :param packets: Packets to allocate room for in each buffer
+    :type packets: int, optional
+    :param timeout: Seconds a node can be quiet before we ask again
+    :type timeout: float, optional
+    :param retries: Requests for missing packets before giving up
+    :type retries: int, optional
+    """
+    def __init__(self, bus=None, node=None, callback=None, packets=64, timeout=0.5, retries=3):
+        if bus is not None and node is None:
+            raise ValueError("A node number is needed to send description requests")
+        self.bus = bus
+        self.node = node
+        self.callback = callback
+        self.packets = packets
+        self.timeout = timeout
+        self.retries = retries
+        self.descriptions = {}  # node: description string
+        self.failed = {}        # node: DescriptionBuffer we gave up on
+        self.requested = 0
+        self.sendErrors = 0
+        self.__buffers = {}     # node: DescriptionBuffer
+        self.__lock = threading.Lock()
+
+    def __message(self, node, packetnumber=None):
+        data = bytearray([DESCRIPTION, node])
+        if packetnumber is not None:
+            data.append(packetnumber % 256)
+            data.append(packetnumber >> 8)
+        return can.Message(arbitration_id=NODE_SPECIFIC_MSGS + self.node,
+                           is_extended_id=False, data=data)
+
+    def __send(self, msgs):
+        for msg in msgs:
+            try:
+                self.bus.send(msg)
+                self.requested += 1
+            except Exception as e:
+                log.error("Unable to send description request - {}".format(e))
+                self.sendErrors += 1
+
+    def request(self, node):
+        """Asks a node for its description and starts collecting it"""
+        if self.bus is None:
+            raise ValueError("A listen only assembler can't send requests")
+        with self.__lock:
+            buf = DescriptionBuffer(node, self.packets)
+            buf.updated = time.monotonic()
+            self.__buffers[node] = buf
+            self.descriptions.pop(node, None)
+            self.failed.pop(node, None)
+        self.__send([self.__message(node)])
+
+    def handleMessage(self, msg):
+        """Checks a received frame for a description packet
+
+        :returns: True if the frame was a description packet for us
+        """
+        identifier = msg.arbitration_id
+        data = msg.data
+        if msg.is_error_frame or identifier < NODE_SPECIFIC_MSGS or identifier >= TWOWAY_CONN_CHANS:
+            return False
+        if len(data) != 8 or data[0] != DESCRIPTION:
+            return False
+        if self.node is not None and data[1] != self.node:
+            return False
+        sender = identifier - NODE_SPECIFIC_MSGS
+        finished = None
+        with self.__lock:
+            buf = self.__buffers.get(sender)
+            if buf is None:
+                if sender in self.descriptions:
+                    return True  # A late duplicate of one we already have
+                buf = DescriptionBuffer(sender, self.packets)
+                self.__buffers[sender] = buf
+            buf.updated = time.monotonic()
+            if buf.add(data[2] + data[3] * 256, data[4:8]) and buf.complete():
+                finished = buf.text()
+                self.descriptions[sender] = finished
+                del self.__buffers[sender]
+        if finished is not None and self.callback is not None:
+            self.callback(sender, finished)
+        return True
+
+    on_message_received = handleMessage
+
+    def poll(self, now=None):
+        """Asks for missing packets from nodes that have gone quiet
+
+        :returns: Seconds until the next node could need a request or None
+                  if nothing is incomplete
+        """
+        if now is None:
+            now = time.monotonic()
+        msgs = []
+        wait = None
+        send = self.bus is not None
+        with self.__lock:
+            for node, buf in list(self.__buffers.items()):
+                due = buf.updated + self.timeout
+                if due > now:
+                    if wait is None or due - now < wait:
+                        wait = due - now
+                    continue
+                if buf.retransmits >= self.retries:
+                    log.debug("Gave up on the description from node {}".format(node))
+                    self.failed[node] = buf
+                    del self.__buffers[node]
+                    continue
+                buf.retransmits += 1
+                buf.updated = now
+                if send and buf.count == 0:
+                    msgs.append(self.__message(node))
+                elif send:
+                    for n in buf.missing():
+                        msgs.append(self.__message(node, n))
+                    if buf.end is None:
+                        msgs.append(self.__message(node, buf.highest + 1))
+                if wait is None or self.timeout < wait:
+                    wait = self.timeout
+        self.__send(msgs)
+        return wait
+
+    def incomplete(self):
+        """Returns a dictionary of node: list of missing packet numbers"""
+        with self.__lock:
+            return {node: buf.missing() for node, buf in self.__buffers.items()}
+
+    def wait(self, nodes, timeout=None):
+        """Polls until every node in the list has a description or has been
+        given up on.  Something else has to be feeding handleMessage().
+
+        :returns: False if the timeout expired first
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.__lock:
+                if all(n in self.descriptions or n in self.failed for n in nodes):
+                    return True
+            if end is not None and time.monotonic() >= end:
+                return False
+            wait = self.poll()
+            time.sleep(0.01 if wait is None else min(wait, 0.01))
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+
+#  CAN-FIX Protocol Module - An Open Source Module that abstracts communication
+#  with the CAN-FIX Aviation Protocol
+#  Copyright (c) 2012 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+# Finds the nodes on the bus with Node Identification requests and keeps an
+# inventory of them that Node Status messages keep up to date.
+
+import concurrent.futures
+import threading
+import time
+from .globals import *
+from .messages import NodeIdentification, NodeStatus
+from .utils import getValue
+
+BROADCAST = 0
+
+
+class NodeInfo(object):
+    """What we know about one node
+
+    :ivar node: The node number
+    :ivar device: Device type from the identification response or None if
+                  the node has not been identified yet
+    :ivar fwrev: Firmware revision
+    :ivar model: Model number
+    :ivar identified: time.time() of the identification response
+    :ivar lastSeen: time.time() of the last identification or status message
+    :ivar status: Dictionary of node status parameter number: value
+    """
+    def __init__(self, node):
+        self.node = node
+        self.device = None
+        self.fwrev = None
+        self.model = None
+        self.identified = None
+        self.lastSeen = None
+        self.status = {}
+        self.statusCount = 0
+
+    def __str__(self):
+        return "Node {} device={} fwrev={} model={}".format(self.node, self.device, self.fwrev, self.model)
+
+
+class NodeDiscovery(object):
+    """Finds nodes and keeps an inventory of them
+
+    scan() sends a Node Identification request to every node number, paced
+    at 'rate' requests per second so the scan never floods the bus, and
+    collects the responses as they arrive.  All of the requests are in flight
+    at once so a scan of the whole bus takes about 255 / rate seconds plus one
+    timeout instead of a timeout for every missing node.  With broadcast=True
+    a single request is sent to node 0 for nodes that answer broadcast
+    identification.
+
+    The requests go through a RequestEngine, which has to be receiving
+    responses.  The discovery object should also be given every received
+    frame, from a can.Notifier or by calling handleMessage(), so that
+    broadcast responses and Node Status messages update the inventory.
+
+    :param engine: The request engine to send with
+    :type engine: canfix.requester.RequestEngine
+    :param rate: Requests per second during a scan
+    :type rate: float, optional
+    :param timeout: How long to wait for the last node to answer
+    :type timeout: float, optional
+    """
+    def __init__(self, engine, rate=500.0, timeout=0.25):
+        self.engine = engine
+        self.rate = rate
+        self.timeout = timeout
+        self.inventory = {}  # node: NodeInfo
+        self.statusErrors = 0
+        self.__lock = threading.Lock()
+
+    def __info(self, node):
+        info = self.inventory.get(node)
+        if info is None:
+            info = NodeInfo(node)
+            self.inventory[node] = info
+        return info
+
+    def __identified(self, obj):
+        now = time.time()
+        with self.__lock:
+            info = self.__info(obj.sendNode)
+            info.device = obj.device
+            info.fwrev = obj.fwrev
+            info.model = obj.model
+            info.identified = now
+            info.lastSeen = now
+        return info
+
+    def __done(self, future):
+        if not future.cancelled() and future.exception() is None:
+            self.__identified(future.result())
+
+    def scan(self, nodes=range(1, 256), broadcast=False):
+        """Identifies the nodes on the bus and waits for the answers
+
+        :param nodes: The node numbers to try
+        :param broadcast: Send one broadcast request instead
+        :returns: A dictionary of node: NodeInfo for the nodes that answered
+        """
+        start = time.time()
+        if broadcast:
+            obj = NodeIdentification()
+            obj.sendNode = self.engine.node
+            obj.destNode = BROADCAST
+            self.engine.bus.send(obj.msg)
+            time.sleep(self.timeout)
+        else:
+            futures = []
+            interval = 1.0 / self.rate
+            anchor = time.monotonic()
+            for n, node in enumerate(nodes):
+                delay = anchor + n * interval - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                f = self.engine.identify(node, timeout=self.timeout, retries=0)
+                f.add_done_callback(self.__done)
+                futures.append(f)
+            # The engine expires the requests we don't get answers for.  We
+            # poll it too in case it isn't running its own thread.
+            end = time.monotonic() + self.timeout * 2
+            while time.monotonic() < end:
+                done, waiting = concurrent.futures.wait(futures, 0.01)
+                if not waiting:
+                    break
+                self.engine.poll()
+        with self.__lock:
+            return {n: info for n, info in self.inventory.items()
+                    if info.identified is not None and info.identified >= start}
+
+    def handleMessage(self, msg):
+        """Updates the inventory from a received frame
+
+        :returns: True if the frame was a node identification response or a
+                  node status message
+        """
+        identifier = msg.arbitration_id
+        data = msg.data
+        if msg.is_error_frame or identifier < NODE_SPECIFIC_MSGS or identifier >= TWOWAY_CONN_CHANS:
+            return False
+        if not data:
+            return False
+        if data[0] == 0x00 and len(data) == 8:
+            try:
+                self.__identified(NodeIdentification(msg))
+            except Exception as e:
+                log.debug("Bad identification response {} - {}".format(msg, e))
+                return False
+            return True
+        if data[0] == 0x06 and len(data) >= 3:
+            node = identifier - NODE_SPECIFIC_MSGS
+            parameter = data[1] + data[2] * 256
+            value = None
+            if parameter < len(NodeStatus.knownTypes):
+                # NodeStatus(msg) resets the multiplier after parsing so we
+                # decode with the known type ourselves
+                name, datatype, multiplier = NodeStatus.knownTypes[parameter]
+                try:
+                    value = getValue(datatype, data[3:], multiplier)
+                except Exception as e:
+                    log.debug("Bad node status {} - {}".format(msg, e))
+                    self.statusErrors += 1
+            if value is None:
+                value = bytes(data[3:])
+            with self.__lock:
+                info = self.__info(node)
+                info.status[parameter] = value
+                info.statusCount += 1
+                info.lastSeen = time.time()
+            return True
+        return False
+
+    on_message_received = handleMessage
+
+    def unidentified(self):
+        """Returns the nodes we have heard from but never identified"""
+        with self.__lock:
+            return sorted(n for n, info in self.inventory.items() if info.identified is None)
+
+    def stale(self, age):
+        """Returns the nodes that have not been heard from in 'age' seconds"""
+        limit = time.time() - age
+        with self.__lock:
+            return sorted(n for n, info in self.inventory.items()
+                          if info.lastSeen is None or info.lastSeen < limit)
+
+    def forget(self, node):
+        with self.__lock:
+            self.inventory.pop(node, None)
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+
+#  CAN-FIX Protocol Module - An Open Source Module that abstracts communication
+#  with the CAN-FIX Aviation Protocol
+#  Copyright (c) 2012 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+# Exports parameters from a capture as columns of time, value and flags,
+# one set of columns for each (node, parameter, index).
+
+import csv
+import os
+import can
+from .globals import *
+from . import protocol
+from .recording import MAGIC as RECORDING_MAGIC
+from .compression import MAGIC as COMPRESSED_MAGIC
+from .index import openRecording
+from .utils import getValue, getTypeSize
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def parameterIds(parameters):
+    """Returns a set of identifiers from a list of parameter names or IDs"""
+    result = set()
+    for each in parameters:
+        if isinstance(each, str):
+            p = protocol.getParameterByName(each)
+            if p is None:
+                raise ValueError("Unknown parameter {}".format(each))
+            each = p.id
+        if each not in protocol.parameters:
+            raise ValueError("Unknown parameter 0x{:03X}".format(each))
+        result.add(each)
+    return result
+
+
+def columnValue(datatype, value):
+    """Converts a decoded value into something that fits in a column
+
+    BYTE and WORD flags become an integer with one bit per flag and lists of
+    values become tuples.
+    """
+    if datatype in ("BYTE", "WORD"):
+        x = 0
+        for bit, flag in enumerate(value):
+            if flag:
+                x |= 1 << bit
+        return x
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+def readCapture(name, ids=None):
+    """Yields the can.Message objects from a capture file
+
+    Native recordings, plain or compressed, are read with their own reader
+    so blocks without the wanted identifiers are skipped.  Anything else is handed to
+    can.LogReader which picks the format from the file extension.
+
+    :param name: The file name
+    :type name: str
+    :param ids: The identifiers that are wanted.  Other frames may still be
+                returned.
+    :type ids: list, optional
+    """
+    with open(name, "rb") as f:
+        magic = f.read(len(RECORDING_MAGIC))
+    if magic in (RECORDING_MAGIC, COMPRESSED_MAGIC):
+        with openRecording(name) as r:
+            for msg in r.frames(ids=None if ids is None else sorted(ids)):
+                yield msg
+    else:
+        with can.LogReader(name) as r:
+            for msg in r:
+                yield msg
+
+
+class ParameterColumns(object):
+    """Decodes parameter frames into columns
+
+    Only frames for the requested parameters are decoded.  Meta data frames
+    are ignored.  The columns for each (node, identifier, index) are lists
+    of timestamps, values and function codes, the function code holding
+    the failure, quality and annunciate flags.
+
+    :param parameters: Parameter names or IDs to collect
+    :type parameters: list
+    """
+    def __init__(self, parameters):
+        self.ids = parameterIds(parameters)
+        self.decodeErrors = 0
+        self.__defs = {}
+        for each in self.ids:
+            p = protocol.parameters[each]
+            self.__defs[each] = (p.type, p.multiplier, 3 + getTypeSize(p.type))
+        self.columns = {}
+
+    def add(self, msg):
+        """Adds a frame.  Frames that aren't wanted are ignored.
+
+        :returns: The (node, identifier, index) key or None
+        """
+        if msg.is_error_frame or msg.is_remote_frame:
+            return None
+        return self.addFrame(msg.timestamp, msg.arbitration_id, msg.data)
+
+    def addFrame(self, timestamp, identifier, data):
+        """Adds a frame that isn't in a can.Message
+
+        :returns: The (node, identifier, index) key or None
+        """
+        d = self.__defs.get(identifier)
+        if d is None:
+            return None
+        datatype, multiplier, size = d
+        if len(data) < size or data[2] & 0xF0:
+            return None
+        try:
+            value = columnValue(datatype, getValue(datatype, data[3:size], multiplier))
+        except Exception as e:
+            log.debug("Unable to decode 0x{:03X} {} - {}".format(identifier, data, e))
+            self.decodeErrors += 1
+            return None
+        key = (data[0], identifier, data[1])
+        c = self.columns.get(key)
+        if c is None:
+            c = self.columns[key] = ([], [], [])
+        c[0].append(timestamp)
+        c[1].append(value)
+        c[2].append(data[2])
+        return key
+
+    def take(self, key):
+        """Removes and returns the (times, values, functions) lists for key"""
+        return self.columns.pop(key)
+
+    def __len__(self):
+        return sum(len(c[0]) for c in self.columns.values())
+
+
+class ColumnExporter(object):
+    """Writes parameter columns to files in chunks
+
+    Each (node, parameter, index) is written to its own series of files
+    named like 183_n1_i0_0000.npz, with the identifier in hex, so memory
+    use is limited to chunkSize rows for each series.  NPZ files hold
+    'time', 'value' and 'flags' arrays and need NumPy.  CSV files have the
+    same columns with lists of values spread across value0, value1...
+
+    :param directory: Where to write the files
+    :type directory: str
+    :param parameters: Parameter names or IDs to export
+    :type parameters: list
+    :param format: 'npz' or 'csv'
+    :type format: str, optional
+    :param chunkSize: The most rows in each file
+    :type chunkSize: int, optional
+    """
+    def __init__(self, directory, parameters, format="npz", chunkSize=65536):
+        if format not in ("npz", "csv"):
+            raise ValueError("Unknown export format {}".format(format))
+        if format == "npz" and np is None:
+            raise ImportError("NumPy is required for npz export")
+        self.directory = directory
+        self.format = format
+        self.chunkSize = chunkSize
+        self.collector = ParameterColumns(parameters)
+        self.files = {}  # key: list of file names
+        os.makedirs(directory, exist_ok=True)
+
+    def add(self, msg):
+        key = self.collector.add(msg)
+        if key is not None and len(self.collector.columns[key][0]) >= self.chunkSize:
+            self.__write(key)
+
+    def export(self, frames):
+        """Adds every frame from an iterable"""
+        for msg in frames:
+            self.add(msg)
+
+    def __write(self, key):
+        times, values, functions = self.collector.take(key)
+        files = self.files.setdefault(key, [])
+        node, identifier, index = key
+        name = os.path.join(self.directory, "{:03X}_n{}_i{}_{:04d}.{}".format(
+                            identifier, node, index, len(files), self.format))
+        if self.format == "npz":
+            np.savez_compressed(name, time=np.array(times, dtype=np.float64),
+                                value=np.array(values),
+                                flags=np.array(functions, dtype=np.uint8))
+        else:
+            with open(name, "w", newline="") as f:
+                w = csv.writer(f)
+                width = len(values[0]) if isinstance(values[0], tuple) else 0
+                if width:
+                    w.writerow(["time"] + ["value{}".format(n) for n in range(width)] + ["flags"])
+                else:
+                    w.writerow(["time", "value", "flags"])
+                for t, v, fn in zip(times, values, functions):
+                    if width:
+                        w.writerow([repr(t)] + list(v) + [fn])
+                    else:
+                        w.writerow([repr(t), v, fn])
+        files.append(name)
+
+    def close(self):
+        """Writes whatever is left"""
+        for key in list(self.collector.columns):
+            self.__write(key)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def exportCapture(name, directory, parameters, format="npz", chunkSize=65536):
+    """Exports parameters from a capture file
+
+    :param name: A native recording or anything can.LogReader can read
+    :type name: str
+    :returns: A dictionary of the files written for each
+              (node, identifier, index)
+    """
+    with ColumnExporter(directory, parameters, format, chunkSize) as ex:
+        ex.export(readCapture(name, ex.collector.ids))
+    return ex.files
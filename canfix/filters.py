@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+
+#  CAN-FIX Protocol Module - An Open Source Module that abstracts communication
+#  with the CAN-FIX Aviation Protocol
+#  Copyright (c) 2012 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+# Builds python-can acceptance filters (id/mask pairs) from the CAN-FIX
+# identifiers that we are interested in so that the unwanted frames are
+# thrown away by the kernel or the CAN controller instead of by Python.
+
+import threading
+from .globals import *
+from . import protocol
+
+ID_MASK = 0x7FF
+
+# Useful ranges of identifiers.  All limits are inclusive.
+ALARM_RANGE = (NODE_ALARMS, HIGH_PRIORITY_DATA - 1)
+PARAMETER_RANGE = (HIGH_PRIORITY_DATA, FUTURE_MSGS - 1)
+NODE_SPECIFIC_RANGE = (NODE_SPECIFIC_MSGS, TWOWAY_CONN_CHANS - 1)
+TWOWAY_RANGE = (TWOWAY_CONN_CHANS, ID_MASK)
+
+
+def identifierRanges(ids):
+    """Returns a sorted list of merged (low, high) identifier ranges
+
+    :param ids: Any mix of integer identifiers, inclusive (low, high) tuples
+                and parameter names
+    :type ids: list
+    """
+    ranges = []
+    for each in ids:
+        if isinstance(each, str):
+            p = protocol.getParameterByName(each)
+            if p is None:
+                raise ValueError("Unknown parameter {}".format(each))
+            each = p.id
+        if isinstance(each, tuple):
+            low, high = each
+        else:
+            low = high = each
+        if low > high or low < 0 or high > ID_MASK:
+            raise ValueError("Bad identifier range {}".format(each))
+        ranges.append((low, high))
+    ranges.sort()
+    result = []
+    for low, high in ranges:
+        if result and low <= result[-1][1] + 1:
+            if high > result[-1][1]:
+                result[-1] = (result[-1][0], high)
+        else:
+            result.append((low, high))
+    return result
+
+
+def rangeFilters(low, high):
+    """Returns the (id, mask) pairs that match exactly low to high inclusive"""
+    result = []
+    while low <= high:
+        # Take the largest aligned block that starts at low and fits
+        size = low & -low if low else ID_MASK + 1
+        while low + size - 1 > high:
+            size >>= 1
+        result.append((low, ID_MASK & ~(size - 1)))
+        low += size
+    return result
+
+
+def _covered(f):
+    # Number of identifiers that an (id, mask) pair matches
+    return 1 << (11 - bin(f[1]).count("1"))
+
+
+def _combine(filters):
+    # Merge pairs that only differ in one bit that both of them care about.
+    # This is the first step of Quine-McCluskey and catches things like
+    # every other identifier that the range decomposition can't.
+    filters = set(filters)
+    changed = True
+    while changed:
+        changed = False
+        for a in sorted(filters):
+            for b in sorted(filters):
+                diff = a[0] ^ b[0]
+                if a[1] == b[1] and diff and diff & (diff - 1) == 0:
+                    filters -= {a, b}
+                    filters.add((a[0] & ~diff, a[1] & ~diff))
+                    changed = True
+                    break
+            if changed:
+                break
+    return sorted(filters)
+
+
+def computeFilters(ids, maxFilters=None):
+    """Returns a list of python-can filters that match the given identifiers
+
+    The filters match exactly the identifiers given unless there are more
+    than maxFilters of them.  In that case filters are merged, matching the
+    fewest extra identifiers each time, until they fit.  Merged filters let
+    some unwanted frames through so the receiver still has to check.
+
+    :param ids: Identifiers, (low, high) ranges or parameter names
+    :type ids: list
+    :param maxFilters: The most filters the hardware can hold
+    :type maxFilters: int, optional
+    :returns: A list of dictionaries for can.BusABC.set_filters()
+    """
+    filters = []
+    for low, high in identifierRanges(ids):
+        filters.extend(rangeFilters(low, high))
+    filters = _combine(filters)
+    if maxFilters is not None:
+        if maxFilters < 1:
+            raise ValueError("maxFilters must be at least one")
+        while len(filters) > maxFilters:
+            best = None
+            for i in range(len(filters)):
+                for j in range(i + 1, len(filters)):
+                    a, b = filters[i], filters[j]
+                    mask = a[1] & b[1] & ~(a[0] ^ b[0])
+                    f = (a[0] & mask, mask)
+                    if best is None or _covered(f) < _covered(best[0]):
+                        best = (f, i, j)
+            f, i, j = best
+            # Drop anything the new filter makes redundant
+            filters = [x for x in filters if (x[0] & f[1]) != f[0] or (x[1] & f[1]) != f[1]]
+            filters = _combine(filters + [f])
+    return [{"can_id": i, "can_mask": m, "extended": False} for i, m in filters]
+
+
+class FilterSet(object):
+    """Keeps the bus filters matched to what the receivers want
+
+    Each receiver adds the identifiers that it wants and gets back a handle
+    that it removes when it is finished.  The filters are recomputed and set
+    on the bus whenever the set changes.  If any receiver wants everything,
+    or there are no receivers, the bus filters are cleared.
+
+    :param bus: The bus to set the filters on.  If None the filters are only
+                computed.
+    :type bus: can.BusABC, optional
+    :param maxFilters: The most filters the hardware can hold
+    :type maxFilters: int, optional
+    """
+    def __init__(self, bus=None, maxFilters=None):
+        self.bus = bus
+        self.maxFilters = maxFilters
+        self.updates = 0
+        self.__handles = {}
+        self.__filters = None
+        self.__lock = threading.Lock()
+
+    def add(self, ids=None):
+        """Adds a receiver
+
+        :param ids: Identifiers, (low, high) ranges or parameter names.  None
+                    means every frame is wanted.
+        :returns: A handle to pass to remove()
+        """
+        handle = object()
+        with self.__lock:
+            self.__handles[handle] = None if ids is None else identifierRanges(ids)
+            self.__update()
+        return handle
+
+    def remove(self, handle):
+        with self.__lock:
+            del self.__handles[handle]
+            self.__update()
+
+    def filters(self):
+        """Returns the current list of filters or None if everything passes"""
+        return self.__filters
+
+    def __update(self):
+        wanted = list(self.__handles.values())
+        if not wanted or None in wanted:
+            filters = None
+        else:
+            filters = computeFilters([r for each in wanted for r in each], self.maxFilters)
+        if filters == self.__filters:
+            return
+        self.__filters = filters
+        self.updates += 1
+        if self.bus is not None:
+            self.bus.set_filters(filters)
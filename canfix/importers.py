@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+#  CAN-FIX Protocol Module - An Open Source Module that abstracts communication
+#  with the CAN-FIX Aviation Protocol
+#  Copyright (c) 2012 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+# Reads the log formats that python-can writes and hands the frames on in
+# large batches.  candump and ASC files are text so we parse them ourselves
+# without building a can.Message for every frame.  Everything else goes
+# through can.LogReader.
+#
+# A batch is a list of (timestamp, identifier, flags, data) tuples where
+# flags uses the FLAG_ERROR and FLAG_REMOTE bits from the recording
+# format.  Extended frames are not CAN-FIX and are counted and dropped.
+
+import os
+import can
+from .globals import *
+from .export import ParameterColumns
+from .recording import FLAG_ERROR, FLAG_REMOTE, ID_MASK
+
+
+class LogImporter(object):
+    """Reads any log that can.LogReader understands
+
+    :param name: The file name
+    :type name: str
+    """
+    def __init__(self, name):
+        self.name = name
+        self.frames = 0
+        self.skipped = 0
+
+    def batches(self, batchSize=4096):
+        """Yields lists of (timestamp, identifier, flags, data) tuples"""
+        batch = []
+        with can.LogReader(self.name) as r:
+            for msg in r:
+                if msg.is_extended_id and not msg.is_error_frame:
+                    self.skipped += 1
+                    continue
+                flags = 0
+                if msg.is_error_frame:
+                    flags = FLAG_ERROR
+                elif msg.is_remote_frame:
+                    flags = FLAG_REMOTE
+                batch.append((msg.timestamp, msg.arbitration_id & ID_MASK, flags, bytes(msg.data)))
+                if len(batch) >= batchSize:
+                    self.frames += len(batch)
+                    yield batch
+                    batch = []
+        if batch:
+            self.frames += len(batch)
+            yield batch
+
+
+class CandumpImporter(LogImporter):
+    """Reads candump -l style logs
+
+    Lines look like '(1700000000.500000) can0 183#0100000003'.
+    """
+    def batches(self, batchSize=4096):
+        batch = []
+        with open(self.name, "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 3 or parts[0][0] != "(":
+                    continue
+                ident, sep, data = parts[2].partition("#")
+                if not sep or data[:1] == "#":  # CAN FD frames use ##
+                    self.skipped += 1
+                    continue
+                flags = 0
+                if len(ident) > 3:
+                    if int(ident, 16) & 0x20000000:
+                        batch.append((float(parts[0][1:-1]), 0, FLAG_ERROR, b""))
+                    else:
+                        self.skipped += 1
+                    continue
+                if data[:1] == "R":
+                    flags = FLAG_REMOTE
+                    data = ""
+                batch.append((float(parts[0][1:-1]), int(ident, 16), flags, bytes.fromhex(data)))
+                if len(batch) >= batchSize:
+                    self.frames += len(batch)
+                    yield batch
+                    batch = []
+        if batch:
+            self.frames += len(batch)
+            yield batch
+
+
+class AscImporter(LogImporter):
+    """Reads Vector ASC logs
+
+    Timestamps are relative to the start of the measurement, the same as
+    can.ASCReader gives by default.
+    """
+    def batches(self, batchSize=4096):
+        batch = []
+        base = 16
+        with open(self.name, "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 3:
+                    continue
+                if parts[0] == "base":
+                    base = 10 if parts[1] == "dec" else 16
+                    continue
+                if parts[2] == "ErrorFrame":
+                    batch.append((float(parts[0]), 0, FLAG_ERROR, b""))
+                elif len(parts) >= 6 and parts[4] in ("d", "r") and parts[1].isdigit():
+                    ident = parts[2]
+                    if ident[-1] in "xX":
+                        self.skipped += 1
+                        continue
+                    if parts[4] == "r":
+                        batch.append((float(parts[0]), int(ident, base), FLAG_REMOTE, b""))
+                    else:
+                        dlc = int(parts[5], 16)
+                        data = bytes(int(x, base) for x in parts[6:6 + dlc])
+                        batch.append((float(parts[0]), int(ident, base), 0, data))
+                else:
+                    continue
+                if len(batch) >= batchSize:
+                    self.frames += len(batch)
+                    yield batch
+                    batch = []
+        if batch:
+            self.frames += len(batch)
+            yield batch
+
+
+importers = {".log": CandumpImporter, ".asc": AscImporter}
+
+
+def openLog(name):
+    """Returns the importer for a log file, picked by the file extension"""
+    ext = os.path.splitext(name)[1].lower()
+    return importers.get(ext, LogImporter)(name)
+
+
+def importParameters(name, parameters, batchSize=4096):
+    """Decodes parameters from a log file into columns
+
+    Only the requested parameters are decoded.
+
+    :param name: The log file name
+    :type name: str
+    :param parameters: Parameter names or IDs
+    :type parameters: list
+    :returns: A ParameterColumns object
+    """
+    columns = ParameterColumns(parameters)
+    ids = columns.ids
+    add = columns.addFrame
+    for batch in openLog(name).batches(batchSize):
+        for timestamp, identifier, flags, data in batch:
+            if identifier in ids and not flags:
+                add(timestamp, identifier, data)
+    return columns
+
+
+def convertLog(name, writer, batchSize=4096):
+    """Copies every frame from a log file to a recording writer
+
+    :param writer: A RecordingWriter or CompressedWriter
+    :returns: The number of frames written
+    """
+    count = 0
+    for batch in openLog(name).batches(batchSize):
+        for timestamp, identifier, flags, data in batch:
+            writer.writeFrame(timestamp, identifier, data, flags)
+        count += len(batch)
+    return count
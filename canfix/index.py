@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+
+#  CAN-FIX Protocol Module - An Open Source Module that abstracts communication
+#  with the CAN-FIX Aviation Protocol
+#  Copyright (c) 2012 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+# A sidecar index for recordings.  The index lists, for every arbitration
+# ID and node, the blocks that have frames for it along with the time range
+# of those frames, so a query only reads the blocks that it needs.
+
+import os
+import struct
+from .globals import *
+from . import protocol
+from .messages import Parameter
+from .recording import BlockInfo, RecordingReader, RecordingError
+from .recording import MAGIC as RECORDING_MAGIC
+from .compression import CompressedReader
+from .compression import MAGIC as COMPRESSED_MAGIC
+
+INDEX_MAGIC = b"CFXI"
+INDEX_VERSION = 2
+
+# magic, version, source file size, source mtime in ns, block count, entry count
+INDEX_HEADER = struct.Struct("<4sHxxQqII")
+# offset, record count, compressed length (0 if not compressed), first and last timestamp
+INDEX_BLOCK = struct.Struct("<QIIdd")
+# identifier, node, block number, frame count, first and last timestamp
+INDEX_ENTRY = struct.Struct("<HHIIdd")
+# Node number for frames that we can't tie to a node, like the two way
+# channels or a parameter remote frame with no data.  It is outside 0-255 so
+# that it can't be confused with node 255.
+NO_NODE = 0xFFFF
+
+
+def openRecording(name):
+    """Opens a native recording with the right reader for its format"""
+    with open(name, "rb") as f:
+        magic = f.read(4)
+    if magic == RECORDING_MAGIC:
+        return RecordingReader(name)
+    if magic == COMPRESSED_MAGIC:
+        return CompressedReader(name)
+    raise RecordingError("{} is not a CAN-FIX recording".format(name))
+
+
+def frameNode(msg):
+    """Returns the node that sent a frame or None if we can't tell"""
+    i = msg.arbitration_id
+    if i < HIGH_PRIORITY_DATA:
+        return i
+    if i < NODE_SPECIFIC_MSGS:
+        return msg.data[0] if msg.data else None
+    if i < TWOWAY_CONN_CHANS:
+        return i - NODE_SPECIFIC_MSGS
+    return None
+
+
+class RecordingIndex(object):
+    """An index of which blocks of a recording hold each ID and node
+
+    Use RecordingIndex.open() to load the index that sits next to a
+    recording, building and saving it first if it is missing or out of
+    date.  The index file has the name of the recording with .idx added.
+
+    :param name: The file name of the recording
+    :type name: str
+    """
+    def __init__(self, name):
+        self.name = name
+        self.indexName = name + ".idx"
+        self.blocks = []
+        self.entries = {}  # (identifier, node): [(block, count, first, last)]
+        self.blocksRead = 0
+
+    @classmethod
+    def open(cls, name):
+        """Loads the index for a recording, building it if needed"""
+        index = cls(name)
+        if not index.load():
+            index.build()
+            index.save()
+        return index
+
+    def __sourceInfo(self):
+        st = os.stat(self.name)
+        return st.st_size, st.st_mtime_ns
+
+    def build(self):
+        """Reads the whole recording and builds the index"""
+        self.blocks = []
+        self.entries = {}
+        with openRecording(self.name) as r:
+            for n, block in enumerate(r.blocks()):
+                self.blocks.append(block)
+                found = {}
+                for msg in r.readFrames(block):
+                    if msg.is_error_frame:
+                        continue
+                    node = frameNode(msg)
+                    key = (msg.arbitration_id, NO_NODE if node is None else node)
+                    e = found.get(key)
+                    if e is None:
+                        found[key] = [1, msg.timestamp, msg.timestamp]
+                    else:
+                        e[0] += 1
+                        if msg.timestamp < e[1]:
+                            e[1] = msg.timestamp
+                        if msg.timestamp > e[2]:
+                            e[2] = msg.timestamp
+                for key in sorted(found):
+                    count, first, last = found[key]
+                    self.entries.setdefault(key, []).append((n, count, first, last))
+
+    def save(self):
+        size, mtime = self.__sourceInfo()
+        count = sum(len(x) for x in self.entries.values())
+        with open(self.indexName, "wb") as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, size, mtime,
+                                      len(self.blocks), count))
+            for b in self.blocks:
+                f.write(INDEX_BLOCK.pack(b.offset, b.count, getattr(b, "length", 0), b.start, b.end))
+            for (identifier, node), entries in sorted(self.entries.items()):
+                for block, n, first, last in entries:
+                    f.write(INDEX_ENTRY.pack(identifier, node, block, n, first, last))
+
+    def load(self):
+        """Loads the index file
+
+        :returns: False if there is no index or it doesn't match the
+                  recording any more
+        """
+        try:
+            with open(self.indexName, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return False
+        if len(data) < INDEX_HEADER.size:
+            return False
+        magic, version, size, mtime, blocks, count = INDEX_HEADER.unpack_from(data)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            return False
+        if (size, mtime) != self.__sourceInfo():
+            return False
+        if len(data) != INDEX_HEADER.size + blocks * INDEX_BLOCK.size + count * INDEX_ENTRY.size:
+            return False
+        self.blocks = []
+        self.entries = {}
+        pos = INDEX_HEADER.size
+        for offset, n, length, start, end in INDEX_BLOCK.iter_unpack(data[pos:pos + blocks * INDEX_BLOCK.size]):
+            b = BlockInfo(offset, n, start, end, None)
+            if length:
+                b.length = length
+            self.blocks.append(b)
+        pos += blocks * INDEX_BLOCK.size
+        for identifier, node, block, n, first, last in INDEX_ENTRY.iter_unpack(data[pos:]):
+            self.entries.setdefault((identifier, node), []).append((block, n, first, last))
+        return True
+
+    def nodes(self, identifier):
+        """Returns a sorted list of the nodes that sent this identifier"""
+        return sorted(node for i, node in self.entries if i == identifier and node != NO_NODE)
+
+    def blocksFor(self, identifier, node=None, start=None, end=None):
+        """Returns the sorted block numbers that hold matching frames"""
+        result = set()
+        for (i, n), entries in self.entries.items():
+            if i != identifier or (node is not None and n != node):
+                continue
+            for block, count, first, last in entries:
+                if start is not None and last < start:
+                    continue
+                if end is not None and first > end:
+                    continue
+                result.add(block)
+        return sorted(result)
+
+    def frames(self, identifier, node=None, start=None, end=None):
+        """Yields the can.Message objects for an identifier from the
+        blocks that the index says have it"""
+        blocks = self.blocksFor(identifier, node, start, end)
+        if not blocks:
+            return
+        with openRecording(self.name) as r:
+            for n in blocks:
+                self.blocksRead += 1
+                for msg in r.readFrames(self.blocks[n], {identifier}):
+                    if start is not None and msg.timestamp < start:
+                        continue
+                    if end is not None and msg.timestamp > end:
+                        continue
+                    if node is not None and frameNode(msg) != node:
+                        continue
+                    yield msg
+
+    def query(self, parameter, node=None, index=None, start=None, end=None, meta=False):
+        """Yields (timestamp, Parameter) for every value of a parameter
+
+        :param parameter: The parameter name or identifier
+        :type parameter: str or int
+        :param node: Only values from this node
+        :type node: int, optional
+        :param index: Only values with this index
+        :type index: int, optional
+        :param start: Skip values before this time
+        :type start: float, optional
+        :param end: Skip values after this time
+        :type end: float, optional
+        :param meta: Include meta data frames
+        :type meta: bool, optional
+        """
+        if isinstance(parameter, str):
+            p = protocol.getParameterByName(parameter)
+            if p is None:
+                raise ValueError("Unknown parameter {}".format(parameter))
+            parameter = p.id
+        for msg in self.frames(parameter, node, start, end):
+            if index is not None and (len(msg.data) < 2 or msg.data[1] != index):
+                continue
+            if not meta and len(msg.data) > 2 and msg.data[2] & 0xF0:
+                continue
+            try:
+                yield msg.timestamp, Parameter(msg)
+            except Exception as e:
+                log.debug("Unable to decode {} - {}".format(msg, e))
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+#  CAN-FIX Protocol Module - An Open Source Module that abstracts communication
+#  with the CAN-FIX Aviation Protocol
+#  Copyright (c) 2012 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+import threading
+from .globals import *
+from .messages import Parameter
+from .utils import frameKey, parameterKey
+
+
+class Mailbox(object):
+    """Holds the newest value of each parameter until a consumer takes it
+
+    There is at most one pending entry for each (node, identifier, index).
+    A newer value for the same parameter overwrites the pending one so a
+    consumer that falls behind only ever sees the latest values instead of
+    a backlog.  Meta data is kept apart from the value, with one pending
+    entry for each meta data item.  Entries are stored by the integer key
+    from parameterKey() which is computed once when the value arrives.
+
+    Raw CAN messages can be put directly with putMessage().  They are only
+    decoded when they are drained so values that get overwritten are never
+    decoded at all.  The mailbox is safe to use from multiple threads.
+    """
+    def __init__(self):
+        self.overwrites = 0
+        self.__pending = {}
+        self.__cond = threading.Condition()
+
+    def put(self, p):
+        """Stores a Parameter object, replacing any pending value for it"""
+        self.__store(parameterKey(p.node, p.identifier, p.index, p.function >> 4), p)
+
+    def putMessage(self, msg):
+        """Stores a raw parameter CAN message without decoding it
+
+        :returns: False if the message is not a parameter update
+        """
+        key = frameKey(msg)
+        if key is None or len(msg.data) < 4:
+            return False
+        self.__store(key, msg)
+        return True
+
+    def __store(self, key, item):
+        with self.__cond:
+            if key in self.__pending:
+                self.overwrites += 1
+            else:
+                self.__cond.notify()
+            self.__pending[key] = item
+
+    def drain(self, timeout=0):
+        """Returns every parameter that changed since the last drain
+
+        The result is a list of Parameter objects sorted by key.  Entries
+        that fail to decode are logged and left out.
+
+        :param timeout: How long to wait if nothing is pending.  None waits
+                        forever.
+        :type timeout: float, optional
+        """
+        with self.__cond:
+            if not self.__pending and timeout != 0:
+                self.__cond.wait(timeout)
+            pending = self.__pending
+            self.__pending = {}
+        result = []
+        for key in sorted(pending):
+            item = pending[key]
+            if not isinstance(item, Parameter):
+                try:
+                    item = Parameter(item)
+                except Exception as e:
+                    log.debug("Unable to decode {} - {}".format(item, e))
+                    continue
+            result.append(item)
+        return result
+
+    def __len__(self):
+        return len(self.__pending)
@@ -31,8 +31,10 @@ class NodeDescription(NodeSpecific):
             self.controlCode = 0x0B
             self.sendNode = None
             self.destNode = None
-            self.packetnumber = 0x00
+            self.packetnumber = packetnumber
             if chars:
+                if isinstance(chars, str):
+                    chars = chars.encode('utf8')
                 self.chars = bytearray(chars)
             else:
                 self.chars = bytearray([0x00]*4)
@@ -61,9 +63,12 @@ class NodeDescription(NodeSpecific):
         data = bytearray([])
         data.append(self.controlCode)
         data.append(self.destNode)
-        data.append(self.packetnumber % 265)
+        data.append(self.packetnumber % 256)
         data.append(self.packetnumber >> 8)
-        data.extend(bytearray(self.chars[0:4], 'utf8'))
+        chars = self.chars[0:4]
+        if isinstance(chars, str):
+            chars = chars.encode('utf8')
+        data.extend(chars)
         return data
 
     data = property(getData)
@@ -24,7 +24,7 @@ if sys.version_info[0] >= 3:
 import can
 import time
 from ..protocol import parameters, getParameterByName
-from ..utils import getTypeSize, getValue, setValue
+from ..utils import getTypeSize, getValue, setValue, parameterKey
 from ..globals import *
 
 
@@ -205,6 +205,11 @@ class Parameter(object):
 
     msg = property(getMessage, setMessage)
 
+    def getKey(self):
+        return parameterKey(self.node, self.__identifier, self.index)
+
+    key = property(getKey)
+
     def getFullName(self):
         if self.indexName:
             return "%s %s %i" % (self.__name, self.indexName, self.index + 1)
@@ -256,23 +261,28 @@ class Parameter(object):
             return "ERR"
 
 
+    # Parameters compare as equal if they are the same parameter and index
+    # no matter which node sent them or what the value is.
+    def __identity(self):
+        return (self.__identifier << 8) | self.index
+
     def __eq__(self, other):
-        return (self.__identifier*16 + self.index) == (other.__identifier*16 + other.index)
+        return self.__identity() == other.__identity()
 
     def __ne__(self, other):
         return not (self == other)
 
     def __lt__(self, other):
-        return (self.__identifier*16 + self.index) < (other.__identifier*16 + other.index)
+        return self.__identity() < other.__identity()
 
     def __le__(self, other):
-        return (self.__identifier*16 + self.index) <= (other.__identifier*16 + other.index)
+        return self.__identity() <= other.__identity()
 
     def __gt__(self, other):
-        return (self.__identifier*16 + self.index) > (other.__identifier*16 + other.index)
+        return self.__identity() > other.__identity()
 
     def __ge__(self, other):
-        return (self.__identifier*16 + self.index) >= (other.__identifier*16 + other.index)
+        return self.__identity() >= other.__identity()
 
 
     def __str__(self):
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+
+#  CAN-FIX Protocol Module - An Open Source Module that abstracts communication
+#  with the CAN-FIX Aviation Protocol
+#  Copyright (c) 2012 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+# Bus load and per identifier traffic counters
+
+import array
+import time
+import can
+from .globals import *
+from . import protocol
+from .messages import BitRateSet
+
+# Bits in a standard frame that are not data.  SOF, 11 bit ID, RTR, IDE,
+# r0, 4 bit DLC, 15 bit CRC, CRC delimiter, ACK slot, ACK delimiter, 7 bit
+# EOF and 3 bit intermission.
+FRAME_OVERHEAD = 47
+# The part of the frame that is subject to bit stuffing, not counting data
+STUFFED_OVERHEAD = 34
+
+
+def frameBits(dlc, stuffing=True):
+    """Returns the number of bits a standard frame takes on the bus
+
+    :param dlc: The number of data bytes
+    :type dlc: int
+    :param stuffing: Add the worst case number of stuff bits
+    :type stuffing: bool, optional
+    """
+    bits = FRAME_OVERHEAD + 8 * dlc
+    if stuffing:
+        bits += (STUFFED_OVERHEAD + 8 * dlc - 1) // 4
+    return bits
+
+
+def bitrateValue(bitrate):
+    """Returns the bit rate in kbps from either kbps or a BitRateSet code"""
+    if bitrate in BitRateSet.bitrates:
+        return bitrate
+    for kbps, code in BitRateSet.bitrates.items():
+        if code == bitrate:
+            return kbps
+    raise ValueError("Invalid Bit Rate Given")
+
+
+class BusMetrics(can.Listener):
+    """Counts frames and estimates bus load
+
+    Frames and bits are counted for each arbitration ID and frames are
+    counted for each node.  Counting a frame is only a few array increments
+    so this can sit in the receive path of a busy bus.  Everything else,
+    rates, groups and the bus load, is worked out when a snapshot is taken.
+
+    This is a python-can Listener so it can be given to a can.Notifier.  It
+    can also be passed to the ReceivePipeline or AsyncBus as their metrics.
+
+    Bus load is estimated with the worst case number of stuff bits unless
+    stuffing is False, so it will usually read a little high.
+
+    :param bitrate: The bus bit rate in kbps or as a BitRateSet code
+    :type bitrate: int, optional
+    :param stuffing: Include stuff bits in the estimate
+    :type stuffing: bool, optional
+    """
+    def __init__(self, bitrate=250, stuffing=True):
+        self.bitrate = bitrateValue(bitrate)
+        self.stuffing = stuffing
+        self.bitTable = [frameBits(n, stuffing) for n in range(9)]
+        self.__groupIndex = array.array("b", [-1] * 2048)
+        for i, g in enumerate(protocol.groups):
+            for n in range(g["startid"], g["endid"] + 1):
+                self.__groupIndex[n] = i
+        self.reset()
+
+    def reset(self):
+        """Clears all of the counters"""
+        self.frames = array.array("Q", bytes(8 * 2048))
+        self.bits = array.array("Q", bytes(8 * 2048))
+        self.parseErrors = array.array("Q", bytes(8 * 2048))
+        self.nodeFrames = array.array("Q", bytes(8 * 256))
+        self.errorFrames = 0
+        self.otherFrames = 0  # Extended or remote frames.  Not CAN-FIX
+        self.startTime = time.time()
+        self.__last = None
+
+    def on_message_received(self, msg):
+        if msg.is_error_frame:
+            self.errorFrames += 1
+            return
+        if msg.is_extended_id or msg.is_remote_frame:
+            self.otherFrames += 1
+            return
+        i = msg.arbitration_id
+        self.frames[i] += 1
+        self.bits[i] += self.bitTable[msg.dlc if msg.dlc <= 8 else 8]
+        if i < HIGH_PRIORITY_DATA:
+            self.nodeFrames[i] += 1
+        elif i < NODE_SPECIFIC_MSGS:
+            if msg.data:
+                self.nodeFrames[msg.data[0]] += 1
+        elif i < TWOWAY_CONN_CHANS:
+            self.nodeFrames[i - NODE_SPECIFIC_MSGS] += 1
+
+    def parseError(self, msg):
+        """Counts a message that could not be parsed"""
+        self.parseErrors[msg.arbitration_id & 0x7FF] += 1
+
+    def arrays(self):
+        """Returns copies of the raw counter arrays
+
+        frames, bits and parseErrors are indexed by arbitration ID and
+        nodeFrames by node number.  The counts are totals since the counters
+        were last reset.
+        """
+        return {"frames": array.array("Q", self.frames),
+                "bits": array.array("Q", self.bits),
+                "parseErrors": array.array("Q", self.parseErrors),
+                "nodeFrames": array.array("Q", self.nodeFrames)}
+
+    def snapshot(self):
+        """Returns a dictionary of the counters and rates
+
+        Counts are totals since the counters were reset.  Rates and the bus
+        load are for the time since the last snapshot, or since the reset for
+        the first one.  Only IDs, nodes and groups that have seen traffic are
+        included.
+        """
+        now = time.time()
+        current = self.arrays()
+        if self.__last is None:
+            lastTime = self.startTime
+            last = {k: array.array("Q", bytes(8 * len(v))) for k, v in current.items()}
+        else:
+            lastTime, last = self.__last
+        self.__last = (now, current)
+        elapsed = now - lastTime
+        scale = 1.0 / elapsed if elapsed > 0 else 0.0
+
+        frames = current["frames"]
+        bits = current["bits"]
+        parseErrors = current["parseErrors"]
+        ids = {}
+        groups = {}
+        intervalBits = 0
+        for i in range(2048):
+            if not frames[i] and not parseErrors[i]:
+                continue
+            delta = frames[i] - last["frames"][i]
+            intervalBits += bits[i] - last["bits"][i]
+            ids[i] = {"frames": frames[i], "rate": delta * scale,
+                      "bits": bits[i], "parseErrors": parseErrors[i]}
+            g = self.__groupIndex[i]
+            if g >= 0:
+                name = protocol.groups[g]["name"]
+                group = groups.setdefault(name, {"frames": 0, "rate": 0.0, "bits": 0})
+                group["frames"] += frames[i]
+                group["rate"] += delta * scale
+                group["bits"] += bits[i]
+        nodes = {}
+        nodeFrames = current["nodeFrames"]
+        for n in range(256):
+            if nodeFrames[n]:
+                delta = nodeFrames[n] - last["nodeFrames"][n]
+                nodes[n] = {"frames": nodeFrames[n], "rate": delta * scale}
+        return {"time": now,
+                "elapsed": elapsed,
+                "bitrate": self.bitrate,
+                "frames": sum(frames),
+                "bits": sum(bits),
+                "load": intervalBits * scale / (self.bitrate * 1000.0),
+                "errorFrames": self.errorFrames,
+                "otherFrames": self.otherFrames,
+                "parseErrors": sum(parseErrors),
+                "ids": ids,
+                "nodes": nodes,
+                "groups": groups}
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+
+#  CAN-FIX Protocol Module - An Open Source Module that abstracts communication
+#  with the CAN-FIX Aviation Protocol
+#  Copyright (c) 2012 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+# Reads redundant CAN buses and merges them into a single stream of frames
+
+import collections
+import heapq
+import itertools
+import threading
+import time
+from .globals import *
+
+
+class BusAggregator(object):
+    """Merges the frames from several buses into one stream
+
+    A thread reads each bus and puts the frames in a heap ordered by the
+    frame timestamp.  A frame is handed out by recv() once it is 'window'
+    seconds older than the newest frame seen on any bus, or once it has been
+    waiting for 'window' seconds, so frames from a bus that is running a
+    little behind still come out in timestamp order.
+
+    A frame with the same arbitration ID and data as one that was already
+    handed out from a different bus within 'tolerance' seconds is a copy
+    from a redundant bus and is thrown away.  Repeated frames from the same
+    bus are never thrown away.
+
+    :param buses: The buses to read
+    :type buses: list
+    :param window: The reorder window in seconds
+    :type window: float, optional
+    :param tolerance: The largest time difference between duplicates
+    :type tolerance: float, optional
+    :param timeout: How long the reader threads wait before checking for stop()
+    :type timeout: float, optional
+    """
+    def __init__(self, buses, window=0.005, tolerance=0.002, timeout=0.1):
+        self.buses = list(buses)
+        self.window = window
+        self.tolerance = tolerance
+        self.timeout = timeout
+        self.received = [0] * len(self.buses)
+        self.duplicates = 0
+        self.late = 0
+        self.released = 0
+        self.__heap = []
+        self.__seq = itertools.count()
+        self.__newest = None
+        self.__lastReleased = None
+        self.__recent = {}                     # (id, data): (timestamp, bus)
+        self.__recentOrder = collections.deque()
+        self.__cond = threading.Condition()
+        self.__running = threading.Event()
+        self.__threads = []
+        for n, bus in enumerate(self.buses):
+            t = threading.Thread(target=self.__read, args=(n, bus), name="canfix-bus-{}".format(n))
+            t.daemon = True
+            self.__threads.append(t)
+
+    def start(self):
+        self.__running.set()
+        for each in self.__threads:
+            each.start()
+
+    def stop(self):
+        """Stops the reader threads.  The buses are not shut down."""
+        self.__running.clear()
+        for each in self.__threads:
+            each.join()
+        with self.__cond:
+            self.__cond.notify_all()
+
+    def __read(self, n, bus):
+        while self.__running.is_set():
+            msg = bus.recv(self.timeout)
+            if msg is None:
+                continue
+            self.put(msg, n)
+
+    def put(self, msg, n=0):
+        """Adds a frame from bus number n.  The reader threads call this but it
+        can also be used to feed frames from somewhere else."""
+        now = time.time()
+        if not msg.timestamp:
+            msg.timestamp = now
+        with self.__cond:
+            if n >= len(self.received):
+                self.received.extend([0] * (n + 1 - len(self.received)))
+            self.received[n] += 1
+            heapq.heappush(self.__heap, (msg.timestamp, next(self.__seq), now, n, msg))
+            if self.__newest is None or msg.timestamp > self.__newest:
+                self.__newest = msg.timestamp
+            self.__cond.notify()
+
+    def __isDuplicate(self, msg, n):
+        key = (msg.arbitration_id, bytes(msg.data))
+        ts = msg.timestamp
+        # Forget about frames that are too old to have duplicates
+        while self.__recentOrder and self.__recentOrder[0][0] < ts - self.tolerance - self.window:
+            old = self.__recentOrder.popleft()
+            if self.__recent.get(old[1], (None,))[0] == old[0]:
+                del self.__recent[old[1]]
+        last = self.__recent.get(key)
+        if last is not None and last[1] != n and abs(ts - last[0]) <= self.tolerance:
+            return True
+        self.__recent[key] = (ts, n)
+        self.__recentOrder.append((ts, key))
+        return False
+
+    def recv(self, timeout=None):
+        """Returns the next frame in timestamp order
+
+        The channel attribute of the message is left as the bus set it so the
+        caller can tell where each frame came from.
+
+        :param timeout: Seconds to wait for a frame.  None waits forever
+        :type timeout: float, optional
+        :returns: A can.Message or None if the timeout expires
+        """
+        end = None if timeout is None else time.time() + timeout
+        with self.__cond:
+            while True:
+                now = time.time()
+                wait = None
+                if self.__heap:
+                    ts, seq, arrived, n, msg = self.__heap[0]
+                    if ts <= self.__newest - self.window or now - arrived >= self.window:
+                        heapq.heappop(self.__heap)
+                        if self.__isDuplicate(msg, n):
+                            self.duplicates += 1
+                            continue
+                        if self.__lastReleased is not None and ts < self.__lastReleased:
+                            self.late += 1
+                        else:
+                            self.__lastReleased = ts
+                        self.released += 1
+                        return msg
+                    wait = arrived + self.window - now
+                if end is not None:
+                    if now >= end:
+                        return None
+                    wait = end - now if wait is None else min(wait, end - now)
+                self.__cond.wait(wait)
+
+    def __iter__(self):
+        while self.__running.is_set() or self.__heap:
+            msg = self.recv(self.timeout)
+            if msg is not None:
+                yield msg
+
+    def counters(self):
+        """Returns a dictionary of the aggregator counters"""
+        return {"received": list(self.received),
+                "released": self.released,
+                "duplicates": self.duplicates,
+                "late": self.late,
+                "pending": len(self.__heap)}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
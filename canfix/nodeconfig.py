@@ -0,0 +1,472 @@
+#!/usr/bin/env python
+
+#  CAN-FIX Protocol Module - An Open Source Module that abstracts communication
+#  with the CAN-FIX Aviation Protocol
+#  Copyright (c) 2012 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+# A client that reads and writes node configuration keys with the Node
+# Configuration Query and Node Configuration Set messages, keeping several
+# requests on the bus at once instead of waiting for each response.
+
+import collections
+import threading
+import time
+from .globals import *
+from .messages import NodeConfigurationQuery, NodeConfigurationSet
+from .utils import getTypeSize, getValue
+
+CONFIG_SET = 0x09
+CONFIG_QUERY = 0x0A
+
+
+class ConfigurationError(Exception):
+    """Raised when a node answers a configuration request with an error code"""
+    def __init__(self, node, key, error):
+        super(ConfigurationError, self).__init__(
+            "Node {} returned error {} for configuration key {}".format(node, error, key))
+        self.node = node
+        self.key = key
+        self.error = error
+
+
+class ConfigRegistry(object):
+    """Maps configuration keys to their datatype and multiplier
+
+    Keys can be registered for every node or for one node only.  A node
+    specific entry wins over the general one.
+    """
+    def __init__(self):
+        self.__types = {}  # (node or None, key): (datatype, multiplier)
+
+    def register(self, key, datatype, multiplier=1.0, node=None):
+        if key < 0 or key > 65535:
+            raise ValueError("Key must be between 0 and 65535")
+        getTypeSize(datatype)  # Raises KeyError for an unknown type
+        self.__types[(node, key)] = (datatype, multiplier)
+
+    def update(self, keys, node=None):
+        """Registers every entry in a dictionary of key: datatype or
+        key: (datatype, multiplier)"""
+        for key, value in keys.items():
+            if isinstance(value, str):
+                self.register(key, value, node=node)
+            else:
+                self.register(key, value[0], value[1], node)
+
+    def lookup(self, node, key):
+        """Returns the (datatype, multiplier) tuple for a key or None"""
+        result = self.__types.get((node, key))
+        if result is None:
+            result = self.__types.get((None, key))
+        return result
+
+    def __len__(self):
+        return len(self.__types)
+
+
+class ConfigRequest(object):
+    """A single configuration query or set that has been given to the client
+
+    :ivar node: The node the request is sent to
+    :ivar key: The configuration key
+    :ivar value: For a set the value being written.  For a query the value
+                 that was read once the request is done.  Queries of keys
+                 with no registered datatype return the raw bytes.
+    :ivar attempts: How many times the request has been sent
+    """
+    def __init__(self, code, node, key, value=None, datatype=None, multiplier=1.0):
+        self.code = code
+        self.node = node
+        self.key = key
+        self.value = value
+        self.datatype = datatype
+        self.multiplier = multiplier
+        self.size = None if datatype is None else getTypeSize(datatype)
+        self.attempts = 0
+        self.sentTime = None
+        self.error = None
+        self.__result = None
+        self.__done = threading.Event()
+
+    def message(self, sendNode):
+        if self.code == CONFIG_QUERY:
+            m = NodeConfigurationQuery(key=self.key)
+        else:
+            m = NodeConfigurationSet(key=self.key, value=self.value,
+                                     datatype=self.datatype, multiplier=self.multiplier)
+        m.sendNode = sendNode
+        m.destNode = self.node
+        return m.msg
+
+    def answer(self, data):
+        """Stores the response data until the client confirms it"""
+        self.__result = bytes(data)
+
+    def forget(self):
+        self.__result = None
+
+    def finish(self, error=None):
+        if error is None:
+            error = self.__result[0]
+            if error:
+                self.error = ConfigurationError(self.node, self.key, error)
+            elif self.code == CONFIG_QUERY:
+                if self.datatype is None:
+                    self.value = self.__result[1:]
+                else:
+                    self.value = getValue(self.datatype, bytearray(self.__result[1:]), self.multiplier)
+        else:
+            self.error = error
+        self.__done.set()
+
+    def done(self, timeout=0):
+        """Returns True if the request has finished, waiting up to timeout
+        seconds for it"""
+        if timeout:
+            return self.__done.wait(timeout)
+        return self.__done.is_set()
+
+    def wait(self, timeout=None):
+        """Waits for the request to finish
+
+        :returns: The value for a query or the value written for a set
+        :raises: ConfigurationError if the node returned an error,
+                 TimeoutError if the node never answered
+        """
+        if not self.__done.wait(timeout):
+            raise TimeoutError("Configuration key {} on node {} is still pending".format(self.key, self.node))
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class _Channel(object):
+    # The requests of one type that are waiting on one node
+    def __init__(self, depth):
+        self.depth = depth
+        self.sent = collections.deque()
+        self.provisional = []
+        self.quiet = None  # Answers are ignored until this time
+
+
+class ConfigurationClient(object):
+    """Reads and writes node configuration keys with many requests in flight
+
+    Node Configuration responses do not repeat the key that was asked for,
+    only the sending node, the destination node and the control code, so
+    responses are matched to requests in the order the requests were sent.
+    Up to 'depth' requests of each type are sent to a node before the first
+    one is answered and no more than 'window' are outstanding across every
+    node.
+
+    A lost response would make every later response on that node match the
+    wrong request, so an answer is only provisional until every request that
+    was in flight with it has been answered.  If the oldest request times
+    out, or a query answer is not the size of the registered datatype, the
+    client ignores that node for one timeout period, so that answers still on
+    their way are thrown away, and then sends all of the unconfirmed requests
+    again one at a time until the node has caught up.  A request that times out more than 'retries'
+    times fails with TimeoutError.
+
+    Responses have to be passed to handleMessage().  start() runs a thread
+    that reads the bus and does this, or the client can be added to a
+    can.Notifier or fed from a ReceivePipeline.
+
+    :param bus: The bus to send on
+    :type bus: can.BusABC
+    :param node: Our node number
+    :type node: int
+    :param registry: The datatypes of the configuration keys
+    :type registry: ConfigRegistry, optional
+    :param window: The most requests outstanding across all nodes
+    :type window: int, optional
+    :param depth: The most requests of one type outstanding on a node
+    :type depth: int, optional
+    :param timeout: Seconds to wait for each response
+    :type timeout: float, optional
+    :param retries: How many times a request is sent again after a timeout
+    :type retries: int, optional
+    :param burst: After this many requests to one node the client waits for
+                  them all to be answered so that they can be confirmed
+    :type burst: int, optional
+    """
+    def __init__(self, bus, node, registry=None, window=16, depth=4, timeout=0.25,
+                 retries=2, burst=32):
+        self.bus = bus
+        self.node = node
+        self.registry = ConfigRegistry() if registry is None else registry
+        self.window = window
+        self.depth = depth
+        self.timeout = timeout
+        self.retries = retries
+        self.burst = max(burst, depth)
+        self.sent = 0
+        self.timeouts = 0
+        self.mismatches = 0
+        self.stale = 0
+        self.sendErrors = 0
+        self.__pending = collections.deque()
+        self.__channels = {}  # (node, control code): _Channel
+        self.__outstanding = 0
+        self.__lock = threading.Lock()
+        self.__running = False
+        self.__thread = None
+
+    def query(self, node, key):
+        """Starts reading a configuration key
+
+        :returns: A ConfigRequest.  Call wait() on it for the value.
+        """
+        t = self.registry.lookup(node, key)
+        if t is None:
+            r = ConfigRequest(CONFIG_QUERY, node, key)
+        else:
+            r = ConfigRequest(CONFIG_QUERY, node, key, datatype=t[0], multiplier=t[1])
+        self.submit([r])
+        return r
+
+    def set(self, node, key, value):
+        """Starts writing a configuration key.  The key must be registered.
+
+        :returns: A ConfigRequest.  Call wait() on it to see if it worked.
+        """
+        t = self.registry.lookup(node, key)
+        if t is None:
+            raise TypeMissingError("No datatype registered for configuration key {}".format(key))
+        r = ConfigRequest(CONFIG_SET, node, key, value, t[0], t[1])
+        self.submit([r])
+        return r
+
+    def queryAll(self, node, keys):
+        """Reads a list of keys from a node and waits for all of them
+
+        :returns: A dictionary of key: value.  Keys that failed have the
+                  exception as their value.
+        """
+        requests = []
+        for key in keys:
+            t = self.registry.lookup(node, key)
+            if t is None:
+                requests.append(ConfigRequest(CONFIG_QUERY, node, key))
+            else:
+                requests.append(ConfigRequest(CONFIG_QUERY, node, key, datatype=t[0], multiplier=t[1]))
+        self.submit(requests)
+        return self.__collect(requests)
+
+    def setAll(self, node, values):
+        """Writes a dictionary of key: value to a node and waits for all of them
+
+        :returns: A dictionary of key: None for success or the exception
+        """
+        requests = []
+        for key, value in values.items():
+            t = self.registry.lookup(node, key)
+            if t is None:
+                raise TypeMissingError("No datatype registered for configuration key {}".format(key))
+            requests.append(ConfigRequest(CONFIG_SET, node, key, value, t[0], t[1]))
+        self.submit(requests)
+        result = self.__collect(requests)
+        for key in result:
+            if not isinstance(result[key], Exception):
+                result[key] = None
+        return result
+
+    def __collect(self, requests):
+        result = {}
+        for r in requests:
+            self.waitFor(r)
+            result[r.key] = r.value if r.error is None else r.error
+        return result
+
+    def waitFor(self, request):
+        """Waits for a request to finish, expiring timeouts while we wait"""
+        while not request.done():
+            wait = self.poll()
+            request.done(0.05 if wait is None else min(wait, 0.05))
+
+    def submit(self, requests):
+        """Queues ConfigRequest objects and sends as many as the window allows"""
+        with self.__lock:
+            self.__pending.extend(requests)
+            msgs = self.__fill(time.monotonic())
+        self.__send(msgs)
+
+    def __channel(self, r):
+        ch = self.__channels.get((r.node, r.code))
+        if ch is None:
+            ch = _Channel(self.depth)
+            self.__channels[(r.node, r.code)] = ch
+        return ch
+
+    def __fill(self, now):
+        # Moves requests from the pending queue to their channels while there
+        # is room.  Requests behind a full channel keep their place in line.
+        msgs = []
+        keep = collections.deque()
+        pending = self.__pending
+        while pending and self.__outstanding < self.window:
+            r = pending.popleft()
+            ch = self.__channel(r)
+            if ch.quiet is not None:
+                if ch.quiet > now:
+                    keep.append(r)
+                    continue
+                ch.quiet = None
+            if len(ch.sent) >= ch.depth or len(ch.sent) + len(ch.provisional) >= self.burst:
+                keep.append(r)
+                continue
+            r.attempts += 1
+            r.sentTime = now
+            ch.sent.append(r)
+            self.__outstanding += 1
+            msgs.append(r.message(self.node))
+        keep.extend(pending)
+        self.__pending = keep
+        return msgs
+
+    def __send(self, msgs):
+        for msg in msgs:
+            try:
+                self.bus.send(msg)
+                self.sent += 1
+            except Exception as e:
+                log.error("Unable to send configuration request - {}".format(e))
+                self.sendErrors += 1
+
+    def handleMessage(self, msg):
+        """Checks a received frame for a configuration response
+
+        :returns: True if the frame answered one of our requests
+        """
+        identifier = msg.arbitration_id
+        data = msg.data
+        if msg.is_error_frame or identifier < NODE_SPECIFIC_MSGS or identifier >= TWOWAY_CONN_CHANS:
+            return False
+        if len(data) < 3 or data[0] not in (CONFIG_SET, CONFIG_QUERY) or data[1] != self.node:
+            return False
+        if data[0] == CONFIG_SET and len(data) != 3:
+            return False  # Another node setting one of our keys
+        now = time.monotonic()
+        with self.__lock:
+            ch = self.__channels.get((identifier - NODE_SPECIFIC_MSGS, data[0]))
+            if ch is None:
+                return False
+            if ch.quiet is not None and ch.quiet > now:
+                self.stale += 1
+                return True
+            if not ch.sent:
+                return False
+            r = ch.sent[0]
+            if data[2] == 0 and r.size is not None and r.code == CONFIG_QUERY and len(data) != 3 + r.size:
+                self.mismatches += 1
+                self.__resync(ch, r, now)
+            else:
+                ch.sent.popleft()
+                self.__outstanding -= 1
+                r.answer(data[2:])
+                ch.provisional.append(r)
+                if not ch.sent:
+                    # Everything that was in flight got an answer so the
+                    # matches can be trusted
+                    for each in ch.provisional:
+                        each.finish()
+                    ch.provisional = []
+                    ch.depth = self.depth
+            msgs = self.__fill(now)
+        self.__send(msgs)
+        return True
+
+    on_message_received = handleMessage
+
+    def __resync(self, ch, culprit, now):
+        # Sends every unconfirmed request on the channel again, one at a time
+        retry = ch.provisional + list(ch.sent)
+        self.__outstanding -= len(ch.sent)
+        ch.sent.clear()
+        ch.provisional = []
+        ch.depth = 1
+        ch.quiet = now + self.timeout
+        requeue = []
+        for r in retry:
+            r.forget()
+            if r is culprit and r.attempts > self.retries:
+                r.finish(TimeoutError("No response from node {} for configuration key {}".format(r.node, r.key)))
+            else:
+                requeue.append(r)
+        self.__pending.extendleft(reversed(requeue))
+
+    def poll(self, now=None):
+        """Expires requests that have timed out and sends the next ones
+
+        :returns: Seconds until the next request times out or None if
+                  nothing is outstanding
+        """
+        if now is None:
+            now = time.monotonic()
+        wait = None
+        with self.__lock:
+            for ch in self.__channels.values():
+                if ch.quiet is not None and ch.quiet > now:
+                    if wait is None or ch.quiet - now < wait:
+                        wait = ch.quiet - now
+                if not ch.sent:
+                    continue
+                head = ch.sent[0]
+                due = head.sentTime + self.timeout
+                if due <= now:
+                    self.timeouts += 1
+                    self.__resync(ch, head, now)
+                elif wait is None or due - now < wait:
+                    wait = due - now
+            msgs = self.__fill(now)
+            if msgs:
+                wait = self.timeout if wait is None else min(wait, self.timeout)
+        self.__send(msgs)
+        return wait
+
+    def outstanding(self):
+        """Returns the number of requests that are sent or waiting to be sent"""
+        with self.__lock:
+            return len(self.__pending) + self.__outstanding
+
+    def start(self):
+        """Starts a thread that reads responses from the bus"""
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__run, name="canfix-config")
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self):
+        self.__running = False
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def __run(self):
+        while self.__running:
+            wait = self.poll()
+            msg = self.bus.recv(0.05 if wait is None else min(wait, 0.05))
+            if msg is not None:
+                self.handleMessage(msg)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+
+#  CAN-FIX Protocol Module - An Open Source Module that abstracts communication
+#  with the CAN-FIX Aviation Protocol
+#  Copyright (c) 2012 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+# Decodes large recordings with several processes.  The recording is split
+# into chunks of whole blocks, each chunk is decoded in a worker process and
+# the results are merged in file order so the answer is the same no matter
+# how many workers are used.
+
+import concurrent.futures
+import os
+from .globals import *
+from . import parseMessage
+from .messages import NodeAlarm
+from .export import ParameterColumns
+from .index import openRecording
+from .recording import idBitmap
+from .state import RunningStats, isNumeric
+
+
+def captureChunks(blocks, blocksPerChunk=None, seconds=None):
+    """Splits a list of blocks into chunks
+
+    A chunk is ended when it has blocksPerChunk blocks or covers more than
+    'seconds' of time, whichever comes first.  Chunks always hold whole
+    blocks so they start and end on record boundaries.
+
+    :param blocks: From RecordingReader.blocks() or CompressedReader.blocks()
+    :type blocks: list
+    :returns: A list of lists of BlockInfo objects
+    """
+    if blocksPerChunk is None and seconds is None:
+        blocksPerChunk = 16
+    result = []
+    chunk = []
+    for block in blocks:
+        chunk.append(block)
+        full = blocksPerChunk is not None and len(chunk) >= blocksPerChunk
+        if seconds is not None and block.end - chunk[0].start >= seconds:
+            full = True
+        if full:
+            result.append(chunk)
+            chunk = []
+    if chunk:
+        result.append(chunk)
+    return result
+
+
+def decodeChunk(name, blocks, parameters, alarms=True):
+    """Decodes the blocks of a recording
+
+    This is what each worker process runs.  It can also be called directly.
+
+    :returns: A dictionary with 'columns' and 'stats' for each
+              (node, identifier, index), a list of 'alarms' as
+              (timestamp, node, alarm, data) tuples and the 'frames' and
+              'parseErrors' counts
+    """
+    columns = ParameterColumns(parameters)
+    wanted = set(columns.ids)
+    if alarms:
+        wanted.update(range(NODE_ALARMS, HIGH_PRIORITY_DATA))
+    mask = idBitmap(wanted)
+    alarmList = []
+    frames = 0
+    parseErrors = 0
+    with openRecording(name) as r:
+        for block in blocks:
+            if not block.containsAny(mask):
+                continue
+            for msg in r.readFrames(block, wanted):
+                frames += 1
+                if msg.arbitration_id < HIGH_PRIORITY_DATA:
+                    try:
+                        a = parseMessage(msg)
+                    except Exception as e:
+                        log.debug("Unable to parse message {} - {}".format(msg, e))
+                        parseErrors += 1
+                        continue
+                    if isinstance(a, NodeAlarm):
+                        alarmList.append((msg.timestamp, a.node, a.alarm, bytes(a.data)))
+                else:
+                    columns.add(msg)
+    stats = {}
+    for key, (times, values, functions) in columns.columns.items():
+        s = RunningStats()
+        for t, v, fn in zip(times, values, functions):
+            if isNumeric(v) and not fn & 0x04:
+                s.add(v, t)
+        stats[key] = s
+    return {"columns": columns.columns,
+            "stats": stats,
+            "alarms": alarmList,
+            "frames": frames,
+            "parseErrors": parseErrors + columns.decodeErrors}
+
+
+def mergeResults(results):
+    """Merges the results from decodeChunk() in the order given"""
+    merged = {"columns": {}, "stats": {}, "alarms": [], "frames": 0, "parseErrors": 0}
+    for r in results:
+        for key, c in r["columns"].items():
+            m = merged["columns"].get(key)
+            if m is None:
+                merged["columns"][key] = ([], [], [])
+                m = merged["columns"][key]
+            for dest, src in zip(m, c):
+                dest.extend(src)
+        for key, s in r["stats"].items():
+            merged["stats"].setdefault(key, RunningStats()).merge(s)
+        merged["alarms"].extend(r["alarms"])
+        merged["frames"] += r["frames"]
+        merged["parseErrors"] += r["parseErrors"]
+    return merged
+
+
+def decodeCapture(name, parameters, workers=None, blocksPerChunk=None, seconds=None,
+                  alarms=True):
+    """Decodes parameters and alarms from a recording using several processes
+
+    The result is the same as calling decodeChunk() on the whole file.  With
+    workers set to 1 everything is done in the calling process.
+
+    :param name: The file name of a native recording, plain or compressed
+    :type name: str
+    :param parameters: Parameter names or IDs to decode
+    :type parameters: list
+    :param workers: The number of processes.  Defaults to the number of CPUs
+    :type workers: int, optional
+    :param blocksPerChunk: Blocks given to a worker at a time.  If this and
+                           seconds are both None the blocks are spread over
+                           four chunks per worker.
+    :type blocksPerChunk: int, optional
+    :param seconds: The most recording time given to a worker at a time
+    :type seconds: float, optional
+    :param alarms: Collect node alarms as well
+    :type alarms: bool, optional
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    with openRecording(name) as r:
+        blocks = r.blocks()
+    if blocksPerChunk is None and seconds is None:
+        blocksPerChunk = max(1, -(-len(blocks) // (workers * 4)))
+    chunks = captureChunks(blocks, blocksPerChunk, seconds)
+    if workers == 1 or len(chunks) < 2:
+        results = [decodeChunk(name, c, parameters, alarms) for c in chunks]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers) as ex:
+            results = list(ex.map(decodeChunk, [name] * len(chunks), chunks,
+                                  [parameters] * len(chunks), [alarms] * len(chunks)))
+    return mergeResults(results)
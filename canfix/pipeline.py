@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+
+#  CAN-FIX Protocol Module - An Open Source Module that abstracts communication
+#  with the CAN-FIX Aviation Protocol
+#  Copyright (c) 2012 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+# A threaded receive pipeline.  One thread reads the bus as fast as it can
+# and hands the frames to decode workers which hand the parsed objects to
+# handler workers.  The queues between the stages are bounded so a slow
+# handler costs us frames in our queues, where we can count them and choose
+# which ones to lose, instead of in the kernel socket buffer.
+
+import collections
+import itertools
+import threading
+from .globals import *
+from . import parseMessage
+from .messages import Parameter
+from .utils import frameKey, parameterKey
+
+# Overflow policies for the pipeline queues
+DROP_OLDEST = 0
+DROP_NEWEST = 1
+COALESCE = 2
+
+
+def objectKey(obj):
+    """Returns the key that frameKey() gives the message of a Parameter
+    object or None"""
+    if isinstance(obj, Parameter):
+        return parameterKey(obj.node, obj.identifier, obj.index, obj.function >> 4)
+    return None
+
+
+class BoundedQueue(object):
+    """A thread safe FIFO queue that never blocks the producer
+
+    When the queue is full put() follows the overflow policy.  DROP_OLDEST
+    throws away the item at the head of the queue, DROP_NEWEST throws away
+    the item being put.  COALESCE replaces an item that is already waiting
+    with the same key in place and otherwise drops the oldest item.  Items
+    that keyfunc returns None for are never coalesced.
+
+    :param maxsize: The most items that can be waiting
+    :type maxsize: int
+    :param policy: DROP_OLDEST, DROP_NEWEST or COALESCE
+    :param keyfunc: Returns the coalescing key for an item
+    :type keyfunc: callable, optional
+    """
+    def __init__(self, maxsize, policy=DROP_OLDEST, keyfunc=None):
+        if policy not in (DROP_OLDEST, DROP_NEWEST, COALESCE):
+            raise ValueError("Unknown overflow policy {}".format(policy))
+        if policy == COALESCE and keyfunc is None:
+            raise ValueError("COALESCE policy requires a key function")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.keyfunc = keyfunc
+        self.drops = 0
+        self.coalesced = 0
+        self.highWater = 0
+        self.__items = collections.OrderedDict()
+        self.__unique = itertools.count()
+        self.__cond = threading.Condition()
+
+    def put(self, item):
+        """Adds an item to the queue.
+
+        :returns: False if the item was dropped
+        """
+        with self.__cond:
+            key = None
+            if self.policy == COALESCE:
+                key = self.keyfunc(item)
+                if key is not None and key in self.__items:
+                    self.__items[key] = item
+                    self.coalesced += 1
+                    return True
+            if len(self.__items) >= self.maxsize:
+                self.drops += 1
+                if self.policy == DROP_NEWEST:
+                    return False
+                self.__items.popitem(last=False)
+            if key is None:
+                key = (next(self.__unique),)  # Can't collide with an int key
+            self.__items[key] = item
+            if len(self.__items) > self.highWater:
+                self.highWater = len(self.__items)
+            self.__cond.notify()
+            return True
+
+    def get(self, timeout=None):
+        """Removes and returns the oldest item.
+
+        :returns: None if the timeout expires
+        """
+        with self.__cond:
+            if not self.__items:
+                self.__cond.wait(timeout)
+                if not self.__items:
+                    return None
+            return self.__items.popitem(last=False)[1]
+
+    def wakeAll(self):
+        """Wakes up every thread waiting in get()"""
+        with self.__cond:
+            self.__cond.notify_all()
+
+    def qsize(self):
+        return len(self.__items)
+
+
+class ReceivePipeline(object):
+    """Reads, decodes and handles CAN-FIX messages in separate threads
+
+    The handler is called with each parsed CAN-FIX object from one of the
+    handler threads.  If more than one decode or handler thread is used the
+    handler may see messages out of order.
+
+    :param bus: The bus to read from
+    :type bus: can.BusABC
+    :param handler: Called with each parsed object
+    :type handler: callable
+    :param decoders: The number of decode threads
+    :type decoders: int, optional
+    :param handlers: The number of handler threads
+    :type handlers: int, optional
+    :param rawSize: Size of the queue between the receive and decode threads
+    :type rawSize: int, optional
+    :param parsedSize: Size of the queue between the decode and handler threads
+    :type parsedSize: int, optional
+    :param policy: Overflow policy for both queues
+    :param timeout: How long the threads wait before checking for stop()
+    :type timeout: float, optional
+    :param metrics: Counts every received frame and parse error
+    :type metrics: canfix.metrics.BusMetrics, optional
+    """
+    def __init__(self, bus, handler, decoders=1, handlers=1, rawSize=4096,
+                 parsedSize=1024, policy=DROP_OLDEST, timeout=0.1, metrics=None):
+        self.bus = bus
+        self.metrics = metrics
+        self.handler = handler
+        self.timeout = timeout
+        self.raw = BoundedQueue(rawSize, policy, frameKey)
+        self.parsed = BoundedQueue(parsedSize, policy, objectKey)
+        self.received = 0
+        # Each worker thread counts into its own slot so no locking is needed
+        self.__decoded = [0] * decoders
+        self.__parseErrors = [0] * decoders
+        self.__handled = [0] * handlers
+        self.__handlerErrors = [0] * handlers
+        self.__running = threading.Event()
+        self.__threads = [threading.Thread(target=self.__receive, name="canfix-receive")]
+        for n in range(decoders):
+            self.__threads.append(threading.Thread(target=self.__decode, args=(n,), name="canfix-decode-{}".format(n)))
+        for n in range(handlers):
+            self.__threads.append(threading.Thread(target=self.__handle, args=(n,), name="canfix-handler-{}".format(n)))
+        for each in self.__threads:
+            each.daemon = True
+
+    def start(self):
+        self.__running.set()
+        for each in self.__threads:
+            each.start()
+
+    def stop(self):
+        """Stops all of the threads.  Anything left in the queues is lost."""
+        self.__running.clear()
+        self.raw.wakeAll()
+        self.parsed.wakeAll()
+        for each in self.__threads:
+            each.join()
+
+    def __receive(self):
+        while self.__running.is_set():
+            msg = self.bus.recv(self.timeout)
+            if msg is not None:
+                self.received += 1
+                if self.metrics is not None:
+                    self.metrics.on_message_received(msg)
+                self.raw.put(msg)
+
+    def __decode(self, n):
+        while self.__running.is_set():
+            msg = self.raw.get(self.timeout)
+            if msg is None:
+                continue
+            try:
+                obj = parseMessage(msg)
+            except Exception as e:
+                log.debug("Unable to parse message {} - {}".format(msg, e))
+                self.__parseErrors[n] += 1
+                if self.metrics is not None:
+                    self.metrics.parseError(msg)
+                continue
+            if obj is not None:
+                self.__decoded[n] += 1
+                self.parsed.put(obj)
+
+    def __handle(self, n):
+        while self.__running.is_set():
+            obj = self.parsed.get(self.timeout)
+            if obj is None:
+                continue
+            try:
+                self.handler(obj)
+                self.__handled[n] += 1
+            except Exception as e:
+                log.error("CAN-FIX message handler failed - {}".format(e))
+                self.__handlerErrors[n] += 1
+
+    def counters(self):
+        """Returns a dictionary of the pipeline counters"""
+        return {"received": self.received,
+                "decoded": sum(self.__decoded),
+                "handled": sum(self.__handled),
+                "parseErrors": sum(self.__parseErrors),
+                "handlerErrors": sum(self.__handlerErrors),
+                "rawDepth": self.raw.qsize(),
+                "rawHighWater": self.raw.highWater,
+                "rawDrops": self.raw.drops,
+                "rawCoalesced": self.raw.coalesced,
+                "parsedDepth": self.parsed.qsize(),
+                "parsedHighWater": self.parsed.highWater,
+                "parsedDrops": self.parsed.drops,
+                "parsedCoalesced": self.parsed.coalesced}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
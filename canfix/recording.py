@@ -0,0 +1,358 @@
+#!/usr/bin/env python
+
+#  CAN-FIX Protocol Module - An Open Source Module that abstracts communication
+#  with the CAN-FIX Aviation Protocol
+#  Copyright (c) 2012 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+# A compact binary format for recording CAN-FIX traffic
+#
+# The file starts with a FILE_HEADER and is followed by blocks.  Each block
+# has a BLOCK_HEADER followed by 'count' fixed size records.  The block
+# header holds the time range of the block and a bitmap with one bit for
+# each of the 2048 standard identifiers so a reader can skip any block that
+# doesn't have what it is looking for without reading the records.
+#
+# Each record is 16 bytes.  The timestamp is stored as microseconds since
+# the first frame of the block.  All values are little endian.
+
+import struct
+import can
+from .globals import *
+
+MAGIC = b"CFXR"
+BLOCK_MAGIC = b"CFXB"
+VERSION = 1
+
+# magic, version, records per block, reserved, time the recording started
+FILE_HEADER = struct.Struct("<4sHHd")
+# magic, record count, first timestamp, last timestamp, ID bitmap
+BLOCK_HEADER = struct.Struct("<4sIdd256s")
+# timestamp delta (us), flags and ID, dlc, reserved, data
+RECORD = struct.Struct("<IHBx8s")
+
+FLAG_ERROR = 0x8000
+FLAG_REMOTE = 0x4000
+ID_MASK = 0x07FF
+
+MAX_DELTA = 0xFFFFFFFF
+
+
+class RecordingError(Exception):
+    pass
+
+
+class BlockInfo(object):
+    """The header of one block in a recording"""
+    def __init__(self, offset, count, start, end, bitmap):
+        self.offset = offset  # Offset of the first record in the file
+        self.count = count
+        self.start = start
+        self.end = end
+        self.bitmap = bitmap
+
+    def contains(self, identifier):
+        """Returns True if the block has at least one frame with this ID"""
+        return bool(self.bitmap[identifier >> 3] & (1 << (identifier & 7)))
+
+    def containsAny(self, mask):
+        """Returns True if the block has any of the IDs in mask
+
+        :param mask: A bitmap like the one returned by idBitmap()
+        :type mask: bytes
+        """
+        return int.from_bytes(self.bitmap, "little") & int.from_bytes(mask, "little") != 0
+
+    def overlaps(self, start=None, end=None):
+        """Returns True if part of the block is between start and end"""
+        if start is not None and self.end < start:
+            return False
+        if end is not None and self.start > end:
+            return False
+        return True
+
+
+def idBitmap(ids):
+    """Returns a 256 byte bitmap with a bit set for each identifier"""
+    bitmap = bytearray(256)
+    for each in ids:
+        bitmap[each >> 3] |= 1 << (each & 7)
+    return bytes(bitmap)
+
+
+def blockFrames(block, data, wanted=None):
+    """Yields can.Message objects from the record bytes of a block
+
+    :param block: The block the records came from
+    :type block: BlockInfo
+    :param data: The record bytes
+    :type data: bytes
+    :param wanted: Only return frames with identifiers in this set
+    :type wanted: set, optional
+    """
+    for delta, flags, dlc, payload in RECORD.iter_unpack(data):
+        identifier = flags & ID_MASK
+        if wanted is not None and identifier not in wanted:
+            continue
+        yield can.Message(timestamp=block.start + delta / 1000000.0,
+                          arbitration_id=identifier, is_extended_id=False,
+                          is_error_frame=bool(flags & FLAG_ERROR),
+                          is_remote_frame=bool(flags & FLAG_REMOTE),
+                          dlc=dlc, data=payload[:dlc])
+
+
+def readHeader(header):
+    """Checks a file header and returns (blockSize, startTime)"""
+    if len(header) < FILE_HEADER.size:
+        raise RecordingError("File is too short to be a recording")
+    magic, version, blockSize, startTime = FILE_HEADER.unpack(header[:FILE_HEADER.size])
+    if magic != MAGIC:
+        raise RecordingError("Not a CAN-FIX recording")
+    if version != VERSION:
+        raise RecordingError("Unsupported recording version {}".format(version))
+    return blockSize, startTime
+
+
+def _open(f, mode):
+    if isinstance(f, str):
+        return open(f, mode), True
+    return f, False
+
+
+class RecordingWriter(can.Listener):
+    """Writes CAN frames to a recording
+
+    Frames are collected in memory until a block is full and then the block
+    is written all at once.  A block is also ended early if the next frame
+    is too far away in time to fit in a record.  This is a python-can
+    Listener so it can be given straight to a can.Notifier.
+
+    :param f: A file name or a binary file object opened for writing
+    :param blockSize: The most records in a block
+    :type blockSize: int, optional
+    :param startTime: Stored in the file header.  Defaults to the timestamp
+                      of the first frame.
+    :type startTime: float, optional
+    """
+    def __init__(self, f, blockSize=4096, startTime=None):
+        if not 0 < blockSize <= 0xFFFF:
+            raise ValueError("Block size must be between 1 and 65535")
+        self.blockSize = blockSize
+        self.frames = 0
+        self.blocks = 0
+        self.__file, self.__owner = _open(f, "wb")
+        self.__startTime = startTime
+        self.__headerWritten = False
+        self.__records = bytearray()
+        self.__count = 0
+        self.__first = None
+        self.__last = None
+        self.__bitmap = bytearray(256)
+
+    def __writeHeader(self):
+        self.__file.write(FILE_HEADER.pack(MAGIC, VERSION, self.blockSize,
+                                           self.__startTime or 0.0))
+        self.__headerWritten = True
+
+    def writeFrame(self, timestamp, identifier, data, flags=0):
+        """Adds a single frame to the recording
+
+        :param timestamp: The time of the frame in seconds
+        :type timestamp: float
+        :param identifier: The 11 bit arbitration ID
+        :type identifier: int
+        :param data: Up to 8 data bytes
+        :type data: bytes
+        :param flags: FLAG_ERROR and/or FLAG_REMOTE
+        :type flags: int, optional
+        """
+        if identifier > ID_MASK:
+            raise ValueError("Identifier 0x{:X} is not a standard identifier".format(identifier))
+        if len(data) > 8:
+            raise ValueError("Too much data for a CAN frame")
+        if self.__startTime is None:
+            self.__startTime = timestamp
+        if not self.__headerWritten:
+            self.__writeHeader()
+        if self.__first is not None:
+            delta = int(round((timestamp - self.__first) * 1000000))
+            if delta < 0 or delta > MAX_DELTA:
+                self.flush()
+        if self.__first is None:
+            self.__first = timestamp
+            delta = 0
+        self.__records += RECORD.pack(delta, identifier | flags, len(data), bytes(data))
+        self.__bitmap[identifier >> 3] |= 1 << (identifier & 7)
+        if self.__last is None or timestamp > self.__last:
+            self.__last = timestamp
+        self.__count += 1
+        self.frames += 1
+        if self.__count >= self.blockSize:
+            self.flush()
+
+    def write(self, msg):
+        """Adds a can.Message to the recording.  Extended frames are ignored."""
+        if msg.is_extended_id:
+            return
+        flags = 0
+        if msg.is_error_frame:
+            flags |= FLAG_ERROR
+        if msg.is_remote_frame:
+            flags |= FLAG_REMOTE
+        self.writeFrame(msg.timestamp, msg.arbitration_id, msg.data[:msg.dlc], flags)
+
+    on_message_received = write
+
+    def flush(self):
+        """Ends the current block and writes it to the file"""
+        if not self.__headerWritten:
+            self.__writeHeader()
+        if self.__count:
+            self.__file.write(BLOCK_HEADER.pack(BLOCK_MAGIC, self.__count, self.__first,
+                                                self.__last, bytes(self.__bitmap)))
+            self.__file.write(self.__records)
+            self.blocks += 1
+        self.__records = bytearray()
+        self.__count = 0
+        self.__first = None
+        self.__last = None
+        self.__bitmap = bytearray(256)
+        self.__file.flush()
+
+    def stop(self):
+        self.close()
+
+    def close(self):
+        """Writes anything that is left and closes the file if we opened it"""
+        if self.__file is None:
+            return
+        self.flush()
+        if self.__owner:
+            self.__file.close()
+        self.__file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class RecordingReader(object):
+    """Reads a recording written by RecordingWriter
+
+    Iterating over the reader gives every frame as a can.Message.  Use
+    frames() to only get some identifiers or a range of time.  Blocks that
+    can't have any matching frames are skipped without being read and are
+    counted in blocksSkipped.
+
+    :param f: A file name or a binary file object opened for reading
+    """
+    def __init__(self, f):
+        self.__file, self.__owner = _open(f, "rb")
+        try:
+            self.blockSize, self.startTime = readHeader(self.__file.read(FILE_HEADER.size))
+        except RecordingError:
+            self.close()
+            raise
+        self.blocksSkipped = 0
+        self.__blocks = None
+
+    def blocks(self):
+        """Returns a list of BlockInfo objects for every block in the file
+
+        Only the block headers are read.
+        """
+        if self.__blocks is None:
+            self.__blocks = []
+            offset = FILE_HEADER.size
+            while True:
+                self.__file.seek(offset)
+                header = self.__file.read(BLOCK_HEADER.size)
+                if len(header) < BLOCK_HEADER.size:
+                    break
+                magic, count, start, end, bitmap = BLOCK_HEADER.unpack(header)
+                if magic != BLOCK_MAGIC:
+                    raise RecordingError("Bad block header at offset {}".format(offset))
+                offset += BLOCK_HEADER.size
+                if offset + count * RECORD.size > self.__fileSize():
+                    log.warning("Recording is truncated at offset {}".format(offset))
+                    break
+                self.__blocks.append(BlockInfo(offset, count, start, end, bitmap))
+                offset += count * RECORD.size
+        return self.__blocks
+
+    def __fileSize(self):
+        pos = self.__file.tell()
+        size = self.__file.seek(0, 2)
+        self.__file.seek(pos)
+        return size
+
+    def readBlock(self, block):
+        """Returns the raw record bytes for a block"""
+        self.__file.seek(block.offset)
+        return self.__file.read(block.count * RECORD.size)
+
+    def readFrames(self, block, wanted=None):
+        """Yields the can.Message objects from a single block
+
+        :param wanted: Only return frames with identifiers in this set
+        :type wanted: set, optional
+        """
+        return blockFrames(block, self.readBlock(block), wanted)
+
+    def frames(self, ids=None, start=None, end=None):
+        """Yields can.Message objects in the order they were recorded
+
+        :param ids: Only return frames with these identifiers
+        :type ids: list, optional
+        :param start: Skip frames before this time
+        :type start: float, optional
+        :param end: Skip frames after this time
+        :type end: float, optional
+        """
+        wanted = None
+        mask = None
+        if ids is not None:
+            wanted = set(ids)
+            mask = idBitmap(wanted)
+        for block in self.blocks():
+            if not block.overlaps(start, end) or (mask is not None and not block.containsAny(mask)):
+                self.blocksSkipped += 1
+                continue
+            for msg in self.readFrames(block, wanted):
+                if start is not None and msg.timestamp < start:
+                    continue
+                if end is not None and msg.timestamp > end:
+                    continue
+                yield msg
+
+    def __iter__(self):
+        return self.frames()
+
+    def __len__(self):
+        return sum(b.count for b in self.blocks())
+
+    def close(self):
+        if self.__owner and self.__file is not None:
+            self.__file.close()
+        self.__file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
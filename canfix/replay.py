@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+
+#  CAN-FIX Protocol Module - An Open Source Module that abstracts communication
+#  with the CAN-FIX Aviation Protocol
+#  Copyright (c) 2012 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+# Replays recorded traffic onto a bus or into a message handler at the
+# speed it was recorded, or faster or slower.
+
+import threading
+import time
+from .globals import *
+from . import parseMessage
+
+
+class Replay(object):
+    """Sends recorded frames with the same timing they were recorded with
+
+    Each frame is sent at an absolute time worked out from the time the
+    replay started and the frame timestamp, so time lost sleeping or sending
+    is made up on the following frames instead of adding up.  Frames that
+    can't be sent on time are sent as soon as possible and counted in late.
+
+    Frames go to a bus, or anything with a send(msg) method, or to a handler
+    that is called with each parsed CAN-FIX object.
+
+    :param source: A RecordingReader or any iterable of can.Message objects
+                   such as a list or a can.LogReader.  seek() needs a source
+                   that can be iterated more than once.
+    :param bus: Where to send the frames
+    :type bus: can.BusABC, optional
+    :param handler: Called with the parsed object for each frame
+    :type handler: callable, optional
+    :param speed: 1.0 is real time, 2.0 twice as fast.  None sends the
+                  frames as fast as possible.
+    :type speed: float, optional
+    :param ids: Only replay these identifiers
+    :type ids: list, optional
+    :param start: Timestamp of the first frame to replay
+    :type start: float, optional
+    :param end: Timestamp to stop at
+    :type end: float, optional
+    """
+    def __init__(self, source, bus=None, handler=None, speed=1.0, ids=None,
+                 start=None, end=None):
+        if bus is None and handler is None:
+            raise ValueError("Either a bus or a handler is required")
+        if speed is not None and speed <= 0:
+            raise ValueError("Speed must be greater than zero")
+        self.source = source
+        self.bus = bus
+        self.handler = handler
+        self.ids = None if ids is None else set(ids)
+        self.start = start
+        self.end = end
+        self.sendErrors = 0
+        self.parseErrors = 0
+        self.__speed = speed
+        self.__anchor = None
+        self.__seekTo = None
+        self.__stop = threading.Event()
+        self.__wake = threading.Condition()  # Interrupts the wait for a frame
+        self.__thread = None
+        self.__resetStats()
+
+    def __resetStats(self):
+        self.sent = 0
+        self.late = 0
+        self.maxLag = 0.0
+        self.__first = None
+        self.__last = None
+        self.__wallStart = None
+        self.__wallEnd = None
+
+    def getSpeed(self):
+        return self.__speed
+
+    def setSpeed(self, speed):
+        if speed is not None and speed <= 0:
+            raise ValueError("Speed must be greater than zero")
+        with self.__wake:
+            anchor = self.__anchor
+            if anchor is not None and self.__speed is not None and speed is not None:
+                # Carry on from where the replay is now at the new speed
+                now = time.monotonic()
+                self.__anchor = (anchor[0] + (now - anchor[1]) * self.__speed, now)
+            else:
+                self.__anchor = None  # Start timing again from the next frame
+            self.__speed = speed
+            self.__wake.notify_all()
+
+    speed = property(getSpeed, setSpeed)
+
+    def seek(self, timestamp):
+        """Moves the replay to the first frame at or after timestamp
+
+        If the replay is running it carries on from the new position right
+        away, even if it was waiting for a frame.
+        """
+        with self.__wake:
+            self.__seekTo = timestamp
+            self.start = timestamp
+            self.__wake.notify_all()
+
+    def __frames(self, start):
+        if hasattr(self.source, "frames"):
+            ids = None if self.ids is None else sorted(self.ids)
+            for msg in self.source.frames(ids=ids, start=start, end=self.end):
+                yield msg
+            return
+        for msg in self.source:
+            if self.ids is not None and msg.arbitration_id not in self.ids:
+                continue
+            if start is not None and msg.timestamp < start:
+                continue
+            yield msg
+
+    def __output(self, msg):
+        if self.bus is not None:
+            try:
+                self.bus.send(msg)
+            except Exception as e:
+                log.error("Unable to send message 0x{:03X} - {}".format(msg.arbitration_id, e))
+                self.sendErrors += 1
+        if self.handler is not None:
+            try:
+                obj = parseMessage(msg)
+            except Exception as e:
+                log.debug("Unable to parse message {} - {}".format(msg, e))
+                self.parseErrors += 1
+                return
+            if obj is not None:
+                self.handler(obj)
+
+    def run(self):
+        """Replays the frames from the calling thread
+
+        :returns: False if stop() was called before the end
+        """
+        self.__stop.clear()
+        self.__seekTo = None
+        while True:
+            restart = False
+            self.__anchor = None
+            self.__resetStats()
+            for msg in self.__frames(self.start):
+                if self.end is not None and msg.timestamp > self.end:
+                    break
+                if not self.__due(msg):
+                    if self.__stop.is_set():
+                        return False
+                    self.__seekTo = None
+                    restart = True
+                    break
+                self.__output(msg)
+                self.sent += 1
+                self.__wallEnd = time.monotonic()
+                if self.__first is None:
+                    self.__first = msg.timestamp
+                    self.__wallStart = self.__wallEnd
+                self.__last = msg.timestamp
+            if not restart:
+                return True
+
+    def __due(self, msg):
+        # Waits until it is time to send msg.  Returns False if we were
+        # stopped or moved somewhere else while we waited.
+        with self.__wake:
+            while True:
+                if self.__stop.is_set() or self.__seekTo is not None:
+                    return False
+                speed = self.__speed
+                if speed is None:
+                    return True
+                now = time.monotonic()
+                if self.__anchor is None:
+                    self.__anchor = (msg.timestamp, now)
+                target = self.__anchor[1] + (msg.timestamp - self.__anchor[0]) / speed
+                if target <= now:
+                    if now - target > 0.001:
+                        self.late += 1
+                        if now - target > self.maxLag:
+                            self.maxLag = now - target
+                    return True
+                self.__wake.wait(target - now)
+
+    def play(self):
+        """Starts replaying in a new thread"""
+        self.__thread = threading.Thread(target=self.run, name="canfix-replay")
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self):
+        with self.__wake:
+            self.__stop.set()
+            self.__wake.notify_all()
+        self.join()
+
+    def join(self, timeout=None):
+        """Waits for a replay started with play() to finish
+
+        :returns: False if the timeout expired first
+        """
+        if self.__thread is not None:
+            self.__thread.join(timeout)
+            if self.__thread.is_alive():
+                return False
+            self.__thread = None
+        return True
+
+    def stats(self):
+        """Returns a dictionary comparing the achieved rate to the target
+
+        targetRate is the rate the frames should have been sent at and
+        achievedRate the rate they actually were, both in frames per second.
+        These only cover the time since the last seek.
+        """
+        span = 0.0 if self.__first is None else self.__last - self.__first
+        elapsed = 0.0
+        if self.__wallEnd is not None:
+            elapsed = self.__wallEnd - self.__wallStart
+        speed = self.__speed
+        target = None
+        if speed is not None and span > 0:
+            target = (self.sent - 1) / (span / speed)
+        achieved = (self.sent - 1) / elapsed if elapsed > 0 and self.sent > 1 else None
+        return {"frames": self.sent,
+                "span": span,
+                "elapsed": elapsed,
+                "speed": speed,
+                "targetRate": target,
+                "achievedRate": achieved,
+                "late": self.late,
+                "maxLag": self.maxLag}
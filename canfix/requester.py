@@ -0,0 +1,354 @@
+#!/usr/bin/env python
+
+#  CAN-FIX Protocol Module - An Open Source Module that abstracts communication
+#  with the CAN-FIX Aviation Protocol
+#  Copyright (c) 2012 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+# Sends node specific requests and matches the responses to them.  Any
+# number of requests can be outstanding and every timeout is handled by a
+# single timer wheel.
+
+import collections
+import concurrent.futures
+import threading
+import time
+from .globals import *
+from . import parseMessage
+from .messages import NodeIdentification, BitRateSet, NodeIDSet, DisableParameter
+from .messages import EnableParameter, UpdateFirmware, TwoWayConnection
+
+
+class TimerWheel(object):
+    """A hashed timer wheel
+
+    Each item is put in the slot for the tick its deadline falls in so adding
+    an item and expiring it are both constant time no matter how many items
+    are waiting.  Deadlines further away than one trip around the wheel stay
+    in their slot until the wheel comes back around to them.  Items are not
+    removed when they are cancelled, the caller just ignores them when they
+    come out of expire().
+
+    :param tick: The resolution of the wheel in seconds
+    :type tick: float, optional
+    :param slots: The number of slots in the wheel
+    :type slots: int, optional
+    """
+    def __init__(self, tick=0.01, slots=512):
+        self.tick = tick
+        self.__slots = [[] for x in range(slots)]
+        self.__current = None  # The next tick to be expired
+        self.__count = 0
+
+    def add(self, deadline, item):
+        t = int(deadline / self.tick)
+        if self.__current is None:
+            self.__current = t
+        elif t < self.__current:
+            t = self.__current
+        self.__slots[t % len(self.__slots)].append((deadline, item))
+        self.__count += 1
+
+    def expire(self, now):
+        """Removes and returns the items whose deadline has passed"""
+        result = []
+        if self.__current is None:
+            return result
+        end = int(now / self.tick)
+        if end - self.__current >= len(self.__slots):
+            ticks = range(len(self.__slots))  # One full turn covers every slot
+        else:
+            ticks = range(self.__current, end + 1)
+        for t in ticks:
+            slot = self.__slots[t % len(self.__slots)]
+            if not slot:
+                continue
+            keep = []
+            for entry in slot:
+                if entry[0] <= now:
+                    result.append(entry[1])
+                else:
+                    keep.append(entry)
+            slot[:] = keep
+        self.__current = end
+        self.__count -= len(result)
+        return result
+
+    def __len__(self):
+        return self.__count
+
+
+class PendingRequest(object):
+    """A request that is waiting for a response
+
+    :ivar future: A concurrent.futures.Future that gets the parsed response
+                  object or a TimeoutError
+    """
+    def __init__(self, msg, key, timeout, retries):
+        self.msg = msg
+        self.key = key
+        self.timeout = timeout
+        self.retries = retries
+        self.attempts = 0
+        self.deadline = None
+        self.future = concurrent.futures.Future()
+
+
+class RequestEngine(object):
+    """Sends node specific requests and completes a future with each response
+
+    Pending requests are indexed by (destination node, control code,
+    discriminator).  A response from node n with control code c that is
+    addressed to us completes the oldest pending request for (n, c, d) where
+    d is found by the discriminator function registered for c.  None of the
+    standard node specific responses carry anything that identifies the
+    request so the discriminator is None unless one is registered, and
+    requests that share a key are answered in the order they were sent.
+
+    The future's result is the parsed response object.  Failure responses
+    are results too, check the status or errorCode of the object.  If no
+    response arrives the request is sent again up to 'retries' times and
+    then the future gets a TimeoutError.
+
+    Responses have to be passed to handleMessage().  start() runs a thread
+    that reads the bus and does this, or the engine can be added to a
+    can.Notifier.  When the engine is not started poll() has to be called
+    to expire timeouts.
+
+    :param bus: The bus to send on
+    :type bus: can.BusABC
+    :param node: Our node number
+    :type node: int
+    :param timeout: Default seconds to wait for each response
+    :type timeout: float, optional
+    :param retries: Default number of times a request is sent again
+    :type retries: int, optional
+    :param tick: Resolution of the timeouts
+    :type tick: float, optional
+    """
+    def __init__(self, bus, node, timeout=1.0, retries=0, tick=0.01):
+        self.bus = bus
+        self.node = node
+        self.timeout = timeout
+        self.retries = retries
+        self.discriminators = {}  # control code: function(response object)
+        self.sent = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.unmatched = 0
+        self.sendErrors = 0
+        self.__pending = {}  # key: deque of PendingRequest
+        self.__count = 0
+        self.__wheel = TimerWheel(tick)
+        self.__lock = threading.Lock()
+        self.__running = False
+        self.__thread = None
+
+    def setDiscriminator(self, code, func):
+        """Sets the function that returns the discriminator for a response
+        with the given control code.  None removes it."""
+        if func is None:
+            self.discriminators.pop(code, None)
+        else:
+            self.discriminators[code] = func
+
+    def request(self, obj, timeout=None, retries=None, discriminator=None):
+        """Sends a node specific request
+
+        :param obj: The request.  destNode must be set, sendNode is set to
+                    our node.
+        :type obj: canfix.NodeSpecific
+        :param discriminator: Must match what the discriminator function
+                              returns for the response
+        :returns: A concurrent.futures.Future
+        """
+        obj.sendNode = self.node
+        key = (obj.destNode, obj.controlCode, discriminator)
+        r = PendingRequest(obj.msg, key,
+                           self.timeout if timeout is None else timeout,
+                           self.retries if retries is None else retries)
+        with self.__lock:
+            self.__pending.setdefault(key, collections.deque()).append(r)
+            self.__count += 1
+            self.__schedule(r, time.monotonic())
+        self.__send(r)
+        return r.future
+
+    def __schedule(self, r, now):
+        r.attempts += 1
+        r.deadline = now + r.timeout
+        self.__wheel.add(r.deadline, r)
+
+    def __send(self, r):
+        try:
+            self.bus.send(r.msg)
+            self.sent += 1
+        except Exception as e:
+            log.error("Unable to send request to node {} - {}".format(r.key[0], e))
+            self.sendErrors += 1
+
+    def handleMessage(self, msg):
+        """Checks a received frame for a response to one of our requests
+
+        :returns: True if the frame completed a request
+        """
+        identifier = msg.arbitration_id
+        if msg.is_error_frame or identifier < NODE_SPECIFIC_MSGS or identifier >= TWOWAY_CONN_CHANS:
+            return False
+        if len(msg.data) < 2 or msg.data[1] != self.node or not self.__count:
+            return False
+        try:
+            obj = parseMessage(msg)
+        except Exception as e:
+            log.debug("Unable to parse response {} - {}".format(msg, e))
+            return False
+        if getattr(obj, "msgType", MSG_RESPONSE) != MSG_RESPONSE:
+            return False
+        func = self.discriminators.get(obj.controlCode)
+        key = (obj.sendNode, obj.controlCode, None if func is None else func(obj))
+        with self.__lock:
+            waiting = self.__pending.get(key)
+            if not waiting:
+                self.unmatched += 1
+                return False
+            r = waiting.popleft()
+            if not waiting:
+                del self.__pending[key]
+            self.__count -= 1
+            self.completed += 1
+        r.future.set_result(obj)
+        return True
+
+    on_message_received = handleMessage
+
+    def poll(self, now=None):
+        """Resends or fails the requests that have timed out
+
+        :returns: Seconds until the next timeout could happen or None if
+                  nothing is pending
+        """
+        if now is None:
+            now = time.monotonic()
+        resend = []
+        failed = []
+        with self.__lock:
+            for r in self.__wheel.expire(now):
+                if r.future.done() or r.deadline > now:
+                    continue  # Already answered or scheduled again
+                waiting = self.__pending.get(r.key)
+                if waiting is None or r not in waiting:
+                    continue
+                if r.attempts <= r.retries:
+                    self.__schedule(r, now)
+                    resend.append(r)
+                    continue
+                waiting.remove(r)
+                if not waiting:
+                    del self.__pending[r.key]
+                self.__count -= 1
+                self.timeouts += 1
+                failed.append(r)
+            wait = self.__wheel.tick if self.__count else None
+        for r in resend:
+            self.__send(r)
+        for r in failed:
+            r.future.set_exception(TimeoutError("No response from node {} to control code 0x{:02X}".format(
+                r.key[0], r.key[1])))
+        return wait
+
+    def cancel(self, future):
+        """Stops waiting for a request
+
+        :returns: False if the request had already finished
+        """
+        with self.__lock:
+            for key, waiting in self.__pending.items():
+                for r in waiting:
+                    if r.future is future:
+                        waiting.remove(r)
+                        if not waiting:
+                            del self.__pending[key]
+                        self.__count -= 1
+                        return future.cancel()
+        return False
+
+    def pending(self):
+        """Returns the number of requests waiting for a response"""
+        return self.__count
+
+    # Convenience functions for the standard requests
+
+    def identify(self, node, **kwargs):
+        obj = NodeIdentification()
+        obj.destNode = node
+        return self.request(obj, **kwargs)
+
+    def setBitRate(self, node, bitrate, **kwargs):
+        obj = BitRateSet(bitrate=bitrate)
+        obj.destNode = node
+        return self.request(obj, **kwargs)
+
+    def setNodeID(self, node, newNode, **kwargs):
+        obj = NodeIDSet(newNode=newNode)
+        obj.destNode = node
+        return self.request(obj, **kwargs)
+
+    def disableParameter(self, node, identifier, **kwargs):
+        obj = DisableParameter(identifier=identifier)
+        obj.destNode = node
+        return self.request(obj, **kwargs)
+
+    def enableParameter(self, node, identifier, **kwargs):
+        obj = EnableParameter(identifier=identifier)
+        obj.destNode = node
+        return self.request(obj, **kwargs)
+
+    def updateFirmware(self, node, verification, channel, **kwargs):
+        obj = UpdateFirmware(node=node, verification=verification, channel=channel)
+        return self.request(obj, **kwargs)
+
+    def connect(self, node, channel, connectionType=0x0000, **kwargs):
+        obj = TwoWayConnection(node=node, connectionType=connectionType, channel=channel)
+        obj.destNode = node
+        return self.request(obj, **kwargs)
+
+    def start(self):
+        """Starts a thread that reads responses from the bus"""
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__run, name="canfix-requests")
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self):
+        self.__running = False
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def __run(self):
+        while self.__running:
+            wait = self.poll()
+            msg = self.bus.recv(0.05 if wait is None else min(wait, 0.05))
+            if msg is not None:
+                self.handleMessage(msg)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+#  CAN-FIX Protocol Module - An Open Source Module that abstracts communication
+#  with the CAN-FIX Aviation Protocol
+#  Copyright (c) 2012 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+# Puts parameters that arrive at different times and rates onto a common
+# time grid so they can be used together.  resample() works on the columns
+# made by export.ParameterColumns or parallel.decodeCapture() and
+# resampleSeries() on any time, value and function arrays, like the ones
+# from columnar.MappedRecording.parameter().  NumPy is required.
+
+from .globals import *
+from . import protocol
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HOLD = "hold"
+LINEAR = "linear"
+
+FAILURE = 0x04
+QUALITY = 0x02
+
+
+def timeGrid(start, end, rate):
+    """Returns evenly spaced times from start to end inclusive
+
+    :param rate: Samples per second, for example 10 or 50
+    :type rate: float
+    """
+    if np is None:
+        raise ImportError("NumPy is required for resampling")
+    count = int(np.floor((end - start) * rate + 1e-9)) + 1
+    return start + np.arange(count) / float(rate)
+
+
+def resampleSeries(times, values, functions, grid, method=HOLD, maxStale=None,
+                   rejectQuality=False):
+    """Resamples one parameter onto a time grid
+
+    A sample with the failure flag set makes the parameter invalid until the
+    next good sample.  If rejectQuality is True samples with the quality
+    flag are treated the same way, otherwise they are used and marked in
+    the returned quality array.  Grid times before the first sample, or
+    more than maxStale seconds after the last good sample, are NaN.
+
+    With LINEAR the value is interpolated between two good samples that are
+    no more than maxStale apart, otherwise the last value is held.
+
+    :returns: (values, quality) arrays the same length as the grid
+    """
+    if np is None:
+        raise ImportError("NumPy is required for resampling")
+    if method not in (HOLD, LINEAR):
+        raise ValueError("Unknown resampling method {}".format(method))
+    grid = np.asarray(grid, dtype=np.float64)
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    functions = np.asarray(functions, dtype=np.uint8)
+    if len(times) and np.any(times[1:] < times[:-1]):
+        order = np.argsort(times, kind="stable")
+        times, values, functions = times[order], values[order], functions[order]
+    bad = FAILURE | QUALITY if rejectQuality else FAILURE
+    good = (functions & bad) == 0
+
+    prev = np.searchsorted(times, grid, side="right") - 1
+    have = prev >= 0
+    p = np.where(have, prev, 0)
+    result = np.full(len(grid), np.nan)
+    quality = np.zeros(len(grid), dtype=bool)
+    if not len(times):
+        return result, quality
+    ok = have & good[p]
+    if maxStale is not None:
+        ok &= grid - times[p] <= maxStale
+    result[ok] = values[p[ok]]
+    quality[ok] = (functions[p[ok]] & QUALITY) != 0
+
+    if method == LINEAR:
+        n = p + 1
+        interp = ok & (n < len(times))
+        n = np.where(interp, n, 0)
+        interp &= good[n]
+        if maxStale is not None:
+            interp &= times[n] - times[p] <= maxStale
+        interp &= times[n] > times[p]
+        t0 = times[p[interp]]
+        t1 = times[n[interp]]
+        v0 = values[p[interp]]
+        v1 = values[n[interp]]
+        result[interp] = v0 + (v1 - v0) * (grid[interp] - t0) / (t1 - t0)
+        quality[interp] |= (functions[n[interp]] & QUALITY) != 0
+    return result, quality
+
+
+def resolveKey(columns, key):
+    """Turns a parameter name, ID or (node, identifier, index) tuple into a
+    key of columns
+
+    A name or ID matches index 0 of whichever node sent it and is an error
+    if more than one node did.
+    """
+    if isinstance(key, tuple):
+        if key not in columns:
+            raise KeyError("No data for {}".format(key))
+        return key
+    if isinstance(key, str):
+        p = protocol.getParameterByName(key)
+        if p is None:
+            raise ValueError("Unknown parameter {}".format(key))
+        key = p.id
+    found = sorted(k for k in columns if k[1] == key and k[2] == 0)
+    if not found:
+        raise KeyError("No data for parameter 0x{:03X}".format(key))
+    if len(found) > 1:
+        raise ValueError("Parameter 0x{:03X} was sent by more than one node, use a (node, identifier, index) key".format(key))
+    return found[0]
+
+
+def resample(columns, keys, grid, method=HOLD, maxStale=None, rejectQuality=False):
+    """Resamples several parameters onto one time grid
+
+    :param columns: A dictionary of (node, identifier, index) to
+                    (times, values, functions) like ParameterColumns.columns
+    :type columns: dict
+    :param keys: The parameters to resample.  Each one can be a
+                 (node, identifier, index) tuple, a name or an ID.
+    :type keys: list
+    :param grid: The times to sample at.  See timeGrid()
+    :returns: A dictionary with the 'time' grid, the resolved 'keys', a
+              'values' matrix with one column for each key and a
+              'quality' matrix that is True where the quality flag was set
+    """
+    if np is None:
+        raise ImportError("NumPy is required for resampling")
+    resolved = [resolveKey(columns, k) for k in keys]
+    grid = np.asarray(grid, dtype=np.float64)
+    values = np.full((len(grid), len(resolved)), np.nan)
+    quality = np.zeros((len(grid), len(resolved)), dtype=bool)
+    for i, key in enumerate(resolved):
+        times, v, functions = columns[key]
+        values[:, i], quality[:, i] = resampleSeries(times, v, functions, grid, method,
+                                                     maxStale, rejectQuality)
+    return {"time": grid, "keys": resolved, "values": values, "quality": quality}
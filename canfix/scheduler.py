@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+
+#  CAN-FIX Protocol Module - An Open Source Module that abstracts communication
+#  with the CAN-FIX Aviation Protocol
+#  Copyright (c) 2012 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+# Periodic transmission of parameters at different rates.  Parameters can
+# be sent from our own timer or, if the bus supports it, handed to the
+# driver as cyclic tasks (the broadcast manager on SocketCAN) so the kernel
+# does the timing.
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+import can
+from .globals import *
+from .utils import getTypeSize, setValue
+
+
+class ScheduledParameter(object):
+    """A parameter that is sent periodically by the TransmitScheduler
+
+    The CAN message is built once and the data is rewritten in place each
+    time the parameter is sent.
+
+    :param parameter: The parameter to send.  The node, identifier and index
+                      should already be set.
+    :type parameter: canfix.Parameter
+    :param func: Called with the current value when the parameter is due
+                 and should return the value to send.  If None the value of
+                 the parameter is sent as it is.
+    :type func: callable
+    :param rate: How many times per second to send the parameter
+    :type rate: float
+    """
+    def __init__(self, parameter, func, rate):
+        if rate <= 0:
+            raise ValueError("Rate must be greater than zero")
+        self.parameter = parameter
+        self.func = func
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.due = 0.0
+        self.sent = 0
+        size = getTypeSize(parameter.type)
+        self.msg = can.Message(arbitration_id=parameter.identifier, is_extended_id=False,
+                               data=bytearray(3 + size))
+
+    def encode(self):
+        """Updates the value and writes it into the message
+
+        :returns: The CAN message to send
+        """
+        p = self.parameter
+        if self.func is not None:
+            p.value = self.func(p.value)
+        data = self.msg.data
+        data[0] = p.node % 256
+        data[1] = p.index % 256
+        data[2] = p.function
+        data[3:] = setValue(p.type, p.value, p.multiplier)
+        return self.msg
+
+
+class TransmitScheduler(object):
+    """Sends parameters periodically from a single timer
+
+    Parameters are grouped by their rate.  The members of each group are
+    spread evenly across the group period and each group is given a
+    different starting phase so that parameters that share a rate do not all
+    hit the bus at the same instant.  Value callbacks are only called when
+    the parameter is due.
+
+    The scheduler can be driven by its own thread with start() and stop() or
+    from asyncio by awaiting run().  Missed transmissions are skipped rather
+    than sent in a burst and are counted in overruns.
+
+    :param bus: The bus to send on.  Anything with a send(msg) method works.
+    :type bus: can.BusABC
+    """
+    def __init__(self, bus):
+        self.bus = bus
+        self.overruns = 0
+        self.sendErrors = 0
+        self.groups = {}
+        self.__heap = []
+        self.__seq = itertools.count()
+        self.__lock = threading.Lock()
+        self.__wake = threading.Event()
+        self.__running = False
+        self.__thread = None
+
+    def add(self, parameter, func=None, rate=1.0):
+        """Adds a parameter to the schedule
+
+        :returns: The ScheduledParameter object.  This can be passed to remove()
+        """
+        return self.addEntry(ScheduledParameter(parameter, func, rate))
+
+    def addEntry(self, entry):
+        """Adds an already created ScheduledParameter to the schedule"""
+        with self.__lock:
+            self.groups.setdefault(entry.rate, []).append(entry)
+            self.__restagger()
+        self.__wake.set()
+        return entry
+
+    def remove(self, entry):
+        with self.__lock:
+            group = self.groups[entry.rate]
+            group.remove(entry)
+            if not group:
+                del self.groups[entry.rate]
+            self.__restagger()
+        self.__wake.set()
+
+    def __restagger(self):
+        # Rebuild the whole schedule.  This only happens when parameters are
+        # added or removed so we don't worry too much about the cost.
+        now = time.monotonic()
+        self.__heap = []
+        for g, rate in enumerate(sorted(self.groups, reverse=True)):
+            group = self.groups[rate]
+            period = 1.0 / rate
+            phase = ((g * 0.618034) % 1.0) * period / len(group)
+            for i, entry in enumerate(group):
+                entry.due = now + phase + i * period / len(group)
+                self.__heap.append((entry.due, next(self.__seq), entry))
+        heapq.heapify(self.__heap)
+
+    def poll(self, now=None):
+        """Sends every parameter that is due
+
+        :returns: The number of seconds until the next parameter is due or
+                  None if nothing is scheduled
+        """
+        if now is None:
+            now = time.monotonic()
+        while True:
+            with self.__lock:
+                if not self.__heap:
+                    return None
+                due, seq, entry = self.__heap[0]
+                if due > now:
+                    return due - now
+                heapq.heappop(self.__heap)
+                entry.due = due + entry.period
+                if entry.due <= now:
+                    # We fell more than a whole period behind so skip ahead
+                    missed = int((now - entry.due) / entry.period)
+                    entry.due += missed * entry.period
+                    while entry.due <= now:
+                        entry.due += entry.period
+                        missed += 1
+                    self.overruns += missed
+                heapq.heappush(self.__heap, (entry.due, next(self.__seq), entry))
+            try:
+                self.bus.send(entry.encode())
+                entry.sent += 1
+            except Exception as e:
+                log.error("Unable to send {} - {}".format(entry.parameter.name, e))
+                self.sendErrors += 1
+
+    def start(self):
+        """Starts a thread that sends the parameters"""
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__run, name="canfix-scheduler")
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self):
+        self.__running = False
+        self.__wake.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def __run(self):
+        while self.__running:
+            wait = self.poll()
+            self.__wake.wait(wait)
+            self.__wake.clear()
+
+    async def run(self):
+        """Sends the parameters from an asyncio task until stop() is called"""
+        self.__running = True
+        while self.__running:
+            wait = self.poll()
+            await asyncio.sleep(0.1 if wait is None else wait)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def hasNativeCyclic(bus):
+    """Returns True if the bus has its own periodic send support
+
+    python-can falls back to one thread per periodic task for interfaces
+    that don't implement it themselves.  We would rather use our own
+    scheduler than that.
+    """
+    impl = getattr(type(bus), "_send_periodic_internal", None)
+    return impl is not None and impl is not can.BusABC._send_periodic_internal
+
+
+class CyclicParameter(ScheduledParameter):
+    """A parameter that is sent at a constant rate with the value that is set
+
+    Use setValue() to change the value that is being sent.  If the parameter
+    is being sent by a driver cyclic task the task is only modified when the
+    encoded data actually changes.
+    """
+    def __init__(self, parameter, rate):
+        super(CyclicParameter, self).__init__(parameter, None, rate)
+        self.task = None
+        self.modifications = 0
+        self.encode()
+
+    def setValue(self, value):
+        p = self.parameter
+        p.value = value
+        if self.task is not None:
+            old = bytes(self.msg.data)
+            self.encode()
+            if self.msg.data != old:
+                self.task.modify_data(self.msg)
+                self.modifications += 1
+
+    def stop(self):
+        if self.task is not None:
+            self.task.stop()
+            self.task = None
+
+
+class CyclicTransmitter(object):
+    """Sends parameters at constant rates with as little Python work as we can
+
+    If the bus supports cyclic send tasks (SocketCAN uses the kernel
+    broadcast manager) each parameter is handed to the driver with
+    send_periodic() and we only touch it again when the value changes.
+    Otherwise the parameters are sent from a TransmitScheduler.
+
+    :param bus: The bus to send on
+    :type bus: can.BusABC
+    :param scheduler: The scheduler to use for the fallback.  If None one is
+                      created and started when it is first needed.
+    :type scheduler: TransmitScheduler, optional
+    """
+    def __init__(self, bus, scheduler=None):
+        self.bus = bus
+        self.native = hasNativeCyclic(bus)
+        self.scheduler = scheduler
+        self.__ownScheduler = False
+        self.entries = []
+
+    def add(self, parameter, rate):
+        """Starts sending a parameter.  The parameter value should be set.
+
+        :returns: The CyclicParameter.  Call setValue() on it to change the
+                  value that is sent.
+        """
+        entry = CyclicParameter(parameter, rate)
+        if self.native:
+            try:
+                task = self.bus.send_periodic(entry.msg, entry.period)
+                if isinstance(task, can.ModifiableCyclicTaskABC):
+                    entry.task = task
+                else:
+                    task.stop()
+            except (NotImplementedError, can.CanError) as e:
+                log.debug("Cyclic send not available for {} - {}".format(parameter.name, e))
+        if entry.task is None:
+            if self.scheduler is None:
+                self.scheduler = TransmitScheduler(self.bus)
+                self.scheduler.start()
+                self.__ownScheduler = True
+            self.scheduler.addEntry(entry)
+        self.entries.append(entry)
+        return entry
+
+    def remove(self, entry):
+        if entry.task is not None:
+            entry.stop()
+        else:
+            self.scheduler.remove(entry)
+        self.entries.remove(entry)
+
+    def stop(self):
+        """Stops sending all of the parameters"""
+        for each in list(self.entries):
+            self.remove(each)
+        if self.__ownScheduler:
+            self.scheduler.stop()
+            self.scheduler = None
+            self.__ownScheduler = False
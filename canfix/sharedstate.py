@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+
+#  CAN-FIX Protocol Module - An Open Source Module that abstracts communication
+#  with the CAN-FIX Aviation Protocol
+#  Copyright (c) 2012 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+# This module keeps the current parameter values in a block of shared
+# memory so that one process can decode the bus and any number of other
+# processes can read the values.
+#
+# The memory starts with a header followed by one fixed size slot for each
+# identifier / index pair in the protocol definition.
+#
+# Header - magic(4) version(2) indexes(2) slots(4) layout crc(4)
+# Slot   - sequence(4) node(1) function(1) length(1) pad(1) timestamp(8) data(8)
+#
+# The sequence counter in each slot is odd while the writer is changing the
+# slot.  Readers retry until they read the same even sequence number before
+# and after copying the slot.
+#
+# There is no node in the slot address so when two nodes send the same
+# parameter the last one written wins.
+
+import struct
+import time
+import zlib
+from multiprocessing import shared_memory
+from .globals import *
+from .protocol import parameters
+from . import utils
+from .utils import parameterKey
+
+MAGIC = b"CFXS"
+VERSION = 1
+
+_header = struct.Struct("<4sHHII")
+_slot = struct.Struct("<IBBBxd8s")
+_seq = struct.Struct("<I")
+_body = struct.Struct("<BBBxd8s")
+
+
+class SharedStateError(Exception):
+    pass
+
+
+def buildLayout(indexes=16):
+    """Returns a dictionary of identifier: (first slot, slot count)
+
+    Parameters that have an index name in the protocol get 'indexes' slots
+    and every other parameter gets one.
+    """
+    layout = {}
+    slot = 0
+    for pid in sorted(parameters):
+        count = indexes if parameters[pid].index else 1
+        layout[pid] = (slot, count)
+        slot += count
+    return layout
+
+
+def _layoutCrc(layout):
+    s = ",".join("{}:{}".format(pid, layout[pid][1]) for pid in sorted(layout))
+    return zlib.crc32(s.encode("ascii")) & 0xFFFFFFFF
+
+
+class SharedParameterState(object):
+    """The table of current parameter values in shared memory
+
+    The process that decodes the bus creates the table and calls update()
+    or updateMessage() for each parameter.  Other processes attach to it
+    by name and call get() or snapshot().  Only one process should write.
+
+    There is one slot for each identifier and index, not one for each node.
+    If several nodes send the same parameter, as redundant sources do, each
+    update overwrites the last one and readers only see the value and node
+    of the most recent.  Use a ParameterStore, which keeps every node, if
+    each source is needed.
+
+    :param name: The name of the shared memory block.  If creating and no
+                 name is given the system picks one.
+    :type name: str, optional
+    :param create: True to create the block, False to attach to an existing one
+    :type create: bool, optional
+    :param indexes: Number of index slots for parameters that use the index
+    :type indexes: int, optional
+    :param timeout: How long a reader waits for a slot that is being written
+                    before giving up, in case the writer died in the middle
+                    of an update
+    :type timeout: float, optional
+    """
+    def __init__(self, name=None, create=False, indexes=16, timeout=0.1):
+        self.indexes = indexes
+        self.timeout = timeout
+        self.layout = buildLayout(indexes)
+        self.slots = sum(x[1] for x in self.layout.values())
+        self.overflows = 0
+        crc = _layoutCrc(self.layout)
+        size = _header.size + self.slots * _slot.size
+        if create:
+            self.__shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            self.__shm.buf[:size] = bytes(size)
+            _header.pack_into(self.__shm.buf, 0, MAGIC, VERSION, indexes, self.slots, crc)
+        else:
+            self.__shm = _attach(name)
+            magic, version, idx, slots, c = _header.unpack_from(self.__shm.buf, 0)
+            if magic != MAGIC or version != VERSION:
+                self.__shm.close()
+                raise ValueError("{} is not a CAN-FIX shared state block".format(name))
+            if idx != indexes or slots != self.slots or c != crc:
+                self.__shm.close()
+                raise ValueError("Shared state layout does not match the protocol definition")
+        self.created = create
+        self.__buf = self.__shm.buf
+
+    def getName(self):
+        return self.__shm.name
+
+    name = property(getName)
+
+    def __slotOffset(self, identifier, index):
+        try:
+            first, count = self.layout[identifier]
+        except KeyError:
+            return None
+        if index >= count:
+            return None
+        return _header.size + (first + index) * _slot.size
+
+    def __write(self, offset, node, function, data, timestamp):
+        buf = self.__buf
+        seq = _seq.unpack_from(buf, offset)[0]
+        _seq.pack_into(buf, offset, (seq + 1) & 0xFFFFFFFF)
+        _body.pack_into(buf, offset + 4, node, function, len(data), timestamp, bytes(data))
+        _seq.pack_into(buf, offset, (seq + 2) & 0xFFFFFFFF)
+
+    def updateMessage(self, msg):
+        """Writes the raw value from a parameter CAN message into the table
+
+        The message is not decoded.  Messages that are not parameter value
+        updates are ignored, as are parameters that have an index that does
+        not fit in the table.  Those are counted in overflows.
+
+        :returns: True if the table was updated
+        """
+        if msg.is_error_frame or msg.arbitration_id < HIGH_PRIORITY_DATA or \
+           msg.arbitration_id >= FUTURE_MSGS or len(msg.data) < 4 or \
+           msg.data[2] & 0xF0 or msg.arbitration_id not in self.layout:
+            return False
+        offset = self.__slotOffset(msg.arbitration_id, msg.data[1])
+        if offset is None:
+            self.overflows += 1
+            return False
+        self.__write(offset, msg.data[0], msg.data[2], msg.data[3:8], msg.timestamp)
+        return True
+
+    def update(self, p, timestamp=0.0):
+        """Writes the value of the Parameter object p into the table
+
+        Meta data is ignored and an index that does not fit in the table is
+        counted in overflows.
+
+        :returns: True if the table was updated
+        """
+        if p.function & 0xF0 or p.identifier not in self.layout:
+            return False
+        offset = self.__slotOffset(p.identifier, p.index)
+        if offset is None:
+            self.overflows += 1
+            return False
+        data = utils.setValue(p.type, p.value, p.multiplier)
+        self.__write(offset, p.node, p.function, data[:8], timestamp)
+        return True
+
+    def __read(self, offset):
+        buf = self.__buf
+        tries = 0
+        deadline = None
+        while True:
+            seq, node, function, length, timestamp, data = _slot.unpack_from(buf, offset)
+            if not seq & 0x01 and _seq.unpack_from(buf, offset)[0] == seq:
+                return seq, node, function, data[:length], timestamp
+            # Only look at the clock once the writer has kept us waiting a while
+            tries += 1
+            if tries % 1000 == 0:
+                now = time.monotonic()
+                if deadline is None:
+                    deadline = now + self.timeout
+                elif now > deadline:
+                    raise SharedStateError("Slot at offset {} is stuck in the middle of a write".format(offset))
+
+    def get(self, identifier, index=0):
+        """Returns a (node, value, function, timestamp) tuple for a parameter
+
+        The node is the one that sent the most recent update.
+
+        :raises NotFound: if the parameter has not been written yet
+        :raises SharedStateError: if the slot stays locked for longer than
+                                  the timeout
+        """
+        offset = self.__slotOffset(identifier, index)
+        if offset is None:
+            raise NotFound("Parameter 0x{:03X} index {} is not in the table".format(identifier, index))
+        seq, node, function, data, timestamp = self.__read(offset)
+        if seq == 0:
+            raise NotFound("No value for parameter 0x{:03X} index {}".format(identifier, index))
+        p = parameters[identifier]
+        return (node, utils.getValue(p.type, data, p.multiplier), function, timestamp)
+
+    def snapshot(self):
+        """Returns every parameter that has been written as a dictionary
+
+        The keys are from parameterKey() and the values are (value, function,
+        timestamp) tuples like ParameterStore.snapshot(), but because the
+        table only holds the latest update of each identifier and index there
+        is only ever one node for each of them.  Each entry is consistent with
+        itself but entries may come from different updates of the writer.
+        """
+        result = {}
+        for pid in self.layout:
+            first, count = self.layout[pid]
+            p = parameters[pid]
+            for index in range(count):
+                offset = _header.size + (first + index) * _slot.size
+                seq, node, function, data, timestamp = self.__read(offset)
+                if seq:
+                    key = parameterKey(node, pid, index)
+                    result[key] = (utils.getValue(p.type, data, p.multiplier), function, timestamp)
+        return result
+
+    def close(self):
+        """Detaches from the shared memory.  The creator also removes it."""
+        self.__buf = None
+        self.__shm.close()
+        if self.created:
+            self.__shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _attach(name):
+    # Before Python 3.13 attaching registers the block with the resource
+    # tracker, which would remove it when the reader exits.
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
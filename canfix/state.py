@@ -0,0 +1,377 @@
+#!/usr/bin/env python
+
+#  CAN-FIX Protocol Module - An Open Source Module that abstracts communication
+#  with the CAN-FIX Aviation Protocol
+#  Copyright (c) 2012 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+# This module keeps track of the current value of every parameter that
+# has been received along with some running statistics for each one.
+
+import array
+import collections
+import math
+import time
+from .globals import *
+from .messages import Parameter
+from .utils import parameterKey
+
+
+def isNumeric(value):
+    """Returns True if value is something we can do statistics on"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class RunningStats(object):
+    """Incremental statistics for a single parameter over its whole life.
+
+    The mean and variance are computed with Welford's algorithm so every
+    property can be read without looking at any previous values.
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.min = None
+        self.max = None
+        self.last = None
+        self.lastTime = None
+        self.rate = 0.0
+        self._m2 = 0.0
+
+    def add(self, value, timestamp):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if self.lastTime is not None and timestamp > self.lastTime:
+            self.rate = (value - self.last) / (timestamp - self.lastTime)
+        self.last = value
+        self.lastTime = timestamp
+
+    def merge(self, other):
+        """Adds the values from another RunningStats to this one
+
+        The other statistics are assumed to cover later values than these
+        so last, lastTime and rate are taken from it.  Uses Chan's parallel
+        form of Welford's algorithm.
+        """
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.__dict__.update(other.__dict__)
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if other.count == 1 and self.lastTime is not None and other.lastTime > self.lastTime:
+            self.rate = (other.last - self.last) / (other.lastTime - self.lastTime)
+        else:
+            self.rate = other.rate
+        self.last = other.last
+        self.lastTime = other.lastTime
+
+    def getVariance(self):
+        if self.count < 2:
+            return 0.0
+        return self._m2 / (self.count - 1)
+
+    variance = property(getVariance)
+
+    def getStddev(self):
+        return math.sqrt(self.getVariance())
+
+    stddev = property(getStddev)
+
+
+class WindowStats(RunningStats):
+    """Incremental statistics over the last 'window' seconds of a parameter.
+
+    Values that fall out of the window are removed from the Welford sums
+    and the min / max are kept in monotonic queues so that adding a value
+    is amortized O(1).  The window is measured back from the newest value
+    that was added, not from the wall clock.
+    """
+    def __init__(self, window):
+        super(WindowStats, self).__init__()
+        self.window = window
+        self.__values = collections.deque()
+        self.__mins = collections.deque()
+        self.__maxs = collections.deque()
+
+    def add(self, value, timestamp):
+        self.__values.append((timestamp, value))
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        while self.__mins and self.__mins[-1][1] >= value:
+            self.__mins.pop()
+        self.__mins.append((timestamp, value))
+        while self.__maxs and self.__maxs[-1][1] <= value:
+            self.__maxs.pop()
+        self.__maxs.append((timestamp, value))
+
+        oldest = timestamp - self.window
+        while self.__values[0][0] < oldest:
+            self.__remove(*self.__values.popleft())
+
+        self.min = self.__mins[0][1]
+        self.max = self.__maxs[0][1]
+        self.last = value
+        self.lastTime = timestamp
+        first = self.__values[0]
+        if timestamp > first[0]:
+            self.rate = (value - first[1]) / (timestamp - first[0])
+        else:
+            self.rate = 0.0
+
+    def merge(self, other):
+        """Windowed statistics can't be merged
+
+        Removing a value from the window needs the value itself, and the
+        other statistics only hold their sums, so the merged result could
+        never drop the other's values as they age out of the window.
+
+        :raises TypeError: always
+        """
+        raise TypeError("WindowStats can't be merged, the other statistics don't keep their values")
+
+    def __remove(self, timestamp, value):
+        self.count -= 1
+        if self.count == 0:
+            self.mean = 0.0
+            self._m2 = 0.0
+        else:
+            delta = value - self.mean
+            self.mean -= delta / self.count
+            self._m2 -= delta * (value - self.mean)
+            if self._m2 < 0.0: # Rounding can leave us a hair below zero
+                self._m2 = 0.0
+        if self.__mins[0][0] <= timestamp:
+            self.__mins.popleft()
+        if self.__maxs[0][0] <= timestamp:
+            self.__maxs.popleft()
+
+
+class ParameterStore(object):
+    """Holds the latest value of every parameter that has been received.
+
+    Parameters are stored by the (node, identifier, index) of the message.
+    Each entry is a tuple of (value, function, timestamp) where function
+    is the function code byte of the message that holds the failure,
+    quality, annunciate and meta data bits.
+
+    For numeric parameters the store also keeps lifetime and sliding window
+    statistics that are updated as each value arrives.  Values that have
+    the failure flag set are stored but not included in the statistics.
+    Meta data frames, like the limits of a parameter, are not values so
+    they are ignored.
+
+    The entries are double buffered so that other threads can read a
+    consistent view of every parameter while the decoder keeps writing.
+    update() writes into the back buffer and publish() swaps the buffers.
+    A reader copies the front buffer and checks that no publish() happened
+    while it was copying, which is the only time the buffer it was reading
+    can be written again.  publish() only copies the entries that changed
+    since the last swap, so its cost does not depend on the size of the
+    table.  There should only be one thread calling update() and publish().
+
+    If a SharedParameterState is given every update is also written to
+    it so that other processes can read the values.
+
+    :param window: The length of the sliding statistics window in seconds
+    :type window: float, optional
+    :param shared: Shared memory table to mirror the values into
+    :type shared: canfix.sharedstate.SharedParameterState, optional
+    """
+    statFields = ("count", "min", "max", "mean", "stddev", "rate")
+
+    def __init__(self, window=10.0, shared=None):
+        self.window = window
+        self.shared = shared
+        self.__entries = {}   # Back buffer, only the writer touches this
+        self.__front = {}     # Published buffer that readers copy
+        self.__dirty = set()  # Keys written since the last publish()
+        self.__generation = 0
+        self.__lifetime = {}
+        self.__windowed = {}
+
+    def update(self, p, timestamp=None):
+        """Stores the value of the Parameter object p
+
+        :param p: The parameter to store
+        :type p: canfix.Parameter
+        :param timestamp: The time of the update.  If not given the time
+                          that the parameter was decoded is used
+        :type timestamp: float, optional
+        :returns: The key that was updated or None for meta data
+        """
+        if p.function & 0xF0:
+            return None
+        if timestamp is None:
+            timestamp = getattr(p, "updated", None) or time.time()
+        key = parameterKey(p.node, p.identifier, p.index)
+        self.__entries[key] = (p.value, p.function, timestamp)
+        self.__dirty.add(key)
+        if self.shared is not None:
+            self.shared.update(p, timestamp)
+        if isNumeric(p.value) and not p.failure:
+            try:
+                self.__lifetime[key].add(p.value, timestamp)
+                self.__windowed[key].add(p.value, timestamp)
+            except KeyError:
+                self.__lifetime[key] = RunningStats()
+                self.__lifetime[key].add(p.value, timestamp)
+                self.__windowed[key] = WindowStats(self.window)
+                self.__windowed[key].add(p.value, timestamp)
+        return key
+
+    def updateMessage(self, msg):
+        """Stores the value from a CAN message if it is a Parameter
+
+        The timestamp of the message is used for the update.  Messages that
+        are not parameter value updates are ignored.
+
+        :param msg: The received CAN message
+        :type msg: can.Message
+        :returns: The Parameter object or None
+        """
+        if msg.is_error_frame or msg.arbitration_id < HIGH_PRIORITY_DATA or \
+           msg.arbitration_id >= FUTURE_MSGS or len(msg.data) < 4 or \
+           msg.data[2] & 0xF0:
+            return None
+        try:
+            p = Parameter(msg)
+        except Exception as e:
+            log.debug("Unable to decode parameter {} - {}".format(msg, e))
+            return None
+        self.update(p, msg.timestamp or None)
+        return p
+
+    def get(self, node, identifier, index=0):
+        """Returns the (value, function, timestamp) tuple for a parameter
+
+        :raises NotFound: if the parameter has never been received
+        """
+        try:
+            return self.__entries[parameterKey(node, identifier, index)]
+        except KeyError:
+            raise NotFound("No value for node {} parameter 0x{:03X} index {}".format(node, identifier, index))
+
+    def stats(self, node, identifier, index=0, windowed=False):
+        """Returns the statistics object for a parameter
+
+        The returned object has count, min, max, mean, stddev and rate
+        attributes.  If windowed is True the statistics only cover the
+        last 'window' seconds of values.
+
+        :raises NotFound: if no numeric values have been received
+        """
+        d = self.__windowed if windowed else self.__lifetime
+        try:
+            return d[parameterKey(node, identifier, index)]
+        except KeyError:
+            raise NotFound("No statistics for node {} parameter 0x{:03X} index {}".format(node, identifier, index))
+
+    def allStats(self, windowed=False):
+        """Returns the statistics for every parameter as columns
+
+        The result is a dictionary of arrays.  The "key", "node", "identifier"
+        and "index" arrays identify the parameter in each row and there is
+        one array for each of the names in statFields.  Rows are sorted by key.
+        """
+        d = self.__windowed if windowed else self.__lifetime
+        keys = sorted(d)
+        result = {"key": array.array("Q", keys),
+                  "node": array.array("B", [k >> 19 for k in keys]),
+                  "identifier": array.array("H", [(k >> 8) & 0x7FF for k in keys]),
+                  "index": array.array("B", [k & 0xFF for k in keys]),
+                  "count": array.array("L", [d[k].count for k in keys])}
+        for field in self.statFields[1:]:
+            result[field] = array.array("d", [getattr(d[k], field) for k in keys])
+        return result
+
+    def publish(self):
+        """Makes all of the updates since the last call visible to snapshot()
+
+        This should be called by the thread that calls update(), typically
+        after each batch of received messages has been stored.
+
+        :returns: The new generation number
+        """
+        if not self.__dirty:
+            return self.__generation
+        old = self.__front
+        self.__front = self.__entries
+        self.__generation += 1
+        # Readers that are still copying the old front buffer will see the
+        # generation change and start over, so we are free to bring it up
+        # to date and use it as the new back buffer.
+        for key in self.__dirty:
+            old[key] = self.__front[key]
+        self.__entries = old
+        self.__dirty = set()
+        return self.__generation
+
+    def getGeneration(self):
+        return self.__generation
+
+    generation = property(getGeneration)
+
+    def snapshot(self, keys=None):
+        """Returns a consistent copy of the published parameter values
+
+        The result is a dictionary of key: (value, function, timestamp) as of
+        the last call to publish().  This never blocks the writer.  If keys
+        is given only those keys are copied, missing keys are left out.
+
+        :param keys: The parameter keys to copy
+        :type keys: iterable, optional
+        """
+        if keys is not None:
+            keys = list(keys)
+        while True:
+            generation = self.__generation
+            front = self.__front
+            try:
+                if keys is None:
+                    result = front.copy()
+                else:
+                    result = {}
+                    for key in keys:
+                        if key in front:
+                            result[key] = front[key]
+            except RuntimeError: # The writer resized the dict under us
+                continue
+            if self.__generation == generation:
+                return result
+
+    def keys(self):
+        return list(self.__entries)
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __contains__(self, key):
+        return key in self.__entries
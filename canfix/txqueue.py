@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+
+#  CAN-FIX Protocol Module - An Open Source Module that abstracts communication
+#  with the CAN-FIX Aviation Protocol
+#  Copyright (c) 2012 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+# A transmit queue that sends frames in CAN-FIX priority order
+
+import copy
+import heapq
+import itertools
+import threading
+import time
+from .globals import *
+from .utils import frameKey
+
+# Priority bands from Table 2.1 of the CAN-FIX spec, most urgent first
+BAND_ALARM = 0
+BAND_HIGH = 1
+BAND_NORMAL = 2
+BAND_OTHER = 3
+bandNames = ("Node Alarms", "High Priority Data", "Normal Priority Data", "Other")
+
+
+def priorityBand(identifier):
+    """Returns the priority band for a CAN-FIX arbitration ID"""
+    if identifier < HIGH_PRIORITY_DATA:
+        return BAND_ALARM
+    elif identifier < NORMAL_PRIORITY_DATA:
+        return BAND_HIGH
+    elif identifier < FUTURE_MSGS:
+        return BAND_NORMAL
+    return BAND_OTHER
+
+
+class TransmitQueue(object):
+    """Holds outgoing frames and sends them most urgent band first
+
+    Frames are sent in CAN-FIX priority band order, node alarms first, then
+    high priority data, then normal priority data and then everything else.
+    Within a band frames go out in the order they were queued.  Because the
+    queue only ever hands the bus one frame at a time an alarm never waits
+    behind more than the frame that is already being sent.
+
+    If a parameter update is queued while an older update for the same
+    node, parameter and index is still waiting the older one is replaced
+    and the new value takes its place in line.  Meta data frames only
+    replace waiting frames for the same meta data item, never a value.
+
+    The queue has a send() method so it can be given to anything that
+    expects a bus, like the TransmitScheduler.
+
+    :param bus: The bus to send on
+    :type bus: can.BusABC
+    :param timeout: Timeout passed to bus.send()
+    :type timeout: float, optional
+    """
+    def __init__(self, bus, timeout=None):
+        self.bus = bus
+        self.timeout = timeout
+        self.sent = 0
+        self.superseded = 0
+        self.sendErrors = 0
+        self.maxLatency = [0.0] * len(bandNames)
+        self.__heap = []
+        self.__waiting = {}  # Parameter key: heap entry
+        self.__seq = itertools.count()
+        self.__cond = threading.Condition()
+        self.__running = False
+        self.__thread = None
+
+    def send(self, msg, timeout=None):
+        """Queues a message to be sent.  This never blocks.
+
+        The message is copied so the caller is free to reuse it.
+        """
+        msg = copy.copy(msg)
+        msg.data = bytearray(msg.data)
+        key = frameKey(msg)
+        with self.__cond:
+            if key is not None:
+                entry = self.__waiting.get(key)
+                if entry is not None:
+                    entry[3] = msg
+                    self.superseded += 1
+                    return
+            band = priorityBand(msg.arbitration_id)
+            entry = [band, next(self.__seq), time.monotonic(), msg, key]
+            heapq.heappush(self.__heap, entry)
+            if key is not None:
+                self.__waiting[key] = entry
+            self.__cond.notify_all()
+
+    def pop(self, timeout=0):
+        """Removes and returns the most urgent message
+
+        :returns: None if nothing is queued before the timeout
+        """
+        with self.__cond:
+            if not self.__heap and timeout != 0:
+                self.__cond.wait(timeout)
+            if not self.__heap:
+                return None
+            band, seq, queued, msg, key = heapq.heappop(self.__heap)
+            if key is not None:
+                del self.__waiting[key]
+            if not self.__heap:
+                self.__cond.notify_all()
+        latency = time.monotonic() - queued
+        if latency > self.maxLatency[band]:
+            self.maxLatency[band] = latency
+        return msg
+
+    def sendPending(self, limit=None):
+        """Sends queued messages from the calling thread
+
+        :param limit: The most messages to send.  None sends them all
+        :type limit: int, optional
+        :returns: The number of messages sent
+        """
+        count = 0
+        while limit is None or count < limit:
+            msg = self.pop()
+            if msg is None:
+                break
+            self.__send(msg)
+            count += 1
+        return count
+
+    def __send(self, msg):
+        try:
+            self.bus.send(msg, self.timeout)
+            self.sent += 1
+        except Exception as e:
+            log.error("Unable to send message 0x{:03X} - {}".format(msg.arbitration_id, e))
+            self.sendErrors += 1
+
+    def start(self):
+        """Starts a thread that sends the queued messages"""
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__run, name="canfix-transmit")
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self):
+        self.__running = False
+        with self.__cond:
+            self.__cond.notify_all()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def __run(self):
+        while self.__running:
+            msg = self.pop(0.1)
+            if msg is not None:
+                self.__send(msg)
+
+    def flush(self, timeout=None):
+        """Waits until the queue is empty
+
+        :returns: False if the timeout expired first
+        """
+        with self.__cond:
+            return self.__cond.wait_for(lambda: not self.__heap, timeout)
+
+    def depth(self):
+        """Returns a list of the number of messages waiting in each band"""
+        result = [0] * len(bandNames)
+        with self.__cond:
+            for each in self.__heap:
+                result[each[0]] += 1
+        return result
+
+    def __len__(self):
+        return len(self.__heap)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
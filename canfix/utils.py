@@ -19,6 +19,39 @@
 #  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
 
 import struct
+from .globals import HIGH_PRIORITY_DATA, FUTURE_MSGS
+
+
+def parameterKey(node, identifier, index=0, meta=0):
+    """Returns a single integer that identifies a parameter from a given node
+
+    The node is placed in the top bits, followed by the 11 bit identifier
+    and the 8 bit index so that keys sort the same way as the
+    (node, identifier, index) tuple would.  A meta data item of the
+    parameter, the high nibble of the function code, can be given to get a
+    key of its own above all of the value keys.
+    """
+    return (meta << 27) | (node << 19) | (identifier << 8) | index
+
+
+def splitKey(key):
+    """Returns the (node, identifier, index) tuple for a key that was
+    created with parameterKey()"""
+    return ((key >> 19) & 0xFF, (key >> 8) & 0x7FF, key & 0xFF)
+
+
+def frameKey(msg):
+    """Returns the parameter key for a raw parameter CAN message or None
+
+    This lets us tell which parameter a message is for without decoding it.
+    Meta data frames get a different key for each meta data item so they
+    never stand in for the value of the parameter.
+    """
+    if HIGH_PRIORITY_DATA <= msg.arbitration_id < FUTURE_MSGS and len(msg.data) >= 2:
+        meta = msg.data[2] >> 4 if len(msg.data) > 2 else 0
+        return parameterKey(msg.data[0], msg.arbitration_id, msg.data[1], meta)
+    return None
+
 
 def getTypeSize(datatype):
     """Return the size of the CAN-FIX datatype in bytes"""
@@ -13,5 +13,6 @@ setup(
     packages=find_packages(),
     package_data = {'canfix':['canfix.json']},
     install_requires = ['python-can',],
+    extras_require = {'numpy':['numpy',]},
     test_suite = 'tests',
 )
@@ -0,0 +1,121 @@
+#  Copyright (c) 2016 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+import unittest
+import asyncio
+import canfix
+import canfix.aio
+import can
+from tests.helpers import airspeedMsg
+
+
+class TestAsyncBus(unittest.TestCase):
+    def setUp(self):
+        self.remote = can.Bus(interface="virtual", channel="aio_test")
+        self.local = can.Bus(interface="virtual", channel="aio_test")
+
+    def tearDown(self):
+        self.remote.shutdown()
+        self.local.shutdown()
+
+    def test_Receive(self):
+        async def run():
+            async with canfix.aio.AsyncBus(self.local) as ab:
+                params = ab.subscribe(types=(canfix.Parameter,))
+                everything = ab.subscribe()
+                na = canfix.NodeAlarm()
+                na.node = 5
+                na.alarm = 12
+                na.data = bytearray([1, 2])
+                self.remote.send(na.msg)
+                self.remote.send(airspeedMsg(120.5))
+                p = await asyncio.wait_for(params.get(), 5)
+                self.assertEqual(p.name, "Indicated Airspeed")
+                self.assertAlmostEqual(p.value, 120.5)
+                a = await asyncio.wait_for(everything.get(), 5)
+                self.assertIsInstance(a, canfix.NodeAlarm)
+                b = await asyncio.wait_for(everything.get(), 5)
+                self.assertIsInstance(b, canfix.Parameter)
+            # Closing the bus ends the iteration
+            with self.assertRaises(StopAsyncIteration):
+                await params.get()
+        asyncio.run(run())
+
+    def test_Bounded(self):
+        async def run():
+            async with canfix.aio.AsyncBus(self.local) as ab:
+                s = ab.subscribe(maxsize=2)
+                last = ab.subscribe(predicate=lambda p: p.node == 10)
+                for n in range(1, 11):
+                    self.remote.send(airspeedMsg(100.0, node=n))
+                p = await asyncio.wait_for(last.get(), 5)
+                self.assertEqual(p.node, 10)
+                self.assertEqual(s.qsize(), 2)
+                self.assertEqual(s.drops, 8)
+                self.assertEqual((await s.get()).node, 9)
+        asyncio.run(run())
+
+    def test_Ids(self):
+        async def run():
+            async with canfix.aio.AsyncBus(self.local) as ab:
+                s = ab.subscribe(ids=["Indicated Airspeed"])
+                self.assertEqual(self.local.filters,
+                                 [{"can_id": 0x183, "can_mask": 0x7FF, "extended": False}])
+                alt = canfix.Parameter()
+                alt.name = "Indicated Altitude"
+                alt.node = 1
+                alt.value = 1000
+                self.remote.send(alt.msg)
+                self.remote.send(airspeedMsg(90.0))
+                p = await asyncio.wait_for(s.get(), 5)
+                self.assertEqual(p.name, "Indicated Airspeed")
+                s.close()
+                self.assertIsNone(self.local.filters)
+        asyncio.run(run())
+
+    def test_Send(self):
+        async def run():
+            async with canfix.aio.AsyncBus(self.local, batchSize=4) as ab:
+                await asyncio.gather(*[ab.send(airspeedMsg(100.0 + n)) for n in range(10)])
+            values = []
+            for n in range(10):
+                msg = self.remote.recv(1)
+                values.append(canfix.parseMessage(msg).value)
+            self.assertEqual([round(x) for x in values], list(range(100, 110)))
+        asyncio.run(run())
+
+    def test_SendReused(self):
+        # The same Parameter sent again before the batch is written must not
+        # change the frames that are already queued
+        async def run():
+            p = canfix.parseMessage(airspeedMsg(100.0))
+            async with canfix.aio.AsyncBus(self.local) as ab:
+                sends = []
+                for value in (100.0, 110.0, 120.0):
+                    p.value = value
+                    sends.append(asyncio.ensure_future(ab.send(p)))
+                    await asyncio.sleep(0)
+                await asyncio.gather(*sends)
+            values = []
+            for n in range(3):
+                msg = self.remote.recv(1)
+                values.append(round(canfix.parseMessage(msg).value))
+            self.assertEqual(values, [100, 110, 120])
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+#  CAN-FIX Protocol Module - An Open Source Module that abstracts communication
+#  with the CAN-FIX Aviation Protocol
+#  Copyright (c) 2012 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+# Compares the size and speed of the compressed recording format with the
+# plain recording format and gzip'd candump text.
+#
+#   python tests/benchmarks/compression.py [capture] [--seconds N]
+#
+# If no capture is given a simulated flight like the one from
+# tests/node_tests/node.py is used.  The capture can be anything that
+# can.LogReader reads.
+
+import argparse
+import gzip
+import io
+import math
+import os
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import can
+import canfix
+from canfix.compression import CompressedWriter, CompressedReader
+from canfix.recording import RecordingWriter, RecordingReader
+
+# node, parameter name, rate in Hz, offset, range, period
+traffic = [
+    (15, "Indicated Airspeed", 10, 110, 0.5, 4),
+    (15, "Indicated Altitude", 10, 5500, 20, 8),
+    (15, "Heading", 10, 180, 20, 7),
+    (15, "Vertical Speed", 10, 0, 2000, 11),
+    (16, "Pitch Angle", 40, 0, 2.0, 12),
+    (16, "Roll Angle", 40, 0, 1.0, 6),
+    (64, "N1 or Engine RPM #1", 4, 2400, 10, 10),
+    (64, "Oil Pressure #1", 4, 75, 1.0, 5),
+    (64, "Oil Temperature #1", 4, 100, 15.0, 7),
+    (64, "Cylinder Head Temperature #1", 4, 85, 50.0, 7),
+    (64, "Exhaust Gas Temperature #1", 4, 1915, 50.0, 7),
+    (64, "Fuel Flow #1", 4, 8, 5.0, 7),
+]
+
+
+def simulate(seconds):
+    frames = []
+    for node, name, rate, offset, span, period in traffic:
+        p = canfix.Parameter()
+        p.node = node
+        p.name = name
+        for n in range(int(seconds * rate)):
+            t = 1700000000.0 + n / rate
+            p.value = offset + span * math.sin(t % period * 6.28 / period)
+            m = p.msg
+            frames.append(can.Message(timestamp=t, arbitration_id=m.arbitration_id,
+                                      is_extended_id=False, channel="can0",
+                                      data=bytearray(m.data)))
+    frames.sort(key=lambda m: m.timestamp)
+    return frames
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CAN-FIX recording compression benchmark")
+    parser.add_argument("capture", nargs="?", help="Capture file to use")
+    parser.add_argument("--seconds", type=float, default=600.0,
+                        help="Length of the simulated flight")
+    args = parser.parse_args()
+
+    if args.capture:
+        with can.LogReader(args.capture) as r:
+            frames = [m for m in r if not m.is_extended_id]
+    else:
+        frames = simulate(args.seconds)
+    print("{} frames".format(len(frames)))
+
+    tmp = tempfile.mkdtemp()
+    candump = os.path.join(tmp, "capture.log")
+
+    def writeCandump():
+        with can.Logger(candump) as log:
+            for m in frames:
+                log(m)
+        with open(candump, "rb") as f:
+            return gzip.compress(f.read())
+
+    def writeWith(cls):
+        def f():
+            buf = io.BytesIO()
+            with cls(buf) as w:
+                for m in frames:
+                    w.write(m)
+            return buf.getvalue()
+        return f
+
+    def readCandump(data):
+        def f():
+            with open(candump, "wb") as out:
+                out.write(gzip.decompress(data))
+            with can.LogReader(candump) as r:
+                return sum(1 for m in r)
+        return f
+
+    def readWith(cls, data):
+        return lambda: sum(1 for m in cls(io.BytesIO(data)))
+
+    results = []
+    data, enc = timed(writeCandump)
+    count, dec = timed(readCandump(data))
+    results.append(("candump + gzip", len(data), enc, dec))
+    for name, writer, reader in (("recording", RecordingWriter, RecordingReader),
+                                 ("compressed", CompressedWriter, CompressedReader)):
+        data, enc = timed(writeWith(writer))
+        count, dec = timed(readWith(reader, data))
+        results.append((name, len(data), enc, dec))
+    os.remove(candump)
+    os.rmdir(tmp)
+
+    base = results[0][1]
+    print("{:16} {:>12} {:>8} {:>10} {:>10}".format("format", "bytes", "ratio", "write s", "read s"))
+    for name, size, enc, dec in results:
+        print("{:16} {:>12} {:>8.2f} {:>10.3f} {:>10.3f}".format(name, size, base / size, enc, dec))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+#  CAN-FIX Protocol Module - An Open Source Module that abstracts communication
+#  with the CAN-FIX Aviation Protocol
+#  Copyright (c) 2012 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+# Compares reading python-can logs with the canfix importers against the
+# plain "for msg in can.LogReader(name): canfix.parseMessage(msg)" loop.
+#
+#   python tests/benchmarks/importers.py [--seconds N]
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import can
+import canfix
+from canfix.importers import openLog, importParameters
+from compression import simulate, traffic
+
+
+def naive(name):
+    count = 0
+    with can.LogReader(name) as r:
+        for msg in r:
+            if canfix.parseMessage(msg, silent=True) is not None:
+                count += 1
+    return count
+
+
+def batches(name):
+    return sum(len(b) for b in openLog(name).batches())
+
+
+def decode(name):
+    return len(importParameters(name, [x[1] for x in traffic]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CAN-FIX log importer benchmark")
+    parser.add_argument("--seconds", type=float, default=300.0,
+                        help="Length of the simulated flight")
+    args = parser.parse_args()
+    frames = simulate(args.seconds)
+    print("{} frames".format(len(frames)))
+    tmp = tempfile.mkdtemp()
+    try:
+        print("{:6} {:>22} {:>12} {:>9}".format("format", "method", "frames/s", "speedup"))
+        for ext in ("log", "asc", "blf"):
+            name = os.path.join(tmp, "capture." + ext)
+            with can.Logger(name) as log:
+                for m in frames:
+                    log(m)
+            base = None
+            for method, func in (("LogReader+parseMessage", naive),
+                                 ("importer batches", batches),
+                                 ("importParameters", decode)):
+                start = time.perf_counter()
+                func(name)
+                rate = len(frames) / (time.perf_counter() - start)
+                if base is None:
+                    base = rate
+                print("{:6} {:>22} {:>12.0f} {:>9.2f}".format(ext, method, rate, rate / base))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
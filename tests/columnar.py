@@ -0,0 +1,103 @@
+#  Copyright (c) 2016 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+import unittest
+import os
+import tempfile
+from canfix.recording import RecordingWriter, RecordingReader
+from canfix.utils import setValue
+from tests.helpers import parameterFrame
+
+try:
+    import numpy as np
+    from canfix.columnar import MappedRecording, decodeValues, recordType
+except ImportError:
+    np = None
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class TestMappedRecording(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        fd, cls.name = tempfile.mkstemp()
+        os.close(fd)
+        with RecordingWriter(cls.name, blockSize=64) as w:
+            for n in range(500):
+                t = 100.0 + n * 0.1
+                w.write(parameterFrame(t, "Indicated Airspeed", 50.0 + n * 0.1))
+                w.write(parameterFrame(t, "Indicated Airspeed", 10.0, node=2))
+                if n % 100 == 0:
+                    w.write(parameterFrame(t, "Indicated Altitude", 1000 + n))
+                    w.write(parameterFrame(t, "Next Waypoint ETA", [1, 2, 3]))
+            # Failed airspeed on node 2 and an airspeed meta data frame
+            w.write(parameterFrame(200.0, "Indicated Airspeed", 0.0, node=2, function=0x04))
+            meta = parameterFrame(200.0, "Indicated Airspeed", 0.0, node=2, function=0x10)
+            w.write(meta)
+
+    @classmethod
+    def tearDownClass(cls):
+        os.remove(cls.name)
+
+    def test_View(self):
+        with MappedRecording(self.name) as mr:
+            self.assertEqual(len(mr), 1012)
+            block = mr.blocks()[0]
+            records = mr.records(block)
+            self.assertEqual(records.dtype.itemsize, 16)
+            self.assertFalse(records.flags.owndata)
+            self.assertEqual(records["id"][0], 0x183)
+            with RecordingReader(self.name) as r:
+                first = next(iter(r))
+            self.assertEqual(bytes(records["data"][0][:first.dlc]), bytes(first.data))
+            del records
+
+    def test_Parameter(self):
+        with MappedRecording(self.name) as mr:
+            ias = mr.parameter("Indicated Airspeed", node=1)
+            self.assertEqual(len(ias["value"]), 500)
+            np.testing.assert_allclose(ias["value"], 50.0 + np.arange(500) * 0.1, atol=0.051)
+            np.testing.assert_allclose(ias["time"], 100.0 + np.arange(500) * 0.1, atol=1e-5)
+            # Meta data is left out but the failed value is kept
+            node2 = mr.parameter(0x183, node=2)
+            self.assertEqual(len(node2["value"]), 501)
+            self.assertEqual(node2["function"][-1], 0x04)
+            alt = mr.parameter("Indicated Altitude", start=105.0, end=125.0)
+            self.assertEqual(list(alt["value"]), [1100.0, 1200.0])
+
+    def test_Select(self):
+        with MappedRecording(self.name) as mr:
+            rows = sum(len(r) for t, r in mr.select(ids=[0x184]))
+            self.assertEqual(rows, 5)
+            rows = sum(len(r) for t, r in mr.select(start=100.0, end=100.05))
+            self.assertEqual(rows, 4)
+
+    def test_Fallback(self):
+        # Types that are not a single number are decoded one at a time
+        with MappedRecording(self.name) as mr:
+            t = mr.parameter("Next Waypoint ETA")
+            self.assertEqual(t["value"][0], [1, 2, 3])
+
+    def test_Decode(self):
+        records = np.zeros(3, dtype=recordType)
+        for n, v in enumerate([-5, 0, 300]):
+            records["data"][n][3:5] = list(setValue("INT", v))
+        np.testing.assert_allclose(decodeValues(records, "INT", 0.5), [-2.5, 0.0, 150.0])
+        records["data"][0][3] = 0x81
+        self.assertEqual(decodeValues(records, "BYTE")[0], 0x81)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+#  Copyright (c) 2016 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+import unittest
+import io
+import random
+import can
+from canfix.compression import *
+from canfix.recording import RecordingWriter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def sample(count=3000, seed=1):
+    # A few parameters from two nodes with slowly changing values, an
+    # alarm, an error frame and a remote frame
+    rnd = random.Random(seed)
+    frames = []
+    ias = 1000
+    for n in range(count):
+        t = 100.0 + n * 0.003 + rnd.random() * 0.0005
+        ias += rnd.choice((-1, 0, 0, 1))
+        frames.append(can.Message(timestamp=t, arbitration_id=0x183, is_extended_id=False,
+                                  data=[1, 0, 0, ias & 0xFF, ias >> 8]))
+        if n % 3 == 0:
+            frames.append(can.Message(timestamp=t, arbitration_id=0x502, is_extended_id=False,
+                                      data=[2, n % 4, 0, rnd.randint(0, 255), 0x17]))
+        if n % 500 == 0:
+            frames.append(can.Message(timestamp=t, arbitration_id=0x0C, is_extended_id=False,
+                                      data=[7, 0]))
+    frames.append(can.Message(timestamp=110.0, is_error_frame=True, is_extended_id=False))
+    frames.append(can.Message(timestamp=110.1, arbitration_id=0x6E0, is_extended_id=False,
+                              is_remote_frame=True))
+    frames.append(can.Message(timestamp=110.2, arbitration_id=0x6E0, is_extended_id=False,
+                              data=[]))
+    return frames
+
+
+def columns(frames):
+    deltas = []
+    ids = []
+    payloads = []
+    last = 0
+    for msg in frames:
+        t = int(round((msg.timestamp - frames[0].timestamp) * 1000000))
+        deltas.append(t - last)
+        last = t
+        flags = 0x8000 if msg.is_error_frame else 0x4000 if msg.is_remote_frame else 0
+        ids.append(msg.arbitration_id | flags)
+        payloads.append(bytes(msg.data))
+    return deltas, ids, payloads
+
+
+class TestCodec(unittest.TestCase):
+    def test_Block(self):
+        deltas, ids, payloads = columns(sample(500))
+        raw = encodeBlock(deltas, ids, payloads)
+        self.assertEqual(decodeBlock(raw, len(ids)), (deltas, ids, payloads))
+        # Repeated node, index and function bytes cost nothing
+        self.assertLess(len(raw), 10 * len(ids))
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_Arrays(self):
+        deltas, ids, payloads = columns(sample(500))
+        raw = encodeBlock(deltas, ids, payloads)
+        data = np.zeros((len(ids), 8), dtype=np.uint8)
+        for i, p in enumerate(payloads):
+            data[i, :len(p)] = list(p)
+        dlcs = np.array([len(p) for p in payloads], dtype=np.uint8)
+        a = encodeArrays(np.array(deltas), np.array(ids, dtype=np.uint16), dlcs, data)
+        self.assertEqual(a, raw)
+        d, i, l, p = decodeArrays(raw, len(ids))
+        self.assertEqual(list(d), deltas)
+        self.assertEqual(list(i), ids)
+        np.testing.assert_array_equal(l, dlcs)
+        np.testing.assert_array_equal(p, data)
+
+
+class TestCompressedFile(unittest.TestCase):
+    def write(self, frames, blockSize=1024):
+        f = io.BytesIO()
+        w = CompressedWriter(f, blockSize=blockSize)
+        for msg in frames:
+            w.write(msg)
+        w.flush()
+        f.seek(0)
+        return f, w
+
+    def test_RoundTrip(self):
+        frames = sample()
+        f, w = self.write(frames)
+        r = CompressedReader(f)
+        self.assertEqual(len(r), len(frames))
+        result = list(r)
+        for a, b in zip(frames, result):
+            self.assertEqual(a.arbitration_id, b.arbitration_id)
+            self.assertEqual(bytes(a.data), bytes(b.data))
+            self.assertEqual(a.is_error_frame, b.is_error_frame)
+            self.assertEqual(a.is_remote_frame, b.is_remote_frame)
+            self.assertAlmostEqual(a.timestamp, b.timestamp, places=5)
+
+    def test_Size(self):
+        frames = sample()
+        f, w = self.write(frames)
+        plain = io.BytesIO()
+        with RecordingWriter(plain, blockSize=1024) as rw:
+            for msg in frames:
+                rw.write(msg)
+        self.assertLess(len(f.getvalue()) * 3, len(plain.getvalue()))
+
+    def test_Filter(self):
+        f, w = self.write(sample(), blockSize=256)
+        r = CompressedReader(f)
+        alarms = list(r.frames(ids=[0x0C]))
+        self.assertEqual(len(alarms), 6)
+        self.assertGreater(r.blocksSkipped, 0)
+        late = list(r.frames(ids=[0x183], start=108.0))
+        self.assertTrue(all(m.timestamp >= 108.0 for m in late))
+
+    def test_OutOfOrder(self):
+        frames = [can.Message(timestamp=t, arbitration_id=0x183, is_extended_id=False,
+                              data=[1, 0, 0, 0x10, 0x27]) for t in (10.0, 9.0, 11.0)]
+        f, w = self.write(frames)
+        r = CompressedReader(f)
+        for block in r.blocks():
+            self.assertLessEqual(block.start, block.end)
+        self.assertEqual([m.timestamp for m in r.frames(end=9.5)], [9.0])
+        self.assertEqual(sorted(m.timestamp for m in r), [9.0, 10.0, 11.0])
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_ReaderArrays(self):
+        frames = sample()
+        f, w = self.write(frames)
+        r = CompressedReader(f)
+        block = r.blocks()[1]
+        t, ids, dlcs, data = r.arrays(block)
+        self.assertEqual(len(t), block.count)
+        first = frames[1024]
+        self.assertAlmostEqual(t[0], first.timestamp, places=5)
+        self.assertEqual(bytes(data[0][:dlcs[0]]), bytes(first.data))
+
+    def test_Errors(self):
+        with self.assertRaises(RecordingError):
+            CompressedReader(io.BytesIO(b"not a recording at all"))
+        f, w = self.write([])
+        self.assertEqual(list(CompressedReader(f)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
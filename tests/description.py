@@ -0,0 +1,131 @@
+#  Copyright (c) 2016 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+import random
+import time
+import unittest
+import canfix
+from canfix.description import DescriptionAssembler, DescriptionBuffer
+from tests.helpers import FakeNodes, descriptionFrames
+
+
+class TestDescriptionBuffer(unittest.TestCase):
+    def test_OutOfOrder(self):
+        buf = DescriptionBuffer(1, packets=2)
+        self.assertTrue(buf.add(3, b"\x00\x00\x00\x00"))
+        self.assertEqual(buf.end, 3)
+        self.assertTrue(buf.add(1, b"EFGH"))
+        self.assertFalse(buf.add(1, b"EFGH"))
+        self.assertEqual(buf.duplicates, 1)
+        self.assertFalse(buf.complete())
+        self.assertEqual(buf.missing(), [0, 2])
+        buf.add(0, b"ABCD")
+        buf.add(2, b"IJ\x00\x00")
+        self.assertTrue(buf.complete())
+        self.assertEqual(buf.text(), "ABCDEFGHIJ")
+        self.assertEqual(buf.end, 2)
+
+    def test_Gaps(self):
+        buf = DescriptionBuffer(1)
+        self.assertEqual(buf.missing(), [])
+        buf.add(0, b"ABCD")
+        buf.add(4, b"QRST")
+        self.assertEqual(buf.missing(), [1, 2, 3])
+        self.assertIsNone(buf.end)
+        self.assertEqual(buf.text(), "ABCD")
+
+
+class TestDescriptionAssembler(unittest.TestCase):
+    texts = {5: "Engine Monitor EMS-2 rev C",
+             9: "Air Data Computer",
+             30: "A much longer description that needs more packets than the buffer holds " * 4}
+
+    def test_Interleaved(self):
+        bus = FakeNodes(self.texts, descriptions=self.texts)
+        done = []
+        a = DescriptionAssembler(bus, 0x90, callback=lambda n, t: done.append(n), packets=16)
+        for node in self.texts:
+            a.request(node)
+        frames = bus.frames
+        frames.extend(frames[::7])  # Some duplicates
+        random.Random(4).shuffle(frames)
+        for msg in frames:
+            self.assertTrue(a.handleMessage(msg))
+        self.assertEqual(a.descriptions, self.texts)
+        self.assertEqual(sorted(done), [5, 9, 30])
+        self.assertEqual(a.incomplete(), {})
+        self.assertIsNone(a.poll())
+
+    def test_Retransmit(self):
+        bus = FakeNodes(self.texts, descriptions=self.texts)
+        a = DescriptionAssembler(bus, 0x90, timeout=0.1)
+        a.request(9)
+        a.request(5)
+        frames = bus.frames
+        bus.frames = []
+        lost = [frames[1], frames[2], frames[-1]]  # Two from 9 and the end of 5
+        for msg in frames:
+            if msg not in lost:
+                a.handleMessage(msg)
+        self.assertEqual(a.incomplete(), {9: [1, 2], 5: []})
+        a.poll(time.monotonic() + 0.2)
+        self.assertIn(bytes([0x0B, 9, 1, 0]), [r[2] for r in bus.requests])
+        self.assertIn(bytes([0x0B, 9, 2, 0]), [r[2] for r in bus.requests])
+        self.assertIn(bytes([0x0B, 5, 6, 0]), [r[2] for r in bus.requests])  # Probe for the end
+        for msg in bus.frames:
+            a.handleMessage(msg)
+        self.assertEqual(a.descriptions, {9: self.texts[9], 5: self.texts[5]})
+
+    def test_GiveUp(self):
+        bus = FakeNodes(self.texts, descriptions=self.texts)
+        a = DescriptionAssembler(bus, 0x90, timeout=0.1, retries=2)
+        a.request(9)
+        bus.frames = []
+        now = time.monotonic()
+        for n in range(1, 4):
+            a.poll(now + n * 0.2)
+        self.assertEqual(len(bus.requests), 3)
+        self.assertIn(9, a.failed)
+        self.assertFalse(a.wait([9, 5], 0.05))
+        self.assertTrue(a.wait([9], 0.05))
+
+    def test_Filtering(self):
+        a = DescriptionAssembler(node=0x90)
+        other = descriptionFrames(5, 0x91, "For someone else")
+        self.assertFalse(a.handleMessage(other[0]))
+        request = canfix.NodeDescription(packetnumber=0, chars="abcd")
+        request.sendNode = 5
+        request.destNode = 0x90
+        msg = request.msg
+        msg.data = msg.data[:4]
+        self.assertFalse(a.handleMessage(msg))
+        # Listening to everyone
+        a = DescriptionAssembler()
+        for msg in other:
+            a.handleMessage(msg)
+        self.assertEqual(a.descriptions, {5: "For someone else"})
+
+    def test_ListenOnly(self):
+        a = DescriptionAssembler()
+        with self.assertRaises(ValueError):
+            a.request(5)
+        with self.assertRaises(ValueError):
+            DescriptionAssembler(FakeNodes(self.texts, descriptions=self.texts))
+
+
+if __name__ == '__main__':
+    unittest.main()
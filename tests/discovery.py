@@ -0,0 +1,112 @@
+#  Copyright (c) 2016 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+import threading
+import time
+import unittest
+from canfix.utils import setValue
+from canfix.requester import RequestEngine
+from canfix.discovery import NodeDiscovery
+from tests.helpers import FakeNodes, nodeFrame
+
+
+class Feeder(object):
+    # Hands every received frame to the engine and the discovery object like
+    # a can.Notifier would
+    def __init__(self, bus, listeners):
+        self.bus = bus
+        self.listeners = listeners
+        self.running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            msg = self.bus.recv(0.01)
+            if msg is not None:
+                for each in self.listeners:
+                    each.on_message_received(msg)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+
+
+class TestNodeDiscovery(unittest.TestCase):
+    def test_Scan(self):
+        bus = FakeNodes([3, 17, 200])
+        with RequestEngine(bus, 0x91) as engine:
+            discovery = NodeDiscovery(engine, rate=2000.0, timeout=0.1)
+            start = time.monotonic()
+            found = discovery.scan()
+            elapsed = time.monotonic() - start
+        self.assertEqual(sorted(found), [3, 17, 200])
+        self.assertEqual(found[17].device, 17 % 7)
+        self.assertEqual(found[17].fwrev, 2)
+        self.assertEqual(found[17].model, 17)
+        self.assertEqual(len(bus.requests), 255)
+        # All of the requests are in flight together so the scan takes about
+        # one timeout after the last request instead of one per missing node
+        self.assertLess(elapsed, 255 / 2000.0 + 0.1 * 3)
+        self.assertEqual(engine.timeouts, 252)
+
+    def test_Pacing(self):
+        bus = FakeNodes([])
+        engine = RequestEngine(bus, 0x91)
+        discovery = NodeDiscovery(engine, rate=500.0, timeout=0.02)
+        discovery.scan(range(1, 21))
+        times = [r[0] for r in bus.requests]
+        self.assertGreaterEqual(times[-1] - times[0], 19 / 500.0 * 0.9)
+
+    def test_Broadcast(self):
+        bus = FakeNodes([4, 5, 6])
+        engine = RequestEngine(bus, 0x91)
+        discovery = NodeDiscovery(engine, timeout=0.1)
+        feeder = Feeder(bus, [engine, discovery])
+        try:
+            found = discovery.scan(broadcast=True)
+        finally:
+            feeder.stop()
+        self.assertEqual(sorted(found), [4, 5, 6])
+        self.assertEqual(bus.requests[0][2], bytes([0x00, 0x00]))
+
+    def test_Status(self):
+        bus = FakeNodes([8])
+        engine = RequestEngine(bus, 0x91)
+        discovery = NodeDiscovery(engine)
+        data = bytearray([0x06, 0x02, 0x00]) + setValue("INT", 13.8, 0.1)
+        self.assertTrue(discovery.handleMessage(nodeFrame(8, data)))
+        data = bytearray([0x06, 0x00, 0x01, 0xAA, 0xBB])
+        self.assertTrue(discovery.handleMessage(nodeFrame(9, data)))
+        self.assertFalse(discovery.handleMessage(nodeFrame(9, [0x05, 0x00])))
+        self.assertAlmostEqual(discovery.inventory[8].status[2], 13.8)
+        self.assertEqual(discovery.inventory[9].status[256], b"\xaa\xbb")
+        self.assertEqual(discovery.unidentified(), [8, 9])
+        seen = discovery.inventory[8].lastSeen
+        with engine:
+            discovery.scan([8, 9])
+        self.assertEqual(discovery.unidentified(), [9])
+        self.assertEqual(discovery.inventory[8].statusCount, 1)
+        self.assertGreaterEqual(discovery.inventory[8].lastSeen, seen)
+        self.assertEqual(discovery.stale(3600), [])
+        self.assertEqual(discovery.stale(-1), [8, 9])
+        discovery.forget(9)
+        self.assertNotIn(9, discovery.inventory)
+
+
+if __name__ == '__main__':
+    unittest.main()
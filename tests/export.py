@@ -0,0 +1,130 @@
+#  Copyright (c) 2016 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+import unittest
+import csv
+import os
+import shutil
+import tempfile
+import can
+from canfix.export import *
+from canfix.recording import RecordingWriter
+from canfix.compression import CompressedWriter
+from tests.helpers import parameterFrame
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def sample():
+    # EGT for four cylinders at 4Hz plus airspeed that we don't ask for
+    result = []
+    for n in range(100):
+        t = 10.0 + n * 0.25
+        for cyl in range(4):
+            result.append(parameterFrame(t, "Exhaust Gas Temperature #1", 600.0 + n + cyl * 10, index=cyl))
+        result.append(parameterFrame(t, "Indicated Airspeed", 100.0))
+    result.append(parameterFrame(40.0, "Exhaust Gas Temperature #1", 0.0, index=0, function=0x04))
+    result.append(parameterFrame(40.0, "Exhaust Gas Temperature #1", 0.0, index=0, function=0x10))
+    return result
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_Columns(self):
+        c = ParameterColumns(["Exhaust Gas Temperature #1"])
+        for msg in sample():
+            c.add(msg)
+        self.assertEqual(sorted(c.columns), [(1, 0x502, n) for n in range(4)])
+        times, values, functions = c.columns[(1, 0x502, 2)]
+        self.assertEqual(len(times), 100)
+        self.assertAlmostEqual(values[5], 625.0)
+        # The failure is kept and the meta data frame left out
+        self.assertEqual(len(c.columns[(1, 0x502, 0)][0]), 101)
+        self.assertEqual(c.columns[(1, 0x502, 0)][2][-1], 0x04)
+        with self.assertRaises(ValueError):
+            ParameterColumns(["No Such Parameter"])
+
+    def test_ColumnValue(self):
+        self.assertEqual(columnValue("BYTE", [True, False, True] + [False] * 5), 5)
+        self.assertEqual(columnValue("USHORT[3]", [1, 2, 3]), (1, 2, 3))
+        self.assertEqual(columnValue("INT", 7), 7)
+
+    def test_Csv(self):
+        with ColumnExporter(self.dir, [0x502], format="csv", chunkSize=40) as ex:
+            ex.export(sample())
+        files = ex.files[(1, 0x502, 1)]
+        self.assertEqual([os.path.basename(x) for x in files],
+                         ["502_n1_i1_0000.csv", "502_n1_i1_0001.csv", "502_n1_i1_0002.csv"])
+        rows = []
+        for name in files:
+            with open(name) as f:
+                r = list(csv.reader(f))
+                self.assertEqual(r[0], ["time", "value", "flags"])
+                rows.extend(r[1:])
+        self.assertEqual(len(rows), 100)
+        self.assertEqual(float(rows[1][0]), 10.25)
+        self.assertAlmostEqual(float(rows[1][1]), 611.0)
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_Npz(self):
+        name = os.path.join(self.dir, "capture.cfx")
+        with RecordingWriter(name, blockSize=32) as w:
+            for msg in sample():
+                w.write(msg)
+        files = exportCapture(name, os.path.join(self.dir, "out"), ["Exhaust Gas Temperature #1"])
+        self.assertEqual(len(files), 4)
+        data = np.load(files[(1, 0x502, 0)][0])
+        self.assertEqual(len(data["time"]), 101)
+        np.testing.assert_allclose(data["value"][:100], 600.0 + np.arange(100), atol=0.05)
+        self.assertEqual(data["flags"][-1], 0x04)
+
+    def test_Compressed(self):
+        name = os.path.join(self.dir, "capture.cfx")
+        with CompressedWriter(name, blockSize=32) as w:
+            for msg in sample():
+                w.write(msg)
+        self.assertEqual(len(list(readCapture(name, [0x502]))), 402)
+        files = exportCapture(name, os.path.join(self.dir, "out"), [0x502], format="csv")
+        self.assertEqual(len(files), 4)
+        with open(files[(1, 0x502, 2)][0]) as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(len(rows), 101)
+        self.assertAlmostEqual(float(rows[1][1]), 620.0)
+
+    def test_LogReader(self):
+        name = os.path.join(self.dir, "capture.log")
+        with can.Logger(name) as log:
+            for msg in sample():
+                msg.channel = "vcan0"
+                log(msg)
+        files = exportCapture(name, os.path.join(self.dir, "out"), [0x502], format="csv")
+        self.assertEqual(len(files), 4)
+        with open(files[(1, 0x502, 3)][0]) as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(len(rows), 101)
+        self.assertAlmostEqual(float(rows[1][1]), 630.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
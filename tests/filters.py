@@ -0,0 +1,88 @@
+#  Copyright (c) 2016 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+import unittest
+from canfix.filters import *
+from tests.helpers import FakeBus
+
+
+def matches(filters, identifier):
+    for f in filters:
+        if identifier & f["can_mask"] == f["can_id"] & f["can_mask"]:
+            return True
+    return False
+
+
+class TestFilters(unittest.TestCase):
+    def check(self, ids, filters):
+        wanted = set()
+        for low, high in identifierRanges(ids):
+            wanted.update(range(low, high + 1))
+        for n in range(2048):
+            self.assertEqual(matches(filters, n), n in wanted, hex(n))
+
+    def test_Ranges(self):
+        self.assertEqual(identifierRanges([0x185, (0x180, 0x184), 0x190, (0x18F, 0x18F)]),
+                         [(0x180, 0x185), (0x18F, 0x190)])
+        self.assertEqual(identifierRanges(["Indicated Airspeed"]), [(0x183, 0x183)])
+        with self.assertRaises(ValueError):
+            identifierRanges([(0x200, 0x100)])
+        with self.assertRaises(ValueError):
+            identifierRanges(["Not a real parameter"])
+
+    def test_Exact(self):
+        for ids in ([NODE_SPECIFIC_RANGE], [TWOWAY_RANGE], [ALARM_RANGE, PARAMETER_RANGE],
+                    [0x183, 0x184, 0x185, 0x186], [(0x101, 0x2FE), 0x7FF],
+                    list(range(0x300, 0x340, 2))):
+            filters = computeFilters(ids)
+            self.check(ids, filters)
+        self.assertEqual(len(computeFilters([TWOWAY_RANGE])), 1)
+        self.assertEqual(len(computeFilters([0x183, 0x184, 0x185, 0x186])), 3)
+        # Every other ID only needs one filter
+        self.assertEqual(len(computeFilters(list(range(0x300, 0x340, 2)))), 1)
+
+    def test_MaxFilters(self):
+        ids = [0x183, 0x184, 0x190, 0x200, 0x201, 0x380, 0x6E5]
+        filters = computeFilters(ids, maxFilters=3)
+        self.assertLessEqual(len(filters), 3)
+        for n in (0x183, 0x184, 0x190, 0x200, 0x201, 0x380, 0x6E5):
+            self.assertTrue(matches(filters, n))
+        self.assertEqual(len(computeFilters(ids, maxFilters=1)), 1)
+        with self.assertRaises(ValueError):
+            computeFilters(ids, maxFilters=0)
+
+    def test_FilterSet(self):
+        bus = FakeBus()
+        fs = FilterSet(bus)
+        a = fs.add([0x183])
+        self.assertEqual(bus.filters[-1], [{"can_id": 0x183, "can_mask": 0x7FF, "extended": False}])
+        b = fs.add([0x183])
+        self.assertEqual(fs.updates, 1)  # Nothing changed so the bus isn't touched
+        c = fs.add([NODE_SPECIFIC_RANGE])
+        self.check([0x183, NODE_SPECIFIC_RANGE], fs.filters())
+        everything = fs.add()
+        self.assertIsNone(bus.filters[-1])
+        fs.remove(everything)
+        fs.remove(c)
+        self.assertEqual(len(fs.filters()), 1)
+        fs.remove(a)
+        fs.remove(b)
+        self.assertIsNone(fs.filters())
+        self.assertEqual(len(bus.filters), fs.updates)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+#  Copyright (c) 2016 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+# Helpers shared by the test modules
+
+import collections
+import threading
+import time
+import can
+import canfix
+
+
+def parameterFrame(timestamp, name, value, node=1, index=0, function=0):
+    p = canfix.Parameter()
+    p.name = name
+    p.node = node
+    p.index = index
+    p.value = value
+    msg = p.msg
+    msg.data[2] = function
+    msg.timestamp = timestamp
+    return msg
+
+
+def airspeedMsg(value, node=1, index=0, function=0, timestamp=0.0):
+    x = int(round(value * 10))
+    d = bytearray([node, index, function, x & 0xFF, x >> 8])
+    return can.Message(arbitration_id=0x183, is_extended_id=False, data=d,
+                       timestamp=timestamp)
+
+
+class FakeBus(object):
+    """A bus that keeps everything that is done to it
+
+    'sent' holds the (identifier, data) of each frame that was sent,
+    'messages' the message objects themselves and 'times' when each one
+    was sent.  'filters' holds the argument of each set_filters() call.
+    """
+    def __init__(self):
+        self.sent = []
+        self.messages = []
+        self.times = []
+        self.filters = []
+
+    def send(self, msg, timeout=None):
+        self.times.append(time.monotonic())
+        self.messages.append(msg)
+        self.sent.append((msg.arbitration_id, bytes(msg.data)))
+
+    def set_filters(self, filters=None):
+        self.filters.append(filters)
+
+
+def nodeFrame(sender, data):
+    return can.Message(arbitration_id=0x6E0 + sender, is_extended_id=False, data=bytearray(data))
+
+
+def descriptionFrames(node, dest, text):
+    data = text.encode("utf8") + b"\x00"
+    result = []
+    for n in range(0, len(data), 4):
+        d = canfix.NodeDescription(packetnumber=n // 4, chars=data[n:n + 4].ljust(4, b"\x00"))
+        d.sendNode = node
+        d.destNode = dest
+        result.append(d.msg)
+    return result
+
+
+class FakeNodes(object):
+    """A bus full of nodes that answer node specific requests
+
+    Node identification (including the node 0 broadcast), bit rate and
+    parameter enable/disable requests are answered by every node in 'nodes'
+    and description requests from the 'descriptions' dictionary.  Every
+    request is kept in 'requests' as (time, identifier, data) and every reply
+    in 'frames'.  Replies are handed out by recv() and are held until
+    release() is called unless auto is True.
+    """
+    def __init__(self, nodes, auto=True, descriptions=None):
+        self.nodes = set(nodes)
+        self.auto = auto
+        self.descriptions = descriptions or {}
+        self.requests = []
+        self.frames = []
+        self.held = []
+        self.replies = collections.deque()
+        self.cond = threading.Condition()
+
+    def answer(self, requester, data):
+        if data[0] == 0x00:
+            answering = self.nodes if data[1] == 0 else [data[1]]
+            return [nodeFrame(node, [0x00, requester, 0x01, node % 7, 2, node, 0, 0])
+                    for node in sorted(answering) if node in self.nodes]
+        node = data[1]
+        if data[0] == 0x0B and node in self.descriptions:
+            sent = descriptionFrames(node, requester, self.descriptions[node])
+            if len(data) == 2:
+                return sent
+            n = data[2] + data[3] * 256
+            return sent[n:n + 1]
+        if node not in self.nodes:
+            return []
+        if data[0] == 0x01:
+            return [nodeFrame(node, [0x01, requester] if data[2] != 4 else [0x01, requester, 0xFF])]
+        if data[0] in (0x03, 0x04):
+            return [nodeFrame(node, [data[0], requester, 0x00])]
+        return []
+
+    def send(self, msg, timeout=None):
+        data = bytes(msg.data)
+        self.requests.append((time.monotonic(), msg.arbitration_id, data))
+        replies = self.answer(msg.arbitration_id - 0x6E0, data)
+        with self.cond:
+            self.frames.extend(replies)
+            if self.auto:
+                self.replies.extend(replies)
+                self.cond.notify()
+            else:
+                self.held.extend(replies)
+
+    def release(self, order=None):
+        with self.cond:
+            held = self.held if order is None else [self.held[n] for n in order]
+            self.replies.extend(held)
+            self.held = []
+            self.cond.notify()
+
+    def recv(self, timeout=None):
+        with self.cond:
+            if not self.replies:
+                self.cond.wait(timeout)
+            if not self.replies:
+                return None
+            return self.replies.popleft()
@@ -0,0 +1,108 @@
+#  Copyright (c) 2016 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+import unittest
+import io
+import os
+import shutil
+import tempfile
+import can
+from canfix.importers import *
+from canfix.recording import RecordingWriter, RecordingReader
+
+
+def sample():
+    frames = []
+    for n in range(300):
+        t = 1700000000.5 + n * 0.01
+        frames.append(can.Message(timestamp=t, arbitration_id=0x183, is_extended_id=False,
+                                  data=[1, 0, 0, n & 0xFF, 3], channel=0))
+        if n % 50 == 0:
+            frames.append(can.Message(timestamp=t, arbitration_id=0x0C, is_extended_id=False,
+                                      data=[7, 0], channel=0))
+    frames.append(can.Message(timestamp=1700000004.0, arbitration_id=0x6E0, is_extended_id=False,
+                              is_remote_frame=True, dlc=2, channel=0))
+    frames.append(can.Message(timestamp=1700000004.1, is_error_frame=True, channel=0))
+    frames.append(can.Message(timestamp=1700000004.2, arbitration_id=0x12345, is_extended_id=True,
+                              data=[1], channel=0))
+    return frames
+
+
+class TestImporters(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, ext):
+        name = os.path.join(self.dir, "capture." + ext)
+        with can.Logger(name) as log:
+            for msg in sample():
+                log(msg)
+        return name
+
+    def everything(self, importer, batchSize=100):
+        result = []
+        for batch in importer.batches(batchSize):
+            self.assertLessEqual(len(batch), batchSize)
+            result.extend(batch)
+        return result
+
+    def compare(self, ext, cls):
+        name = self.write(ext)
+        self.assertIsInstance(openLog(name), cls)
+        fast = self.everything(openLog(name))
+        slow = self.everything(LogImporter(name))
+        self.assertEqual(len(fast), 308)
+        self.assertEqual(len(fast), len(slow))
+        for a, b in zip(fast, slow):
+            self.assertAlmostEqual(a[0], b[0], places=5)
+            self.assertEqual(a[1:], b[1:])
+        self.assertEqual(fast[1], (fast[1][0], 0x0C, 0, bytes([7, 0])))
+        self.assertEqual(fast[-2][1:], (0x6E0, FLAG_REMOTE, b""))
+        self.assertEqual(fast[-1][1:], (0, FLAG_ERROR, b""))
+
+    def test_Candump(self):
+        self.compare("log", CandumpImporter)
+
+    def test_Asc(self):
+        self.compare("asc", AscImporter)
+
+    def test_Blf(self):
+        name = self.write("blf")
+        self.assertEqual(len(self.everything(openLog(name))), 308)
+
+    def test_Parameters(self):
+        name = self.write("log")
+        columns = importParameters(name, ["Indicated Airspeed"])
+        times, values, functions = columns.columns[(1, 0x183, 0)]
+        self.assertEqual(len(times), 300)
+        self.assertAlmostEqual(values[4], 76.8 + 0.4)
+
+    def test_Convert(self):
+        name = self.write("log")
+        out = io.BytesIO()
+        with RecordingWriter(out) as w:
+            self.assertEqual(convertLog(name, w), 308)
+        out.seek(0)
+        frames = list(RecordingReader(out))
+        self.assertEqual(len(frames), 308)
+        self.assertTrue(frames[-1].is_error_frame)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+#  Copyright (c) 2016 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+import unittest
+import os
+import shutil
+import tempfile
+import can
+from canfix.index import RecordingIndex, openRecording, frameNode
+from canfix.recording import RecordingWriter, RecordingError
+from canfix.compression import CompressedWriter
+from tests.helpers import parameterFrame
+
+
+def sample():
+    # Oil pressure from node 5 and node 6, airspeed all the time and an
+    # alarm from node 5 near the end
+    frames = []
+    for n in range(2000):
+        t = 1000.0 + n * 0.1
+        frames.append(parameterFrame(t, "Indicated Airspeed", 100.0))
+        if n % 10 == 0:
+            frames.append(parameterFrame(t, "Oil Pressure #1", 60.0 + n / 100.0, node=5))
+        if n >= 1500 and n % 10 == 5:
+            frames.append(parameterFrame(t, "Oil Pressure #1", 20.0, node=6))
+    frames.append(parameterFrame(1150.0, "Oil Pressure #1", 0.0, node=5, function=0x10))
+    frames.append(can.Message(timestamp=1190.0, arbitration_id=5, is_extended_id=False, data=[3, 0]))
+    frames.sort(key=lambda m: m.timestamp)
+    return frames
+
+
+class TestRecordingIndex(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, cls, name):
+        name = os.path.join(self.dir, name)
+        with cls(name, blockSize=128) as w:
+            for msg in sample():
+                w.write(msg)
+        return name
+
+    def check(self, name):
+        index = RecordingIndex.open(name)
+        self.assertTrue(os.path.exists(name + ".idx"))
+        self.assertEqual(index.nodes(0x220), [5, 6])
+        values = list(index.query("Oil Pressure #1", node=5, start=1050.0, end=1100.0))
+        self.assertEqual(len(values), 51)
+        t, p = values[0]
+        self.assertEqual(t, 1050.0)
+        self.assertEqual(p.node, 5)
+        self.assertAlmostEqual(p.value, 65.0, places=1)
+        # Only the blocks that cover that time were read
+        self.assertLessEqual(index.blocksRead, 6)
+        self.assertGreater(len(index.blocks), 15)
+        # Node 6 only shows up at the end
+        self.assertEqual(len(index.blocksFor(0x220, node=6)), len(index.blocksFor(0x220, node=6, start=1150.0)))
+        self.assertEqual(len(list(index.query(0x220, node=6))), 50)
+        self.assertEqual(len(list(index.query(0x220, node=5, meta=True))), 201)
+        alarms = list(index.frames(5, node=5))
+        self.assertEqual(len(alarms), 1)
+        # The saved index is used the second time and matches
+        loaded = RecordingIndex(name)
+        self.assertTrue(loaded.load())
+        self.assertEqual(loaded.entries, index.entries)
+        self.assertEqual(len(loaded.blocks), len(index.blocks))
+        return index
+
+    def test_Recording(self):
+        self.check(self.write(RecordingWriter, "flight.cfx"))
+
+    def test_Compressed(self):
+        self.check(self.write(CompressedWriter, "flight.cfz"))
+
+    def test_Stale(self):
+        name = self.write(RecordingWriter, "flight.cfx")
+        RecordingIndex.open(name)
+        with open(name, "ab") as f:
+            f.write(b"more")
+        self.assertFalse(RecordingIndex(name).load())
+        with self.assertRaises(RecordingError):
+            openRecording(name + ".idx")
+
+    def test_Node255(self):
+        # Two way channel frames have no node and must not show up as node 255
+        name = os.path.join(self.dir, "twoway.cfx")
+        with RecordingWriter(name, blockSize=128) as w:
+            for n in range(10):
+                w.write(parameterFrame(n, "Indicated Airspeed", 100.0, node=255))
+                w.write(can.Message(timestamp=n, arbitration_id=0x7E0, is_extended_id=False, data=[n, 0]))
+        index = RecordingIndex.open(name)
+        self.assertEqual(index.nodes(0x183), [255])
+        self.assertEqual(index.nodes(0x7E0), [])
+        self.assertEqual(index.blocksFor(0x7E0, node=255), [])
+        self.assertEqual(len(list(index.frames(0x7E0))), 10)
+        self.assertEqual(len(list(index.query(0x183, node=255))), 10)
+        loaded = RecordingIndex(name)
+        self.assertTrue(loaded.load())
+        self.assertEqual(loaded.entries, index.entries)
+
+    def test_RemoteFrame(self):
+        # A remote frame has no node byte so it sits beside the node entries
+        name = os.path.join(self.dir, "remote.cfx")
+        with RecordingWriter(name) as w:
+            w.write(parameterFrame(1.0, "Indicated Airspeed", 100.0))
+            w.write(can.Message(timestamp=2.0, arbitration_id=0x183, is_extended_id=False,
+                                is_remote_frame=True, dlc=0))
+            w.write(parameterFrame(3.0, "Indicated Airspeed", 101.0))
+        index = RecordingIndex.open(name)
+        self.assertEqual(index.nodes(0x183), [1])
+        self.assertEqual(len(list(index.frames(0x183))), 3)
+        self.assertEqual(len(list(index.query(0x183, node=1))), 2)
+        loaded = RecordingIndex(name)
+        self.assertTrue(loaded.load())
+        self.assertEqual(loaded.entries, index.entries)
+
+    def test_FrameNode(self):
+        self.assertEqual(frameNode(can.Message(arbitration_id=0x0C, data=[1, 0])), 0x0C)
+        self.assertEqual(frameNode(can.Message(arbitration_id=0x183, data=[7, 0, 0])), 7)
+        self.assertEqual(frameNode(can.Message(arbitration_id=0x6E3, data=[0, 0])), 3)
+        self.assertIsNone(frameNode(can.Message(arbitration_id=0x7E0, data=[0])))
+
+
+if __name__ == '__main__':
+    unittest.main()
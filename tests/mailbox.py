@@ -0,0 +1,78 @@
+#  Copyright (c) 2016 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+import unittest
+import threading
+import canfix
+import can
+from tests.helpers import airspeedMsg
+
+
+class TestMailbox(unittest.TestCase):
+    def test_Coalesce(self):
+        mb = canfix.Mailbox()
+        for n in range(10):
+            mb.putMessage(airspeedMsg(100.0 + n, node=2))
+            mb.putMessage(airspeedMsg(200.0 + n, node=1))
+        self.assertEqual(len(mb), 2)
+        self.assertEqual(mb.overwrites, 18)
+        result = mb.drain()
+        self.assertEqual([p.node for p in result], [1, 2])
+        self.assertAlmostEqual(result[0].value, 209.0)
+        self.assertAlmostEqual(result[1].value, 109.0)
+        self.assertEqual(mb.drain(), [])
+
+    def test_ParameterObjects(self):
+        mb = canfix.Mailbox()
+        p = canfix.Parameter()
+        p.name = "Indicated Airspeed"
+        p.node = 3
+        p.value = 90.0
+        mb.put(p)
+        mb.putMessage(airspeedMsg(95.0, node=3))
+        result = mb.drain()
+        self.assertEqual(len(result), 1)
+        self.assertAlmostEqual(result[0].value, 95.0)
+
+    def test_Meta(self):
+        # Meta data doesn't replace a pending value, or the other way around
+        mb = canfix.Mailbox()
+        mb.putMessage(airspeedMsg(100.0))
+        mb.putMessage(airspeedMsg(160.0, function=0x50))
+        mb.put(canfix.parseMessage(airspeedMsg(165.0, function=0x50)))
+        self.assertEqual(len(mb), 2)
+        result = mb.drain()
+        self.assertEqual([(p.value, p.meta) for p in result], [(100.0, None), (165.0, "Vne")])
+
+    def test_NotParameters(self):
+        mb = canfix.Mailbox()
+        alarm = can.Message(arbitration_id=0x05, is_extended_id=False, data=[1, 0])
+        self.assertFalse(mb.putMessage(alarm))
+        future = can.Message(arbitration_id=0x600, is_extended_id=False, data=[1, 0, 0, 0])
+        self.assertFalse(mb.putMessage(future))
+        self.assertEqual(len(mb), 0)
+
+    def test_Wait(self):
+        mb = canfix.Mailbox()
+        t = threading.Timer(0.05, mb.putMessage, [airspeedMsg(100.0)])
+        t.start()
+        result = mb.drain(timeout=5)
+        t.join()
+        self.assertEqual(len(result), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+#  Copyright (c) 2016 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+import unittest
+import time
+import can
+from canfix.metrics import BusMetrics, frameBits, bitrateValue
+
+
+def frame(identifier, data, **kwargs):
+    return can.Message(arbitration_id=identifier, is_extended_id=False, data=bytearray(data), **kwargs)
+
+
+class TestBusMetrics(unittest.TestCase):
+    def test_FrameBits(self):
+        self.assertEqual(frameBits(0, stuffing=False), 47)
+        self.assertEqual(frameBits(8, stuffing=False), 111)
+        # Worst case stuffing from Davis et al.
+        self.assertEqual(frameBits(0), 55)
+        self.assertEqual(frameBits(8), 135)
+
+    def test_Bitrate(self):
+        self.assertEqual(bitrateValue(500), 500)
+        self.assertEqual(bitrateValue(1), 125)
+        self.assertEqual(bitrateValue(4), 1000)
+        with self.assertRaises(ValueError):
+            bitrateValue(100)
+        self.assertEqual(BusMetrics(bitrate=2).bitrate, 250)
+
+    def test_Counts(self):
+        m = BusMetrics(bitrate=125)
+        for n in range(10):
+            m.on_message_received(frame(0x183, [1, 0, 0, n, 0]))
+        m.on_message_received(frame(0x183, [2, 0, 0, 1, 0]))
+        m.on_message_received(frame(0x0C, [3, 0]))
+        m.on_message_received(frame(0x6E5, [0x06, 0x00]))
+        m.on_message_received(can.Message(arbitration_id=0x123456, is_extended_id=True))
+        m.on_message_received(can.Message(is_error_frame=True))
+        m.parseError(frame(0x6DF, [1, 0, 0]))
+        self.assertEqual(m.frames[0x183], 11)
+        self.assertEqual(m.bits[0x183], 11 * frameBits(5))
+        self.assertEqual(m.nodeFrames[1], 10)
+        self.assertEqual(m.nodeFrames[2], 1)
+        self.assertEqual(m.nodeFrames[0x0C], 1)   # Alarm ID is the node
+        self.assertEqual(m.nodeFrames[5], 1)
+        s = m.snapshot()
+        self.assertEqual(s["frames"], 13)
+        self.assertEqual(s["errorFrames"], 1)
+        self.assertEqual(s["otherFrames"], 1)
+        self.assertEqual(s["parseErrors"], 1)
+        self.assertEqual(s["ids"][0x183]["frames"], 11)
+        self.assertEqual(s["ids"][0x6DF]["parseErrors"], 1)
+        self.assertEqual(s["groups"]["High Priority Flight Data"]["frames"], 11)
+        self.assertEqual(s["groups"]["High Priority Node Alarms"]["frames"], 1)
+        self.assertEqual(s["nodes"][1]["frames"], 10)
+        self.assertGreater(s["load"], 0.0)
+        a = m.arrays()
+        self.assertEqual(a["frames"][0x183], 11)
+
+    def test_Rates(self):
+        m = BusMetrics(bitrate=1000, stuffing=False)
+        m.snapshot()
+        for n in range(100):
+            m.on_message_received(frame(0x183, [1, 0, 0, 0, 0, 0, 0, 0]))
+        time.sleep(0.1)
+        s = m.snapshot()
+        rate = s["ids"][0x183]["rate"]
+        self.assertAlmostEqual(rate * s["elapsed"], 100)
+        self.assertAlmostEqual(s["load"], 100 * 111 / s["elapsed"] / 1e6)
+        # Nothing received since the last snapshot
+        s = m.snapshot()
+        self.assertEqual(s["ids"][0x183]["rate"], 0.0)
+        self.assertEqual(s["load"], 0.0)
+        self.assertEqual(s["frames"], 100)
+        m.reset()
+        self.assertEqual(m.snapshot()["frames"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
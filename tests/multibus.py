@@ -0,0 +1,86 @@
+#  Copyright (c) 2016 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+import unittest
+import time
+import can
+from canfix.multibus import BusAggregator
+
+
+def frame(identifier, data, timestamp):
+    return can.Message(arbitration_id=identifier, is_extended_id=False,
+                       data=bytearray(data), timestamp=timestamp)
+
+
+class TestBusAggregator(unittest.TestCase):
+    def test_OrderAndDuplicates(self):
+        ag = BusAggregator([], window=0.005, tolerance=0.002)
+        ag.put(frame(0x183, [1, 0, 0, 1, 0], 100.000), 0)
+        ag.put(frame(0x184, [1, 0, 0, 2, 0], 100.010), 0)
+        ag.put(frame(0x183, [1, 0, 0, 1, 0], 100.0005), 1) # Copy of the first frame
+        ag.put(frame(0x185, [1, 0, 0, 3, 0], 100.003), 1)
+        ag.put(frame(0x183, [1, 0, 0, 1, 0], 100.004), 0)  # A repeat on the same bus
+        ids = []
+        while True:
+            msg = ag.recv(0)
+            if msg is None:
+                break
+            ids.append((msg.arbitration_id, msg.timestamp))
+        self.assertEqual(ids, [(0x183, 100.000), (0x185, 100.003), (0x183, 100.004)])
+        self.assertEqual(ag.duplicates, 1)
+        # The newest frame comes out once it has waited for the window
+        msg = ag.recv(1)
+        self.assertEqual(msg.arbitration_id, 0x184)
+        self.assertEqual(ag.counters()["received"], [3, 2])
+
+    def test_LateFrame(self):
+        ag = BusAggregator([], window=0.001)
+        ag.put(frame(0x183, [1, 0, 0, 1, 0], 50.0), 0)
+        ag.put(frame(0x183, [1, 0, 0, 2, 0], 51.0), 0)
+        self.assertEqual(ag.recv(0).timestamp, 50.0)
+        self.assertEqual(ag.recv(1).timestamp, 51.0)
+        ag.put(frame(0x183, [1, 0, 0, 3, 0], 50.5), 0)
+        self.assertEqual(ag.recv(1).timestamp, 50.5)
+        self.assertEqual(ag.late, 1)
+
+    def test_Buses(self):
+        senders = [can.Bus(interface="virtual", channel="multibus_a"),
+                   can.Bus(interface="virtual", channel="multibus_b")]
+        readers = [can.Bus(interface="virtual", channel="multibus_a"),
+                   can.Bus(interface="virtual", channel="multibus_b")]
+        try:
+            with BusAggregator(readers, window=0.02, tolerance=0.01) as ag:
+                for n in range(5):
+                    for each in senders:
+                        each.send(frame(0x183, [1, 0, 0, n, 0], 0))
+                    time.sleep(0.03)
+                values = []
+                while len(values) < 5:
+                    msg = ag.recv(2)
+                    self.assertIsNotNone(msg)
+                    values.append(msg.data[3])
+                # This lets the last duplicate out of the window
+                self.assertIsNone(ag.recv(0.1))
+            self.assertEqual(values, [0, 1, 2, 3, 4])
+            self.assertEqual(ag.counters()["received"], [5, 5])
+            self.assertEqual(ag.duplicates, 5)
+        finally:
+            for each in senders + readers:
+                each.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -891,7 +891,13 @@ class TestNodeDescription(unittest.TestCase):
         self.assertEqual(n.msg.arbitration_id, NODE_SPECIFIC_MSGS+0x03)
         self.assertEqual(n.msg.data, bytearray([0x0B, 0x04, 0x13, 0x00, ord('A'), ord('B'), ord('C'), ord('D')]))
 
-          
+    def test_BuildBytes(self):
+        n = canfix.NodeDescription(packetnumber=0x1234, chars=b"EF\x00\x00")
+        n.sendNode = 0x03
+        n.destNode = 0x04
+        self.assertEqual(n.msg.data, bytearray([0x0B, 0x04, 0x34, 0x12, ord('E'), ord('F'), 0x00, 0x00]))
+
+
 
 # TODO Test default destination node
 # TODO Test __str__ outputs for requests and responses
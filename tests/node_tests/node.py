@@ -5,12 +5,14 @@ import canfix
 import time
 import math
 import threading
+from canfix.scheduler import TransmitScheduler
 
 
 channel = 'vcan0'
 interface = 'socketcan'
 
 bus = can.interface.Bus(channel, bustype = interface)
+scheduler = TransmitScheduler(bus)
 
 class Node(object):
     def __init__(self, node, device = 0x00, model = 0x00, version = 0x00):
@@ -19,28 +21,18 @@ class Node(object):
         self.model = model
         self.version = version
 
-        # This is an array of tuples.  The tuple is the parameter object
-        # itself and the second is a callable that takes the current value
-        # and should return the value to send.
+        # These are the scheduler entries for our parameters.  Each one holds
+        # the parameter object itself and a callable that takes the current
+        # value and should return the value to send.
         self.parameters = []
 
-    def addParameter(self, name, func):
+    def addParameter(self, name, func, rate):
         p = canfix.Parameter()
         p.node = self.node
         p.name = name
-        self.parameters.append((p, func))
+        self.parameters.append(scheduler.add(p, func, rate))
         return p
 
-    def sendUpdate(self, bus, full=False):
-        for each in self.parameters:
-            p = each[0]
-            func = each[1]
-            p.value = func(p.value)
-            bus.send(p.msg)
-
-        if full: # Here we send a whole report
-            pass
-
     def nodeSpecificMessage(self, m):
         if p.controlCode == 0: # Node Identification
             x = canfix.NodeSpecific()
@@ -60,39 +52,32 @@ def sinWave(offset, range, length):
     return f
 
 airData = Node(15, 0x32, 0x0A0B0C, 0x01)
-airData.addParameter("Indicated Airspeed", sinWave(110, 0.5, 4))
-airData.addParameter("Indicated Altitude", sinWave(5500, 20, 8))
-airData.addParameter("Heading", sinWave(180, 20, 7))
-airData.addParameter("Vertical Speed", sinWave(0, 2000, 11))
-airData.addParameter("Yaw Angle", sinWave(0, 5, 5))
+airData.addParameter("Indicated Airspeed", sinWave(110, 0.5, 4), 10)
+airData.addParameter("Indicated Altitude", sinWave(5500, 20, 8), 10)
+airData.addParameter("Heading", sinWave(180, 20, 7), 10)
+airData.addParameter("Vertical Speed", sinWave(0, 2000, 11), 10)
+airData.addParameter("Yaw Angle", sinWave(0, 5, 5), 10)
 
 ahrs = Node(16, 0x45)
-ahrs.addParameter("Pitch Angle", sinWave(0, 2.0, 12))
-ahrs.addParameter("Roll Angle", sinWave(0, 1.0, 6))
+ahrs.addParameter("Pitch Angle", sinWave(0, 2.0, 12), 40)
+ahrs.addParameter("Roll Angle", sinWave(0, 1.0, 6), 40)
 
 engine = Node(64, 64, 1, 2)
-engine.addParameter("N1 or Engine RPM #1", sinWave(2400, 10, 10))
-engine.addParameter("Manifold Pressure #1", sinWave(23.8, 0.3, 5))
-engine.addParameter("Oil Pressure #1", sinWave(75, 1.0, 5))
-engine.addParameter("Oil Temperature #1", sinWave(100, 15.0, 7))
-engine.addParameter("Coolant Temperature #1", sinWave(75, 5.0, 7))
-engine.addParameter("Fuel Quantity #1", sinWave(15, 5.0, 7))
-engine.addParameter("Fuel Pump Pressure #1", sinWave(15, 5.0, 7))
-engine.addParameter("Cylinder Head Temperature #1", sinWave(85, 50.0, 7))
-engine.addParameter("Exhaust Gas Temperature #1", sinWave(1915, 50.0, 7))
-engine.addParameter("Fuel Flow #1", sinWave(8, 5.0, 7))
+engine.addParameter("N1 or Engine RPM #1", sinWave(2400, 10, 10), 4)
+engine.addParameter("Manifold Pressure #1", sinWave(23.8, 0.3, 5), 4)
+engine.addParameter("Oil Pressure #1", sinWave(75, 1.0, 5), 4)
+engine.addParameter("Oil Temperature #1", sinWave(100, 15.0, 7), 4)
+engine.addParameter("Coolant Temperature #1", sinWave(75, 5.0, 7), 4)
+engine.addParameter("Fuel Quantity #1", sinWave(15, 5.0, 7), 4)
+engine.addParameter("Fuel Pump Pressure #1", sinWave(15, 5.0, 7), 4)
+engine.addParameter("Cylinder Head Temperature #1", sinWave(85, 50.0, 7), 4)
+engine.addParameter("Exhaust Gas Temperature #1", sinWave(1915, 50.0, 7), 4)
+engine.addParameter("Fuel Flow #1", sinWave(8, 5.0, 7), 4)
 
 
-count = 0
+scheduler.start()
 
 while True:
-    if count % 4 == 0:
-        airData.sendUpdate(bus)
-    if count % 10 == 0:
-        engine.sendUpdate(bus)
-    ahrs.sendUpdate(bus)
-    count += 1
-
     m = bus.recv(0.1)
     if m:
         p = canfix.parseMessage(m)
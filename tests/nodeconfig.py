@@ -0,0 +1,195 @@
+#  Copyright (c) 2016 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+import collections
+import threading
+import unittest
+import can
+from canfix.globals import TypeMissingError
+from canfix.utils import getValue, setValue
+from canfix.nodeconfig import ConfigurationClient, ConfigRegistry, ConfigurationError
+
+
+class FakeNode(object):
+    """A bus with a single node on it that answers configuration requests"""
+    def __init__(self, node, keys):
+        self.node = node
+        self.keys = keys  # key: [datatype, value]
+        self.requests = []
+        self.drop = set()     # Request numbers to leave unanswered
+        self.corrupt = set()  # Request numbers to answer with the wrong size
+        self.inFlight = 0
+        self.maxInFlight = 0
+        self.replies = collections.deque()
+        self.cond = threading.Condition()
+
+    def send(self, msg, timeout=None):
+        data = msg.data
+        n = len(self.requests)
+        self.requests.append(bytes(data))
+        requester = msg.arbitration_id - 0x6E0
+        key = data[2] + data[3] * 256
+        if n in self.drop:
+            return
+        if data[0] == 0x0A:
+            if key in self.keys:
+                reply = bytearray([0x0A, requester, 0x00])
+                reply.extend(setValue(*self.keys[key]))
+                if n in self.corrupt:
+                    reply.append(0)
+            else:
+                reply = bytearray([0x0A, requester, 0x01])
+        else:
+            if key in self.keys:
+                self.keys[key][1] = getValue(self.keys[key][0], bytearray(data[4:]))
+                reply = bytearray([0x09, requester, 0x00])
+            else:
+                reply = bytearray([0x09, requester, 0x01])
+        with self.cond:
+            self.inFlight += 1
+            self.maxInFlight = max(self.maxInFlight, self.inFlight)
+            self.replies.append(can.Message(arbitration_id=0x6E0 + self.node,
+                                            is_extended_id=False, data=reply))
+            self.cond.notify()
+
+    def recv(self, timeout=None):
+        with self.cond:
+            if not self.replies:
+                self.cond.wait(timeout)
+            if not self.replies:
+                return None
+            self.inFlight -= 1
+            return self.replies.popleft()
+
+
+def makeKeys(count):
+    keys = {}
+    for n in range(count):
+        if n % 3 == 0:
+            keys[n] = ["UINT", n * 10]
+        elif n % 3 == 1:
+            keys[n] = ["INT", -n]
+        else:
+            keys[n] = ["UDINT", n * 1000]
+    return keys
+
+
+def makeRegistry(keys):
+    registry = ConfigRegistry()
+    for key in keys:
+        registry.register(key, keys[key][0])
+    return registry
+
+
+class TestConfigRegistry(unittest.TestCase):
+    def test_Lookup(self):
+        r = ConfigRegistry()
+        r.register(10, "UINT")
+        r.register(10, "FLOAT", 0.5, node=3)
+        self.assertEqual(r.lookup(1, 10), ("UINT", 1.0))
+        self.assertEqual(r.lookup(3, 10), ("FLOAT", 0.5))
+        self.assertIsNone(r.lookup(1, 11))
+        r.update({11: "INT", 12: ("UDINT", 0.1)})
+        self.assertEqual(r.lookup(1, 12), ("UDINT", 0.1))
+        with self.assertRaises(ValueError):
+            r.register(70000, "INT")
+        with self.assertRaises(KeyError):
+            r.register(1, "NOTATYPE")
+
+
+class TestConfigurationClient(unittest.TestCase):
+    def run_client(self, bus, keys, **kwargs):
+        client = ConfigurationClient(bus, 0x80, makeRegistry(keys), **kwargs)
+        with client:
+            result = client.queryAll(0x10, list(keys))
+        return client, result
+
+    def test_QueryAll(self):
+        keys = makeKeys(60)
+        bus = FakeNode(0x10, keys)
+        client, result = self.run_client(bus, keys, depth=4, timeout=0.2)
+        for key in keys:
+            self.assertEqual(result[key], keys[key][1])
+        self.assertEqual(len(bus.requests), 60)
+        self.assertLessEqual(bus.maxInFlight, 4)
+        self.assertGreater(bus.maxInFlight, 1)
+        self.assertEqual(client.outstanding(), 0)
+        request = bus.requests[5]
+        self.assertEqual(request, bytes([0x0A, 0x10, 5, 0]))
+
+    def test_LostResponse(self):
+        # Losing a response shifts every later answer so the client has to
+        # notice and ask again rather than return the wrong values.  The keys
+        # are all the same size so only the timeout can catch it.
+        keys = {n: ["UINT", n * 10] for n in range(20)}
+        bus = FakeNode(0x10, keys)
+        bus.drop = {3}
+        client, result = self.run_client(bus, keys, depth=4, timeout=0.1)
+        for key in keys:
+            self.assertEqual(result[key], keys[key][1])
+        self.assertEqual(client.timeouts, 1)
+        self.assertGreater(len(bus.requests), 20)
+
+    def test_WrongSize(self):
+        keys = makeKeys(12)
+        bus = FakeNode(0x10, keys)
+        bus.corrupt = {2}
+        client, result = self.run_client(bus, keys, depth=4, timeout=0.1)
+        for key in keys:
+            self.assertEqual(result[key], keys[key][1])
+        self.assertEqual(client.mismatches, 1)
+
+    def test_Timeout(self):
+        keys = makeKeys(2)
+        bus = FakeNode(0x10, keys)
+        bus.drop = set(range(100))
+        client, result = self.run_client(bus, keys, timeout=0.02, retries=2)
+        self.assertIsInstance(result[0], TimeoutError)
+        self.assertIsInstance(result[1], TimeoutError)
+        self.assertEqual(bus.requests.count(bytes([0x0A, 0x10, 0, 0])), 3)
+
+    def test_ErrorAndRaw(self):
+        keys = makeKeys(3)
+        bus = FakeNode(0x10, keys)
+        client = ConfigurationClient(bus, 0x80, timeout=0.2)
+        client.registry.register(0, "UINT")
+        with client:
+            r = client.query(0x10, 40)
+            with self.assertRaises(ConfigurationError) as cm:
+                r.wait(1.0)
+            self.assertEqual(cm.exception.error, 1)
+            self.assertEqual(cm.exception.key, 40)
+            # No registered datatype gives the raw bytes
+            self.assertEqual(client.query(0x10, 2).wait(1.0), setValue("UDINT", 2000))
+            self.assertEqual(client.query(0x10, 0).wait(1.0), 0)
+
+    def test_Set(self):
+        keys = makeKeys(6)
+        bus = FakeNode(0x10, keys)
+        client = ConfigurationClient(bus, 0x80, makeRegistry(keys), timeout=0.2)
+        with client:
+            result = client.setAll(0x10, {0: 1234, 1: -5, 2: 99999})
+            self.assertEqual(result, {0: None, 1: None, 2: None})
+            self.assertEqual(client.query(0x10, 1).wait(1.0), -5)
+            with self.assertRaises(TypeMissingError):
+                client.set(0x10, 100, 1)
+        self.assertEqual(keys[0][1], 1234)
+        self.assertEqual(keys[2][1], 99999)
+        self.assertIn(bytes([0x09, 0x10, 0, 0]) + setValue("UINT", 1234), bus.requests)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+#  Copyright (c) 2016 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+import unittest
+import os
+import tempfile
+import can
+from canfix.parallel import captureChunks, decodeCapture, decodeChunk
+from canfix.recording import RecordingWriter, RecordingReader
+from canfix.compression import CompressedWriter
+from tests.helpers import parameterFrame
+
+
+class TestParallel(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        fd, cls.name = tempfile.mkstemp()
+        os.close(fd)
+        fd, cls.compressed = tempfile.mkstemp()
+        os.close(fd)
+        with RecordingWriter(cls.name, blockSize=64) as w:
+            with CompressedWriter(cls.compressed, blockSize=64) as c:
+                for n in range(2000):
+                    t = n * 0.05
+                    frames = [parameterFrame(t, "Indicated Airspeed", 50.0 + (n % 97) * 0.5),
+                              parameterFrame(t, "Exhaust Gas Temperature #1", 600.0 + n % 13, index=n % 4),
+                              parameterFrame(t, "Indicated Altitude", 1000 + n)]
+                    if n % 300 == 0:
+                        frames.append(can.Message(timestamp=t, arbitration_id=0x0C, is_extended_id=False,
+                                                  data=[7, 0, n % 256]))
+                    for msg in frames:
+                        w.write(msg)
+                        c.write(msg)
+
+    @classmethod
+    def tearDownClass(cls):
+        os.remove(cls.name)
+        os.remove(cls.compressed)
+
+    def test_Chunks(self):
+        with RecordingReader(self.name) as r:
+            blocks = r.blocks()
+        chunks = captureChunks(blocks, blocksPerChunk=10)
+        self.assertEqual([len(c) for c in chunks[:-1]], [10] * (len(chunks) - 1))
+        self.assertEqual(sum(len(c) for c in chunks), len(blocks))
+        chunks = captureChunks(blocks, seconds=10.0)
+        for c in chunks[:-1]:
+            self.assertGreaterEqual(c[-1].end - c[0].start, 10.0)
+            self.assertLess(c[-2].end - c[0].start, 10.0)
+
+    def test_Merge(self):
+        params = ["Indicated Airspeed", 0x502]
+        with RecordingReader(self.name) as r:
+            whole = decodeChunk(self.name, r.blocks(), params)
+        for workers, kwargs in ((1, {"blocksPerChunk": 7}), (3, {}), (2, {"seconds": 5.0})):
+            result = decodeCapture(self.name, params, workers=workers, **kwargs)
+            self.assertEqual(result["columns"], whole["columns"])
+            self.assertEqual(result["alarms"], whole["alarms"])
+            self.assertEqual(result["frames"], whole["frames"])
+            for key, s in whole["stats"].items():
+                m = result["stats"][key]
+                self.assertEqual(m.count, s.count)
+                self.assertAlmostEqual(m.mean, s.mean)
+                self.assertAlmostEqual(m.stddev, s.stddev)
+                self.assertEqual((m.min, m.max, m.last), (s.min, s.max, s.last))
+                self.assertAlmostEqual(m.rate, s.rate)
+        self.assertEqual(len(whole["columns"][(1, 0x183, 0)][0]), 2000)
+        self.assertEqual(len(whole["columns"]), 5)
+        self.assertNotIn(0x184, [k[1] for k in whole["columns"]])
+        self.assertEqual(len(whole["alarms"]), 7)
+        self.assertEqual(whole["alarms"][1], (15.0, 12, 7, bytes([44, 0, 0, 0, 0])))
+
+    def test_Compressed(self):
+        params = ["Indicated Airspeed", 0x502]
+        plain = decodeCapture(self.name, params, workers=1)
+        for workers in (1, 2):
+            result = decodeCapture(self.compressed, params, workers=workers, blocksPerChunk=5)
+            self.assertEqual(result["frames"], plain["frames"])
+            self.assertEqual(len(result["alarms"]), len(plain["alarms"]))
+            self.assertEqual(sorted(result["columns"]), sorted(plain["columns"]))
+            for key, (times, values, functions) in plain["columns"].items():
+                c = result["columns"][key]
+                self.assertEqual(c[1], values)
+                self.assertEqual(c[2], functions)
+                for a, b in zip(c[0], times):
+                    self.assertAlmostEqual(a, b, places=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
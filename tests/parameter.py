@@ -374,5 +374,30 @@ class TestParameterSimpleSender(unittest.TestCase):
         self.assertEqual(msg.dlc,5)
 
 
+class TestParameterIdentity(unittest.TestCase):
+    def makeParameter(self, name, node, index):
+        p = canfix.Parameter()
+        p.name = name
+        p.node = node
+        p.index = index
+        return p
+
+    def test_Key(self):
+        p = self.makeParameter("Exhaust Gas Temperature #1", 5, 3)
+        self.assertEqual(p.key, canfix.parameterKey(5, p.identifier, 3))
+        p.index = 4
+        self.assertEqual(canfix.splitKey(p.key), (5, p.identifier, 4))
+
+    def test_Compare(self):
+        a = self.makeParameter("Exhaust Gas Temperature #1", 5, 3)
+        b = self.makeParameter("Exhaust Gas Temperature #1", 6, 3)
+        c = self.makeParameter("Exhaust Gas Temperature #1", 5, 200)
+        d = self.makeParameter("Exhaust Gas Temperature #2", 5, 0)
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, c)
+        self.assertTrue(a < c < d)
+        self.assertTrue(d > c >= a)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,149 @@
+#  Copyright (c) 2016 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+import unittest
+import threading
+import time
+import canfix
+import can
+from canfix.pipeline import BoundedQueue, ReceivePipeline, frameKey, objectKey
+from canfix.pipeline import DROP_OLDEST, DROP_NEWEST, COALESCE
+from canfix.metrics import BusMetrics
+from tests.helpers import airspeedMsg
+
+
+class TestBoundedQueue(unittest.TestCase):
+    def test_DropOldest(self):
+        q = BoundedQueue(3, DROP_OLDEST)
+        for n in range(5):
+            self.assertTrue(q.put(n))
+        self.assertEqual(q.drops, 2)
+        self.assertEqual([q.get(0), q.get(0), q.get(0)], [2, 3, 4])
+        self.assertIsNone(q.get(0))
+
+    def test_DropNewest(self):
+        q = BoundedQueue(3, DROP_NEWEST)
+        results = [q.put(n) for n in range(5)]
+        self.assertEqual(results, [True, True, True, False, False])
+        self.assertEqual([q.get(0), q.get(0), q.get(0)], [0, 1, 2])
+        self.assertEqual(q.highWater, 3)
+
+    def test_Coalesce(self):
+        q = BoundedQueue(3, COALESCE, frameKey)
+        q.put(airspeedMsg(100.0, node=1))
+        q.put(airspeedMsg(110.0, node=2))
+        q.put(airspeedMsg(120.0, node=1))
+        self.assertEqual(q.qsize(), 2)
+        self.assertEqual(q.coalesced, 1)
+        # The newer value takes the place of the older one in the queue
+        p = canfix.parseMessage(q.get(0))
+        self.assertEqual(p.node, 1)
+        self.assertAlmostEqual(p.value, 120.0)
+        # Messages without a key are never coalesced
+        alarm = can.Message(arbitration_id=0x05, is_extended_id=False, data=[1, 0])
+        q.put(alarm)
+        q.put(alarm)
+        self.assertEqual(q.qsize(), 3)
+
+    def test_CoalesceMeta(self):
+        # A meta data frame is kept apart from the value of its parameter
+        q = BoundedQueue(2, COALESCE, frameKey)
+        q.put(airspeedMsg(100.0))
+        q.put(airspeedMsg(160.0, function=0x50))
+        q.put(airspeedMsg(165.0, function=0x50))
+        self.assertEqual(q.coalesced, 1)
+        self.assertEqual([canfix.parseMessage(q.get(0)).value for n in range(2)], [100.0, 165.0])
+        # And so is a frame from the future message range
+        future = can.Message(arbitration_id=0x600, is_extended_id=False, data=[1, 0, 0, 0])
+        q.put(future)
+        q.put(future)
+        self.assertEqual(q.coalesced, 1)
+        self.assertEqual(q.qsize(), 2)
+        q = BoundedQueue(2, COALESCE, objectKey)
+        q.put(canfix.parseMessage(airspeedMsg(100.0)))
+        q.put(canfix.parseMessage(airspeedMsg(160.0, function=0x50)))
+        self.assertEqual(q.coalesced, 0)
+
+    def test_BadPolicy(self):
+        with self.assertRaises(ValueError):
+            BoundedQueue(3, 99)
+        with self.assertRaises(ValueError):
+            BoundedQueue(3, COALESCE)
+
+
+class TestReceivePipeline(unittest.TestCase):
+    def setUp(self):
+        self.remote = can.Bus(interface="virtual", channel="pipeline_test")
+        self.local = can.Bus(interface="virtual", channel="pipeline_test")
+
+    def tearDown(self):
+        self.remote.shutdown()
+        self.local.shutdown()
+
+    def test_Pipeline(self):
+        received = []
+        done = threading.Event()
+
+        def handler(obj):
+            received.append(obj)
+            if len(received) == 20:
+                done.set()
+
+        metrics = BusMetrics()
+        with ReceivePipeline(self.local, handler, decoders=2, metrics=metrics) as pl:
+            for n in range(20):
+                self.remote.send(airspeedMsg(100.0 + n, node=n+1))
+            # An undefined parameter should count as a parse error
+            self.remote.send(can.Message(arbitration_id=0x6DF, is_extended_id=False, data=[1, 0, 0, 0]))
+            self.assertTrue(done.wait(5))
+            time.sleep(0.05)
+            c = pl.counters()
+        self.assertEqual(c["received"], 21)
+        self.assertEqual(c["decoded"], 20)
+        self.assertEqual(c["handled"], 20)
+        self.assertEqual(c["parseErrors"], 1)
+        self.assertEqual(metrics.frames[0x183], 20)
+        self.assertEqual(metrics.parseErrors[0x6DF], 1)
+        self.assertEqual(sorted(p.node for p in received), list(range(1, 21)))
+
+    def test_SlowHandler(self):
+        release = threading.Event()
+        received = []
+
+        def handler(obj):
+            release.wait(5)
+            received.append(obj)
+
+        pl = ReceivePipeline(self.local, handler, parsedSize=4, policy=COALESCE)
+        pl.start()
+        for n in range(50):
+            self.remote.send(airspeedMsg(float(n), node=(n % 3) + 1))
+        time.sleep(0.2)
+        release.set()
+        time.sleep(0.2)
+        pl.stop()
+        c = pl.counters()
+        self.assertEqual(c["received"], 50)
+        self.assertGreater(c["rawCoalesced"] + c["parsedCoalesced"], 0)
+        # The last value for every node makes it through
+        last = {}
+        for p in received:
+            last[p.node] = round(p.value)
+        self.assertEqual(last, {1: 48, 2: 49, 3: 47})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+#  Copyright (c) 2016 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+import unittest
+import io
+import os
+import tempfile
+import can
+from canfix.recording import *
+
+
+def frame(timestamp, identifier, data):
+    return can.Message(timestamp=timestamp, arbitration_id=identifier,
+                       is_extended_id=False, data=bytearray(data))
+
+
+def sample(count=1000):
+    # Airspeed at 10Hz and altitude at 1Hz with an alarm now and then
+    result = []
+    for n in range(count):
+        t = 1000.0 + n * 0.1
+        result.append(frame(t, 0x183, [1, 0, 0, n & 0xFF, n >> 8]))
+        if n % 10 == 0:
+            result.append(frame(t + 0.001, 0x184, [1, 0, 0, 1, 2, 3, 4]))
+        if n % 250 == 0:
+            result.append(frame(t + 0.002, 0x0C, [1, 0]))
+    return result
+
+
+class TestRecording(unittest.TestCase):
+    def write(self, frames, blockSize=128):
+        f = io.BytesIO()
+        w = RecordingWriter(f, blockSize=blockSize)
+        for each in frames:
+            w.write(each)
+        w.flush()
+        f.seek(0)
+        return f, w
+
+    def test_RoundTrip(self):
+        frames = sample()
+        f, w = self.write(frames)
+        self.assertEqual(w.frames, len(frames))
+        r = RecordingReader(f)
+        self.assertEqual(r.startTime, 1000.0)
+        self.assertEqual(r.blockSize, 128)
+        self.assertEqual(len(r), len(frames))
+        result = list(r)
+        self.assertEqual(len(result), len(frames))
+        for a, b in zip(frames, result):
+            self.assertEqual(a.arbitration_id, b.arbitration_id)
+            self.assertEqual(a.data, b.data)
+            self.assertEqual(a.dlc, b.dlc)
+            self.assertAlmostEqual(a.timestamp, b.timestamp, places=5)
+
+    def test_Size(self):
+        frames = sample()
+        f, w = self.write(frames)
+        blocks = (len(frames) + 127) // 128
+        size = FILE_HEADER.size + blocks * BLOCK_HEADER.size + len(frames) * RECORD.size
+        self.assertEqual(len(f.getvalue()), size)
+        self.assertEqual(w.blocks, blocks)
+
+    def test_SkipBlocks(self):
+        f, w = self.write(sample())
+        r = RecordingReader(f)
+        alarms = list(r.frames(ids=[0x0C]))
+        self.assertEqual(len(alarms), 4)
+        # Only the blocks with alarms in them are read
+        self.assertEqual(r.blocksSkipped, len(r.blocks()) - 4)
+        for b in r.blocks():
+            self.assertTrue(b.contains(0x183))
+
+    def test_TimeRange(self):
+        f, w = self.write(sample())
+        r = RecordingReader(f)
+        result = list(r.frames(ids=[0x183], start=1010.0, end=1019.95))
+        self.assertEqual(len(result), 100)
+        self.assertAlmostEqual(result[0].timestamp, 1010.0, places=5)
+        self.assertGreater(r.blocksSkipped, 0)
+
+    def test_LongGap(self):
+        # A gap too long for the timestamp delta starts a new block
+        frames = [frame(0.0, 0x183, [1, 0, 0, 1, 0]), frame(5000.0, 0x183, [1, 0, 0, 2, 0])]
+        f, w = self.write(frames)
+        self.assertEqual(w.blocks, 2)
+        result = list(RecordingReader(f))
+        self.assertEqual(result[1].timestamp, 5000.0)
+
+    def test_Flags(self):
+        frames = [can.Message(timestamp=1.0, is_error_frame=True, is_extended_id=False),
+                  can.Message(timestamp=2.0, arbitration_id=0x123456, is_extended_id=True),
+                  can.Message(timestamp=3.0, arbitration_id=0x6E0, is_extended_id=False,
+                              is_remote_frame=True)]
+        f, w = self.write(frames)
+        result = list(RecordingReader(f))
+        self.assertEqual(len(result), 2)
+        self.assertTrue(result[0].is_error_frame)
+        self.assertTrue(result[1].is_remote_frame)
+        with self.assertRaises(ValueError):
+            w.writeFrame(1.0, 0x800, b"")
+
+    def test_File(self):
+        fd, name = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            with RecordingWriter(name) as w:
+                for each in sample(100):
+                    w.on_message_received(each)
+            with RecordingReader(name) as r:
+                self.assertEqual(len(list(r)), 100 + 10 + 1)
+            with open(name, "wb") as f:
+                f.write(b"candump is not a recording")
+            with self.assertRaises(RecordingError):
+                RecordingReader(name)
+        finally:
+            os.remove(name)
+
+    def test_Truncated(self):
+        f, w = self.write(sample(100), blockSize=50)
+        data = f.getvalue()[:-10]
+        r = RecordingReader(io.BytesIO(data))
+        self.assertEqual(len(r.blocks()), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+#  Copyright (c) 2016 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+import unittest
+import io
+import time
+import can
+import canfix
+from canfix.recording import RecordingWriter, RecordingReader
+from canfix.replay import Replay
+from tests.helpers import FakeBus, airspeedMsg
+
+
+def sample():
+    # 100 frames over one second with an alarm in the middle
+    result = [airspeedMsg(100.0 + n, timestamp=500.0 + n * 0.01) for n in range(100)]
+    result.insert(50, can.Message(timestamp=500.495, arbitration_id=0x0C,
+                                  is_extended_id=False, data=[1, 0]))
+    return result
+
+
+class TestReplay(unittest.TestCase):
+    def test_Fast(self):
+        bus = FakeBus()
+        r = Replay(sample(), bus=bus, speed=None)
+        self.assertTrue(r.run())
+        self.assertEqual(len(bus.sent), 101)
+        s = r.stats()
+        self.assertIsNone(s["targetRate"])
+        self.assertAlmostEqual(s["span"], 0.99)
+
+    def test_Timing(self):
+        bus = FakeBus()
+        r = Replay(sample(), bus=bus, speed=4.0)
+        r.run()
+        elapsed = bus.times[-1] - bus.times[0]
+        # Absolute scheduling means the total time doesn't drift
+        self.assertAlmostEqual(elapsed, 0.99 / 4.0, delta=0.03)
+        s = r.stats()
+        self.assertAlmostEqual(s["targetRate"], 100 / (0.99 / 4.0))
+        self.assertAlmostEqual(s["achievedRate"], s["targetRate"], delta=s["targetRate"] * 0.1)
+
+    def test_Filter(self):
+        bus = FakeBus()
+        r = Replay(sample(), bus=bus, speed=None, ids=[0x0C])
+        r.run()
+        self.assertEqual([m.arbitration_id for m in bus.messages], [0x0C])
+
+    def test_Handler(self):
+        received = []
+        r = Replay(sample(), handler=received.append, speed=None, start=500.5)
+        r.run()
+        self.assertEqual(len(received), 50)
+        self.assertIsInstance(received[0], canfix.Parameter)
+        self.assertEqual(received[0].value, 150.0)
+        with self.assertRaises(ValueError):
+            Replay(sample())
+        with self.assertRaises(ValueError):
+            Replay(sample(), bus=FakeBus(), speed=0)
+
+    def test_Recording(self):
+        f = io.BytesIO()
+        with RecordingWriter(f, blockSize=16) as w:
+            for each in sample():
+                w.write(each)
+        f.seek(0)
+        reader = RecordingReader(f)
+        bus = FakeBus()
+        r = Replay(reader, bus=bus, speed=None, ids=[0x183], start=500.9)
+        r.run()
+        self.assertEqual(len(bus.sent), 10)
+        self.assertGreater(reader.blocksSkipped, 0)
+
+    def test_SeekAndStop(self):
+        bus = FakeBus()
+        r = Replay(sample(), bus=bus, speed=1.0)
+        r.play()
+        time.sleep(0.1)
+        r.seek(500.9)
+        self.assertTrue(r.join(5))
+        # We jumped ahead so we didn't get everything
+        self.assertLess(len(bus.sent), 60)
+        self.assertEqual(r.stats()["frames"], 10)
+        bus = FakeBus()
+        r = Replay(sample(), bus=bus, speed=0.1)
+        r.play()
+        time.sleep(0.05)
+        r.stop()
+        self.assertTrue(r.join(0))
+        self.assertEqual(len(bus.sent), 1)
+
+    def test_SeekDuringGap(self):
+        # A seek made while waiting out a long gap takes effect at once and
+        # the frame that was being waited for is not sent
+        frames = [airspeedMsg(100.0, timestamp=0.0), airspeedMsg(110.0, timestamp=3.0),
+                  airspeedMsg(120.0, timestamp=3.2)]
+        bus = FakeBus()
+        r = Replay(frames, bus=bus, speed=1.0)
+        r.play()
+        time.sleep(0.2)
+        start = time.monotonic()
+        r.seek(3.1)
+        self.assertTrue(r.join(1.0))
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual([m.timestamp for m in bus.messages], [0.0, 3.2])
+
+    def test_SpeedDuringGap(self):
+        frames = [airspeedMsg(100.0, timestamp=0.0), airspeedMsg(110.0, timestamp=3.0)]
+        bus = FakeBus()
+        r = Replay(frames, bus=bus, speed=1.0)
+        r.play()
+        time.sleep(0.2)
+        r.speed = 100.0
+        self.assertTrue(r.join(1.0))
+        self.assertEqual(len(bus.sent), 2)
+        # The rest of the gap is played at the new speed
+        gap = bus.times[1] - bus.times[0]
+        self.assertAlmostEqual(gap, 0.2 + 2.8 / 100.0, delta=0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+#  Copyright (c) 2016 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+import unittest
+import canfix
+from canfix.requester import RequestEngine, TimerWheel
+from tests.helpers import FakeNodes, nodeFrame
+
+
+class TestTimerWheel(unittest.TestCase):
+    def test_Expire(self):
+        w = TimerWheel(tick=0.01, slots=16)
+        w.add(1.005, "a")
+        w.add(1.05, "b")
+        w.add(1.5, "c")   # More than one turn of the wheel away
+        w.add(1.0051, "d")
+        self.assertEqual(len(w), 4)
+        self.assertEqual(w.expire(1.0), [])
+        self.assertEqual(sorted(w.expire(1.006)), ["a", "d"])
+        self.assertEqual(w.expire(1.04), [])
+        self.assertEqual(w.expire(1.2), ["b"])
+        self.assertEqual(w.expire(1.49), [])
+        self.assertEqual(w.expire(10.0), ["c"])
+        self.assertEqual(len(w), 0)
+
+    def test_Past(self):
+        w = TimerWheel(tick=0.01, slots=16)
+        w.add(5.0, "a")
+        w.expire(5.0)
+        w.add(4.0, "late")
+        self.assertEqual(w.expire(5.0), ["late"])
+
+
+class TestRequestEngine(unittest.TestCase):
+    def test_Identify(self):
+        bus = FakeNodes([1, 2, 3])
+        with RequestEngine(bus, 0x90, timeout=0.2) as engine:
+            futures = {n: engine.identify(n) for n in (1, 2, 3, 4)}
+            for n in (1, 2, 3):
+                obj = futures[n].result(1.0)
+                self.assertIsInstance(obj, canfix.NodeIdentification)
+                self.assertEqual(obj.sendNode, n)
+                self.assertEqual(obj.device, n % 7)
+                self.assertEqual(obj.model, n)
+            with self.assertRaises(TimeoutError):
+                futures[4].result(1.0)
+        self.assertEqual(engine.completed, 3)
+        self.assertEqual(engine.timeouts, 1)
+        self.assertEqual(engine.pending(), 0)
+        self.assertIn((0x6E0 + 0x90, bytes([0x00, 4])), [r[1:] for r in bus.requests])
+
+    def test_Responses(self):
+        bus = FakeNodes([5])
+        with RequestEngine(bus, 0x90, timeout=0.2) as engine:
+            self.assertEqual(engine.setBitRate(5, 500).result(1.0).status, canfix.MSG_SUCCESS)
+            self.assertEqual(engine.setBitRate(5, 1000).result(1.0).status, canfix.MSG_FAIL)
+            obj = engine.disableParameter(5, 0x183).result(1.0)
+            self.assertIsInstance(obj, canfix.DisableParameter)
+            obj = engine.enableParameter(5, 0x183).result(1.0)
+            self.assertIsInstance(obj, canfix.EnableParameter)
+
+    def test_Retry(self):
+        bus = FakeNodes([])
+        engine = RequestEngine(bus, 0x90, timeout=0.02, retries=2)
+        with engine:
+            f = engine.identify(7)
+            with self.assertRaises(TimeoutError):
+                f.result(1.0)
+        self.assertEqual(len(bus.requests), 3)
+
+    def test_ManyInFlight(self):
+        # Hundreds of requests outstanding at once, answered out of order
+        nodes = range(1, 256)
+        bus = FakeNodes(nodes, auto=False)
+        engine = RequestEngine(bus, 0x00, timeout=2.0)
+        futures = [engine.identify(n) for n in nodes]
+        futures.extend(engine.disableParameter(n, 0x200) for n in nodes)
+        self.assertEqual(engine.pending(), 510)
+        order = list(range(len(bus.held)))
+        order.reverse()
+        bus.release(order)
+        while bus.replies:
+            self.assertTrue(engine.handleMessage(bus.recv(0)))
+        self.assertEqual(engine.pending(), 0)
+        for n, f in zip(nodes, futures):
+            self.assertEqual(f.result(0).model, n)
+        for n, f in zip(nodes, futures[255:]):
+            self.assertEqual(f.result(0).sendNode, n)
+        self.assertEqual(engine.poll(), None)
+
+    def test_Matching(self):
+        bus = FakeNodes([1], auto=False)
+        engine = RequestEngine(bus, 0x90, timeout=1.0)
+        f1 = engine.identify(1)
+        f2 = engine.identify(1)
+        # Not addressed to us, a request rather than a response, and a
+        # response we never asked for
+        self.assertFalse(engine.handleMessage(nodeFrame(1, [0x00, 0x91, 1, 2, 3, 4, 5, 6])))
+        self.assertFalse(engine.handleMessage(nodeFrame(1, [0x00, 0x90])))
+        self.assertFalse(engine.handleMessage(nodeFrame(2, [0x00, 0x90, 1, 2, 3, 4, 5, 6])))
+        self.assertEqual(engine.unmatched, 1)
+        bus.release()
+        engine.handleMessage(bus.recv(0))
+        self.assertTrue(f1.done())
+        self.assertFalse(f2.done())
+        self.assertTrue(engine.cancel(f2))
+        self.assertTrue(f2.cancelled())
+        self.assertEqual(engine.pending(), 0)
+
+    def test_Discriminator(self):
+        bus = FakeNodes([1], auto=False)
+        engine = RequestEngine(bus, 0x90, timeout=1.0)
+        engine.setDiscriminator(0x00, lambda obj: obj.device)
+        f1 = engine.identify(1, discriminator=3)
+        f2 = engine.identify(1, discriminator=1)
+        engine.handleMessage(nodeFrame(1, [0x00, 0x90, 0x01, 1, 2, 3, 0, 0]))
+        self.assertTrue(f2.done())
+        self.assertFalse(f1.done())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#  Copyright (c) 2016 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+import unittest
+import math
+
+try:
+    import numpy as np
+    from canfix.resample import *
+except ImportError:
+    np = None
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class TestResample(unittest.TestCase):
+    def test_Grid(self):
+        g = timeGrid(10.0, 11.0, 10)
+        self.assertEqual(len(g), 11)
+        self.assertAlmostEqual(g[-1], 11.0)
+        self.assertEqual(len(timeGrid(0.0, 1.0, 50)), 51)
+
+    def test_Hold(self):
+        times = [1.0, 2.0, 3.0]
+        values = [10.0, 20.0, 30.0]
+        v, q = resampleSeries(times, values, [0, 0, 0], [0.5, 1.0, 1.5, 2.99, 3.0, 9.0])
+        np.testing.assert_array_equal(v[1:], [10.0, 10.0, 20.0, 30.0, 30.0])
+        self.assertTrue(math.isnan(v[0]))
+        self.assertFalse(q.any())
+
+    def test_Linear(self):
+        times = [1.0, 2.0, 4.0]
+        values = [10.0, 20.0, 0.0]
+        v, q = resampleSeries(times, values, [0, 0, 0], [1.0, 1.5, 3.0, 4.0, 5.0], LINEAR)
+        np.testing.assert_allclose(v, [10.0, 15.0, 10.0, 0.0, 0.0])
+        # Samples too far apart are held instead of interpolated
+        v, q = resampleSeries(times, values, [0, 0, 0], [3.0], LINEAR, maxStale=1.5)
+        self.assertEqual(v[0], 20.0)
+
+    def test_Stale(self):
+        v, q = resampleSeries([1.0, 2.0], [1.0, 2.0], [0, 0], [2.0, 2.4, 2.6], maxStale=0.5)
+        np.testing.assert_array_equal(v[:2], [2.0, 2.0])
+        self.assertTrue(math.isnan(v[2]))
+
+    def test_Flags(self):
+        times = [1.0, 2.0, 3.0, 4.0]
+        values = [10.0, 0.0, 30.0, 40.0]
+        functions = [0, FAILURE, QUALITY, 0]
+        grid = [1.5, 2.5, 3.5, 4.5]
+        v, q = resampleSeries(times, values, functions, grid)
+        self.assertEqual(v[0], 10.0)
+        self.assertTrue(math.isnan(v[1]))   # Failed until the next good value
+        self.assertEqual(v[2], 30.0)
+        self.assertEqual(list(q), [False, False, True, False])
+        v, q = resampleSeries(times, values, functions, grid, rejectQuality=True)
+        self.assertTrue(math.isnan(v[2]))
+        # Never interpolate towards a failed value
+        v, q = resampleSeries(times, values, functions, [1.5], LINEAR)
+        self.assertEqual(v[0], 10.0)
+
+    def test_Unsorted(self):
+        v, q = resampleSeries([2.0, 1.0], [20.0, 10.0], [0, 0], [1.5, 2.5])
+        np.testing.assert_array_equal(v, [10.0, 20.0])
+
+    def test_Matrix(self):
+        columns = {(1, 0x183, 0): ([0.0, 0.1, 0.2], [100.0, 101.0, 102.0], [0, 0, 0]),
+                   (2, 0x184, 0): ([0.05], [5000.0], [0]),
+                   (3, 0x184, 0): ([0.05], [5100.0], [0]),
+                   (1, 0x502, 2): ([0.0, 0.2], [600.0, 620.0], [0, 0])}
+        r = resample(columns, ["Indicated Airspeed", (3, 0x184, 0), (1, 0x502, 2)],
+                     timeGrid(0.0, 0.2, 10), LINEAR)
+        self.assertEqual(r["values"].shape, (3, 3))
+        self.assertEqual(r["keys"][0], (1, 0x183, 0))
+        np.testing.assert_allclose(r["values"][:, 0], [100.0, 101.0, 102.0])
+        self.assertTrue(math.isnan(r["values"][0, 1]))
+        np.testing.assert_allclose(r["values"][:, 2], [600.0, 610.0, 620.0])
+        with self.assertRaises(ValueError):
+            resample(columns, [0x184], [0.0])
+        with self.assertRaises(KeyError):
+            resample(columns, [0x185], [0.0])
+        with self.assertRaises(ValueError):
+            resampleSeries([1.0], [1.0], [0], [1.0], method="cubic")
+
+
+if __name__ == '__main__':
+    unittest.main()
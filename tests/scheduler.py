@@ -0,0 +1,193 @@
+#  Copyright (c) 2016 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+import unittest
+import asyncio
+import time
+import canfix
+import can
+from canfix.scheduler import TransmitScheduler, CyclicTransmitter, hasNativeCyclic
+from tests.helpers import FakeBus
+
+
+def makeParameter(name, node=1):
+    p = canfix.Parameter()
+    p.name = name
+    p.node = node
+    return p
+
+
+class TestTransmitScheduler(unittest.TestCase):
+    def test_Rates(self):
+        bus = FakeBus()
+        ts = TransmitScheduler(bus)
+        calls = []
+
+        def counter(x):
+            calls.append(x)
+            return len(calls)
+
+        fast1 = ts.add(makeParameter("Indicated Airspeed"), counter, 10)
+        fast2 = ts.add(makeParameter("Indicated Altitude"), None, 10)
+        slow = ts.add(makeParameter("Oil Pressure #1"), None, 2)
+        self.assertAlmostEqual(abs(fast2.due - fast1.due), 0.05)
+        start = min(fast1.due, fast2.due, slow.due)
+        for ms in range(1000):
+            ts.poll(start + ms / 1000.0)
+        self.assertEqual(fast1.sent, 10)
+        self.assertEqual(fast2.sent, 10)
+        self.assertEqual(slow.sent, 2)
+        self.assertEqual(len(calls), 10)
+        self.assertEqual(ts.overruns, 0)
+        self.assertEqual(len(bus.sent), 22)
+        p = canfix.parseMessage(can.Message(arbitration_id=bus.sent[-1][0], data=bus.sent[-1][1]))
+        self.assertEqual(p.node, 1)
+
+    def test_Encode(self):
+        bus = FakeBus()
+        ts = TransmitScheduler(bus)
+        p = makeParameter("Indicated Airspeed", node=7)
+        p.value = 123.4
+        entry = ts.add(p, None, 1)
+        ts.poll(entry.due)
+        self.assertEqual(bus.sent, [(0x183, bytes([7, 0, 0, 0xD2, 0x04]))])
+        # The same message object is used every time
+        msg = entry.msg
+        p.value = 10.0
+        ts.poll(entry.due)
+        self.assertIs(entry.msg, msg)
+        self.assertEqual(bus.sent[-1], (0x183, bytes([7, 0, 0, 0x64, 0x00])))
+
+    def test_Overrun(self):
+        bus = FakeBus()
+        ts = TransmitScheduler(bus)
+        entry = ts.add(makeParameter("Indicated Airspeed"), None, 10)
+        wait = ts.poll(entry.due + 1.0)
+        self.assertEqual(entry.sent, 1)
+        self.assertEqual(ts.overruns, 10)
+        self.assertTrue(0 < wait < 0.1001)
+
+    def test_Remove(self):
+        ts = TransmitScheduler(FakeBus())
+        entry = ts.add(makeParameter("Indicated Airspeed"), None, 10)
+        ts.remove(entry)
+        self.assertEqual(ts.groups, {})
+        self.assertIsNone(ts.poll())
+
+    def test_Thread(self):
+        bus = FakeBus()
+        with TransmitScheduler(bus) as ts:
+            ts.add(makeParameter("Indicated Airspeed"), None, 50)
+            time.sleep(0.25)
+        self.assertTrue(8 <= len(bus.sent) <= 15)
+
+    def test_Asyncio(self):
+        bus = FakeBus()
+        ts = TransmitScheduler(bus)
+        ts.add(makeParameter("Indicated Airspeed"), None, 50)
+
+        async def run():
+            task = asyncio.ensure_future(ts.run())
+            await asyncio.sleep(0.25)
+            ts.stop()
+            await task
+        asyncio.run(run())
+        self.assertTrue(8 <= len(bus.sent) <= 15)
+
+
+class FakeCyclicTask(can.ModifiableCyclicTaskABC):
+    def __init__(self, msg, period):
+        super(FakeCyclicTask, self).__init__(msg, period)
+        self.modified = []
+        self.stopped = False
+
+    def modify_data(self, messages):
+        super(FakeCyclicTask, self).modify_data(messages)
+        self.modified.append(bytes(self.messages[0].data))
+
+    def stop(self):
+        self.stopped = True
+
+
+class FakeCyclicBus(can.BusABC):
+    def __init__(self):
+        super(FakeCyclicBus, self).__init__(channel=None)
+        self.tasks = []
+
+    def send(self, msg, timeout=None):
+        raise AssertionError("Should not be sending directly")
+
+    def _recv_internal(self, timeout):
+        return None, False
+
+    def _send_periodic_internal(self, msgs, period, duration=None, autostart=True,
+                                modifier_callback=None):
+        task = FakeCyclicTask(msgs, period)
+        self.tasks.append(task)
+        return task
+
+
+class TestCyclicTransmitter(unittest.TestCase):
+    def test_Native(self):
+        bus = FakeCyclicBus()
+        self.assertTrue(hasNativeCyclic(bus))
+        ct = CyclicTransmitter(bus)
+        p = makeParameter("Indicated Airspeed", node=3)
+        p.value = 100.0
+        entry = ct.add(p, 20)
+        task = bus.tasks[0]
+        self.assertAlmostEqual(task.period, 0.05)
+        self.assertEqual(bytes(task.messages[0].data), bytes([3, 0, 0, 0xE8, 0x03]))
+        # The task is only modified when the data changes
+        entry.setValue(100.0)
+        self.assertEqual(task.modified, [])
+        entry.setValue(101.0)
+        self.assertEqual(task.modified, [bytes([3, 0, 0, 0xF2, 0x03])])
+        self.assertEqual(entry.modifications, 1)
+        self.assertIsNone(ct.scheduler)
+        ct.stop()
+        self.assertTrue(task.stopped)
+        self.assertEqual(ct.entries, [])
+        bus.shutdown()
+
+    def test_Fallback(self):
+        local = can.Bus(interface="virtual", channel="cyclic_test")
+        remote = can.Bus(interface="virtual", channel="cyclic_test")
+        try:
+            self.assertFalse(hasNativeCyclic(local))
+            ct = CyclicTransmitter(local)
+            p = makeParameter("Indicated Airspeed", node=3)
+            p.value = 100.0
+            entry = ct.add(p, 50)
+            self.assertIsNone(entry.task)
+            self.assertIsNotNone(ct.scheduler)
+            msg = remote.recv(1)
+            self.assertAlmostEqual(canfix.parseMessage(msg).value, 100.0)
+            entry.setValue(120.0)
+            time.sleep(0.05)
+            while remote.recv(0) is not None:
+                pass
+            msg = remote.recv(1)
+            self.assertAlmostEqual(canfix.parseMessage(msg).value, 120.0)
+            ct.stop()
+            self.assertIsNone(ct.scheduler)
+        finally:
+            local.shutdown()
+            remote.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
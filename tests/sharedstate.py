@@ -0,0 +1,137 @@
+#  Copyright (c) 2016 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+import unittest
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+import canfix
+import can
+from canfix.sharedstate import SharedStateError, _attach, _header, _seq, _slot
+from tests.helpers import airspeedMsg
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def childReader(name, q):
+    with canfix.SharedParameterState(name) as ss:
+        q.put(ss.get(0x183))
+
+
+class TestSharedParameterState(unittest.TestCase):
+    def setUp(self):
+        self.writer = canfix.SharedParameterState(create=True)
+
+    def tearDown(self):
+        self.writer.close()
+
+    def test_Layout(self):
+        first, count = self.writer.layout[0x183]
+        self.assertEqual(count, 1)
+        # Cylinder Head Temperature is indexed by cylinder
+        p = canfix.protocol.getParameterByName("Cylinder Head Temperature #1")
+        self.assertEqual(self.writer.layout[p.id][1], 16)
+
+    def test_WriteRead(self):
+        reader = canfix.SharedParameterState(self.writer.name)
+        with self.assertRaises(canfix.NotFound):
+            reader.get(0x183)
+        self.assertTrue(self.writer.updateMessage(airspeedMsg(123.4, node=5, function=0x02, timestamp=3.5)))
+        node, value, function, timestamp = reader.get(0x183)
+        self.assertEqual(node, 5)
+        self.assertAlmostEqual(value, 123.4)
+        self.assertEqual(function, 0x02)
+        self.assertEqual(timestamp, 3.5)
+        snap = reader.snapshot()
+        self.assertEqual(list(snap), [canfix.parameterKey(5, 0x183, 0)])
+        reader.close()
+
+    def test_IndexOverflow(self):
+        self.assertFalse(self.writer.updateMessage(airspeedMsg(100.0, index=1)))
+        self.assertEqual(self.writer.overflows, 1)
+
+    def test_IgnoreOtherMessages(self):
+        self.writer.updateMessage(airspeedMsg(100.0))
+        # Vne meta data isn't the airspeed
+        self.assertFalse(self.writer.updateMessage(airspeedMsg(160.0, function=0x50)))
+        self.assertFalse(self.writer.update(canfix.parseMessage(airspeedMsg(165.0, function=0x50))))
+        self.assertAlmostEqual(self.writer.get(0x183)[1], 100.0)
+        for identifier, data in [(0x0C, [1, 0]), (0x600, [1, 0, 0, 0]),
+                                 (0x6E2, [0x05, 0x04, 0, 0]), (0x7E0, [1, 2, 3, 4])]:
+            msg = can.Message(arbitration_id=identifier, is_extended_id=False, data=data)
+            self.assertFalse(self.writer.updateMessage(msg))
+        msg = can.Message(arbitration_id=0x183, is_extended_id=False, is_error_frame=True,
+                          data=[1, 0, 0, 0xE8, 0x03])
+        self.assertFalse(self.writer.updateMessage(msg))
+        self.assertAlmostEqual(self.writer.get(0x183)[1], 100.0)
+        self.assertEqual(self.writer.overflows, 0)
+
+    def test_LayoutMismatch(self):
+        with self.assertRaises(ValueError):
+            canfix.SharedParameterState(self.writer.name, indexes=4)
+
+    def test_ParameterStoreMirror(self):
+        ps = canfix.ParameterStore(shared=self.writer)
+        ps.updateMessage(airspeedMsg(99.9, node=7, timestamp=1.0))
+        node, value, function, timestamp = self.writer.get(0x183)
+        self.assertEqual(node, 7)
+        self.assertAlmostEqual(value, 99.9)
+
+    def test_SameParameterTwoNodes(self):
+        # There is one slot per identifier and index so the last node wins
+        self.writer.updateMessage(airspeedMsg(100.0, node=1, timestamp=1.0))
+        self.writer.updateMessage(airspeedMsg(110.0, node=2, timestamp=1.1))
+        node, value, function, timestamp = self.writer.get(0x183)
+        self.assertEqual(node, 2)
+        self.assertEqual(list(self.writer.snapshot()), [canfix.parameterKey(2, 0x183, 0)])
+
+    def test_StuckWriter(self):
+        self.writer.updateMessage(airspeedMsg(100.0))
+        first, count = self.writer.layout[0x183]
+        offset = _header.size + first * _slot.size
+        # A writer that died in the middle of an update leaves the sequence odd
+        shm = _attach(self.writer.name)
+        _seq.pack_into(shm.buf, offset, 3)
+        reader = canfix.SharedParameterState(self.writer.name, timeout=0.05)
+        start = time.monotonic()
+        with self.assertRaises(SharedStateError):
+            reader.get(0x183)
+        self.assertLess(time.monotonic() - start, 1.0)
+        reader.close()
+        shm.close()
+
+    def test_LazyImport(self):
+        code = "import sys, canfix; print('canfix.sharedstate' in sys.modules); " \
+               "canfix.SharedParameterState; print('canfix.sharedstate' in sys.modules)"
+        out = subprocess.check_output([sys.executable, "-c", code], cwd=ROOT)
+        self.assertEqual(out.split(), [b"False", b"True"])
+
+    def test_OtherProcess(self):
+        self.writer.updateMessage(airspeedMsg(150.0, node=3, timestamp=2.0))
+        ctx = multiprocessing.get_context("spawn")
+        q = ctx.Queue()
+        proc = ctx.Process(target=childReader, args=(self.writer.name, q))
+        proc.start()
+        node, value, function, timestamp = q.get(timeout=30)
+        proc.join()
+        self.assertEqual(node, 3)
+        self.assertAlmostEqual(value, 150.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,215 @@
+#  Copyright (c) 2016 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+import unittest
+import statistics
+import threading
+import canfix
+import can
+from canfix.state import RunningStats, WindowStats
+from tests.helpers import airspeedMsg
+
+
+class TestParameterKey(unittest.TestCase):
+    def test_RoundTrip(self):
+        for node, identifier, index in [(0, 0x100, 0), (255, 0x6DF, 255), (12, 0x183, 3)]:
+            key = canfix.parameterKey(node, identifier, index)
+            self.assertEqual(canfix.splitKey(key), (node, identifier, index))
+
+    def test_Ordering(self):
+        a = canfix.parameterKey(1, 0x183, 5)
+        b = canfix.parameterKey(1, 0x184, 0)
+        c = canfix.parameterKey(2, 0x100, 0)
+        self.assertTrue(a < b < c)
+
+    def test_Meta(self):
+        key = canfix.parameterKey(255, 0x183, 2, meta=0x0F)
+        self.assertNotEqual(key, canfix.parameterKey(255, 0x183, 2))
+        self.assertEqual(canfix.splitKey(key), (255, 0x183, 2))
+        self.assertTrue(canfix.parameterKey(255, 0x6DF, 255) < canfix.parameterKey(0, 0x100, 0, meta=1))
+
+
+class TestRunningStats(unittest.TestCase):
+    def test_Lifetime(self):
+        values = [3.0, 7.5, -2.0, 11.25, 4.0, 4.0]
+        s = RunningStats()
+        for i, v in enumerate(values):
+            s.add(v, float(i))
+        self.assertEqual(s.count, len(values))
+        self.assertEqual(s.min, -2.0)
+        self.assertEqual(s.max, 11.25)
+        self.assertAlmostEqual(s.mean, statistics.mean(values))
+        self.assertAlmostEqual(s.stddev, statistics.stdev(values))
+        self.assertEqual(s.rate, 0.0)
+
+    def test_Merge(self):
+        values = [3.0, 7.5, -2.0, 11.25, 4.0, 4.0, 9.0]
+        for split in range(len(values) + 1):
+            a = RunningStats()
+            b = RunningStats()
+            for i, v in enumerate(values):
+                (a if i < split else b).add(v, float(i))
+            a.merge(b)
+            self.assertEqual(a.count, len(values))
+            self.assertEqual(a.min, -2.0)
+            self.assertEqual(a.max, 11.25)
+            self.assertAlmostEqual(a.mean, statistics.mean(values))
+            self.assertAlmostEqual(a.stddev, statistics.stdev(values))
+            self.assertEqual(a.rate, 5.0)
+            self.assertEqual(a.last, 9.0)
+        with self.assertRaises(TypeError):
+            WindowStats(1.0).merge(RunningStats())
+
+    def test_Window(self):
+        values = [5.0, 1.0, 9.0, 2.0, 8.0, 3.0, 7.0, 4.0, 6.0, 0.5]
+        s = WindowStats(3.0)
+        for i, v in enumerate(values):
+            s.add(v, float(i))
+            inwin = values[max(0, i-3):i+1]
+            self.assertEqual(s.count, len(inwin))
+            self.assertEqual(s.min, min(inwin))
+            self.assertEqual(s.max, max(inwin))
+            self.assertAlmostEqual(s.mean, statistics.mean(inwin))
+            if len(inwin) > 1:
+                self.assertAlmostEqual(s.stddev, statistics.stdev(inwin))
+                self.assertAlmostEqual(s.rate, (inwin[-1] - inwin[0]) / (len(inwin) - 1))
+
+
+class TestParameterStore(unittest.TestCase):
+    def test_UpdateAndGet(self):
+        ps = canfix.ParameterStore()
+        p = ps.updateMessage(airspeedMsg(123.4, node=3, timestamp=10.0))
+        self.assertIsInstance(p, canfix.Parameter)
+        value, function, timestamp = ps.get(3, 0x183)
+        self.assertAlmostEqual(value, 123.4)
+        self.assertEqual(function, 0)
+        self.assertEqual(timestamp, 10.0)
+        with self.assertRaises(canfix.NotFound):
+            ps.get(4, 0x183)
+
+    def test_IgnoreOtherMessages(self):
+        ps = canfix.ParameterStore()
+        msg = can.Message(arbitration_id=0x6E2, is_extended_id=False,
+                          data=bytearray([0x05, 0x04]))
+        self.assertIsNone(ps.updateMessage(msg))
+        self.assertEqual(len(ps), 0)
+
+    def test_IgnoreBadParameters(self):
+        ps = canfix.ParameterStore()
+        # The future message range is not parameters
+        msg = can.Message(arbitration_id=0x600, is_extended_id=False,
+                          data=bytearray([0x01, 0x00, 0x00, 0x10, 0x27]))
+        self.assertIsNone(ps.updateMessage(msg))
+        # Too short to hold node, index, function and a value
+        msg = can.Message(arbitration_id=0x183, is_extended_id=False,
+                          data=bytearray([0x01, 0x00, 0x00]))
+        self.assertIsNone(ps.updateMessage(msg))
+        self.assertEqual(len(ps), 0)
+
+    def test_IgnoreMeta(self):
+        ps = canfix.ParameterStore()
+        ps.updateMessage(airspeedMsg(100.0, timestamp=1.0))
+        # Vne meta data is a limit, not a new airspeed
+        self.assertIsNone(ps.updateMessage(airspeedMsg(160.0, function=0x50, timestamp=2.0)))
+        p = canfix.parseMessage(airspeedMsg(150.0, function=0x50))
+        self.assertIsNone(ps.update(p))
+        self.assertEqual(ps.get(1, 0x183)[0], 100.0)
+        self.assertEqual(ps.stats(1, 0x183).max, 100.0)
+        self.assertEqual(ps.stats(1, 0x183).count, 1)
+
+    def test_Stats(self):
+        ps = canfix.ParameterStore(window=2.0)
+        for i, v in enumerate([100.0, 110.0, 120.0, 130.0]):
+            ps.updateMessage(airspeedMsg(v, timestamp=float(i+1)))
+        # A failed value is stored but should not show up in the statistics
+        ps.updateMessage(airspeedMsg(500.0, function=0x04, timestamp=5.0))
+        self.assertAlmostEqual(ps.get(1, 0x183)[0], 500.0)
+        s = ps.stats(1, 0x183)
+        self.assertEqual(s.count, 4)
+        self.assertAlmostEqual(s.mean, 115.0)
+        self.assertAlmostEqual(s.rate, 10.0)
+        w = ps.stats(1, 0x183, windowed=True)
+        self.assertEqual(w.count, 3)
+        self.assertAlmostEqual(w.min, 110.0)
+        with self.assertRaises(canfix.NotFound):
+            ps.stats(1, 0x184)
+
+    def test_AllStats(self):
+        ps = canfix.ParameterStore()
+        ps.updateMessage(airspeedMsg(50.0, node=2, timestamp=1.0))
+        ps.updateMessage(airspeedMsg(60.0, node=2, timestamp=2.0))
+        ps.updateMessage(airspeedMsg(70.0, node=1, index=1, timestamp=1.0))
+        s = ps.allStats()
+        self.assertEqual(list(s["node"]), [1, 2])
+        self.assertEqual(list(s["identifier"]), [0x183, 0x183])
+        self.assertEqual(list(s["index"]), [1, 0])
+        self.assertEqual(list(s["count"]), [1, 2])
+        self.assertAlmostEqual(s["mean"][1], 55.0)
+        for field in canfix.ParameterStore.statFields:
+            self.assertEqual(len(s[field]), 2)
+
+
+class TestSnapshot(unittest.TestCase):
+    def test_Publish(self):
+        ps = canfix.ParameterStore()
+        ps.updateMessage(airspeedMsg(50.0, node=2, timestamp=1.0))
+        self.assertEqual(ps.snapshot(), {})
+        self.assertEqual(ps.publish(), 1)
+        key = canfix.parameterKey(2, 0x183, 0)
+        snap = ps.snapshot()
+        self.assertEqual(list(snap), [key])
+        self.assertAlmostEqual(snap[key][0], 50.0)
+        # Nothing changed so the generation should stay put
+        self.assertEqual(ps.publish(), 1)
+        ps.updateMessage(airspeedMsg(60.0, node=2, timestamp=2.0))
+        ps.updateMessage(airspeedMsg(70.0, node=3, timestamp=2.0))
+        self.assertAlmostEqual(ps.snapshot()[key][0], 50.0)
+        ps.publish()
+        ps.updateMessage(airspeedMsg(80.0, node=3, timestamp=3.0))
+        ps.publish()
+        snap = ps.snapshot()
+        self.assertAlmostEqual(snap[key][0], 60.0)
+        self.assertAlmostEqual(snap[canfix.parameterKey(3, 0x183, 0)][0], 80.0)
+        snap = ps.snapshot([key, canfix.parameterKey(9, 0x183, 0)])
+        self.assertEqual(list(snap), [key])
+
+    def test_ConsistentWhileWriting(self):
+        # The writer always changes every parameter to the same value before
+        # publishing so a reader should never see two different values.
+        ps = canfix.ParameterStore()
+        done = threading.Event()
+        errors = []
+
+        def reader():
+            while not done.is_set():
+                values = set(x[0] for x in ps.snapshot().values())
+                if len(values) > 1:
+                    errors.append(values)
+
+        t = threading.Thread(target=reader)
+        t.start()
+        for n in range(200):
+            for node in range(1, 21):
+                ps.updateMessage(airspeedMsg(float(n), node=node, timestamp=n+1.0))
+            ps.publish()
+        done.set()
+        t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(ps.snapshot()), 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
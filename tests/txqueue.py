@@ -0,0 +1,94 @@
+#  Copyright (c) 2016 Phil Birkelbach
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+import unittest
+import can
+from canfix.txqueue import TransmitQueue, priorityBand
+from canfix.txqueue import BAND_ALARM, BAND_HIGH, BAND_NORMAL, BAND_OTHER
+from tests.helpers import FakeBus
+
+
+def frame(identifier, data):
+    return can.Message(arbitration_id=identifier, is_extended_id=False, data=bytearray(data))
+
+
+class TestTransmitQueue(unittest.TestCase):
+    def test_Bands(self):
+        self.assertEqual(priorityBand(0x001), BAND_ALARM)
+        self.assertEqual(priorityBand(0x0FF), BAND_ALARM)
+        self.assertEqual(priorityBand(0x100), BAND_HIGH)
+        self.assertEqual(priorityBand(0x2FF), BAND_HIGH)
+        self.assertEqual(priorityBand(0x300), BAND_NORMAL)
+        self.assertEqual(priorityBand(0x5FF), BAND_NORMAL)
+        self.assertEqual(priorityBand(0x6E0), BAND_OTHER)
+
+    def test_Order(self):
+        bus = FakeBus()
+        tq = TransmitQueue(bus)
+        tq.send(frame(0x6E2, [0x05, 0x04]))
+        tq.send(frame(0x500, [1, 0, 0, 1, 0]))
+        tq.send(frame(0x400, [1, 0, 0, 2, 0]))
+        tq.send(frame(0x183, [1, 0, 0, 3, 0]))
+        tq.send(frame(0x0C, [1, 0]))
+        self.assertEqual(tq.depth(), [1, 1, 2, 1])
+        self.assertEqual(tq.sendPending(), 5)
+        # Normal priority frames stay in the order they were queued
+        self.assertEqual([x[0] for x in bus.sent], [0x0C, 0x183, 0x500, 0x400, 0x6E2])
+        self.assertEqual(len(tq), 0)
+
+    def test_Supersede(self):
+        bus = FakeBus()
+        tq = TransmitQueue(bus)
+        msg = frame(0x500, [1, 0, 0, 1, 0])
+        tq.send(msg)
+        tq.send(frame(0x501, [1, 0, 0, 9, 0]))
+        # The caller can reuse the message object
+        msg.data[3] = 2
+        tq.send(msg)
+        tq.send(frame(0x500, [2, 0, 0, 7, 0]))   # Different node
+        self.assertEqual(tq.superseded, 1)
+        # Alarms are events so they are never replaced
+        tq.send(frame(0x0C, [1, 0]))
+        tq.send(frame(0x0C, [1, 0]))
+        tq.sendPending()
+        self.assertEqual(bus.sent, [(0x0C, bytes([1, 0])), (0x0C, bytes([1, 0])),
+                                    (0x500, bytes([1, 0, 0, 2, 0])),
+                                    (0x501, bytes([1, 0, 0, 9, 0])),
+                                    (0x500, bytes([2, 0, 0, 7, 0]))])
+
+    def test_SupersedeMeta(self):
+        bus = FakeBus()
+        tq = TransmitQueue(bus)
+        tq.send(frame(0x183, [1, 0, 0x00, 0xE8, 0x03]))
+        tq.send(frame(0x183, [1, 0, 0x50, 0x40, 0x06]))  # Vne
+        tq.send(frame(0x183, [1, 0, 0x50, 0x4A, 0x06]))
+        self.assertEqual(tq.superseded, 1)
+        tq.sendPending()
+        self.assertEqual(bus.sent, [(0x183, bytes([1, 0, 0x00, 0xE8, 0x03])),
+                                    (0x183, bytes([1, 0, 0x50, 0x4A, 0x06]))])
+
+    def test_Thread(self):
+        bus = FakeBus()
+        with TransmitQueue(bus) as tq:
+            for n in range(20):
+                tq.send(frame(0x300 + n, [1, 0, 0, n, 0]))
+            self.assertTrue(tq.flush(5))
+        self.assertEqual(len(bus.sent), 20)
+        self.assertEqual(tq.sent, 20)
+
+
+if __name__ == '__main__':
+    unittest.main()